@@ -49,15 +49,24 @@ def get_colors():
 
 COLORS = get_colors()
 
-# Import dashboard module
-try:
-    from dashboard.backend import database as db
+# Dashboard module di-load di main(): worker extraction (spawn) meng-import ulang
+# file ini, jadi top-level tidak boleh membuka database atau meng-import Flask
+HAS_DATABASE = False
+db = None
+adb = None
+
+
+def init_database():
+    """Import dashboard module dan initialize database tables."""
+    global HAS_DATABASE, db, adb
+    try:
+        from dashboard.backend import database as _db
+        from dashboard.backend.async_database import adb as _adb
+    except ImportError:
+        return
+    db, adb = _db, _adb
     HAS_DATABASE = True
-    # Initialize database tables
     db.init_db()
-except ImportError:
-    HAS_DATABASE = False
-    db = None
 
 
 async def async_get_prefix(bot, message) -> str:
@@ -66,7 +75,7 @@ async def async_get_prefix(bot, message) -> str:
         guild_id = message.guild.id
         if HAS_DATABASE and db:
             try:
-                settings = db.get_guild_settings(guild_id)
+                settings = await adb.get_guild_settings(guild_id)
                 if settings and settings.get('command_prefix'):
                     return settings['command_prefix']
             except Exception as e:
@@ -264,6 +273,7 @@ class CustomHelpCommand(commands.HelpCommand):
 
 async def main():
     """Main function untuk menjalankan bot."""
+    init_database()
     bot = DiscordBot()
 
     # Check token
@@ -7,17 +7,23 @@ AI chatbot menggunakan Groq API.
 import discord
 from discord.ext import commands
 import aiohttp
+import asyncio
 import re
-from typing import Optional, List, Dict
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Tuple
 import config
 import sys
 import os
+from utils.message_policy import message_policies
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
     from dashboard.backend import database as db
+    from dashboard.backend.async_database import adb
     HAS_DATABASE = True
     print("✅ Chatbot: Database module loaded")
 except Exception as e:
@@ -25,6 +31,119 @@ except Exception as e:
     print(f"❌ Chatbot: Database import failed: {e}")
 
 
+class ChatHistoryStore:
+    """
+    Cache history chat per channel (deque sebesar max_history) dengan
+    write-behind ke database. Background loop juga menjalankan retention
+    agar tabel chat_history tidak tumbuh tanpa batas.
+    """
+
+    def __init__(self, flush_interval_ms: int = None, max_per_channel: int = None, retention_interval: int = None):
+        self.flush_interval = (flush_interval_ms or getattr(config, 'CHAT_HISTORY_FLUSH_INTERVAL_MS', 2000)) / 1000
+        self.max_per_channel = max_per_channel or getattr(config, 'CHAT_HISTORY_MAX_PER_CHANNEL', 200)
+        self.retention_interval = retention_interval or getattr(config, 'CHAT_HISTORY_RETENTION_INTERVAL', 3600)
+        # {(guild_id, channel_id): deque of message dict, urut dari yang terlama}
+        self._channels: Dict[Tuple[int, int], deque] = {}
+        # Pesan yang belum ditulis: list of (guild_id, channel_id, user_id, role, content)
+        self.pending = []
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._last_retention = time.monotonic()
+
+    def start(self):
+        """Mulai background flush loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Hentikan flush loop dan tulis pesan yang tersisa."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def get(self, guild_id: int, channel_id: int, limit: int = 10) -> List[Dict]:
+        """Dapatkan `limit` pesan terakhir (urut dari yang terlama)."""
+        key = (guild_id, channel_id)
+        history = self._channels.get(key)
+        if history is None or history.maxlen < limit:
+            # Lock flush selama load: pesan pending tidak bisa ter-flush di tengah query
+            async with self._lock:
+                history = self._channels.get(key)
+                if history is None or history.maxlen < limit:
+                    await self._flush_locked()
+                    rows = await adb.get_chat_history(guild_id, channel_id, limit=limit)
+                    history = deque(reversed(rows), maxlen=limit)
+                    # Pesan yang masuk selama query (atau flush gagal) belum ada di database
+                    for row in self.pending:
+                        if (row[0], row[1]) == key:
+                            history.append(self._entry(*row[2:]))
+                    self._channels[key] = history
+
+        items = list(history)
+        return items[-limit:] if limit > 0 else []
+
+    @staticmethod
+    def _entry(user_id: int, role: str, content: str) -> dict:
+        return {
+            'user_id': user_id,
+            'role': role,
+            'content': content,
+            'timestamp': datetime.now(timezone.utc)
+        }
+
+    def add(self, guild_id: int, channel_id: int, user_id: int, role: str, content: str):
+        """Tambah pesan ke cache dan antrian tulis."""
+        history = self._channels.get((guild_id, channel_id))
+        if history is not None:
+            history.append(self._entry(user_id, role, content))
+        self.pending.append((guild_id, channel_id, user_id, role, content))
+
+    async def clear(self, guild_id: int, channel_id: int) -> bool:
+        """Hapus history channel dari cache, antrian, dan database."""
+        key = (guild_id, channel_id)
+        async with self._lock:
+            self.pending = [row for row in self.pending if (row[0], row[1]) != key]
+            self._channels.pop(key, None)
+            return await adb.clear_chat_history(guild_id, channel_id)
+
+    async def flush(self):
+        """Tulis semua pesan pending ke database dalam satu batch."""
+        async with self._lock:
+            await self._flush_locked()
+
+    async def _flush_locked(self):
+        if not self.pending:
+            return
+
+        batch = self.pending
+        self.pending = []
+        if await adb.add_chat_messages_batch(batch):
+            return
+
+        # Gagal: kembalikan ke depan antrian agar urutan tetap terjaga
+        print(f"[Chatbot] Flush failed, retrying {len(batch)} messages later")
+        self.pending = batch + self.pending
+
+    async def _flush_loop(self):
+        """Background loop: flush per interval dan retention berkala."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_retention >= self.retention_interval:
+                    self._last_retention = time.monotonic()
+                    deleted = await adb.trim_chat_history(self.max_per_channel)
+                    if deleted > 0:
+                        print(f"[Chatbot] Retention: removed {deleted} old chat messages")
+            except Exception as e:
+                print(f"[Chatbot] Error flushing chat history: {e}")
+
+
 class Chatbot(commands.Cog):
     """AI Chatbot menggunakan Groq API."""
 
@@ -32,6 +151,7 @@ class Chatbot(commands.Cog):
         self.bot = bot
         self.api_base = "https://api.groq.com/openai/v1"
         self.session: Optional[aiohttp.ClientSession] = None
+        self.history = ChatHistoryStore()
 
     def _create_embed(self, title: str, description: str, color: int) -> discord.Embed:
         """Helper untuk membuat embed."""
@@ -558,19 +678,17 @@ Prefix bot adalah `!` (default). Bot mendukung custom prefix per-server.
         guild_id = message.guild.id
         channel_id = message.channel.id
 
-        # Get settings from database directly (no caching)
         if not HAS_DATABASE:
             return
 
-        db_settings = db.get_chatbot_settings(guild_id)
+        # Policy di-compile sekali per perubahan settings (tanpa query per pesan)
+        policy = await message_policies.get(guild_id)
+        db_settings = policy.chatbot_settings
         if not db_settings:
             return  # No settings configured
 
         # Parse settings
-        enabled = db_settings.get('enabled', 0) == 1
-        enabled_channels = db_settings.get('enabled_channels', [])
-        # Convert enabled_channels to strings for comparison (handles both int and string from DB)
-        enabled_channels_str = [str(ch) for ch in enabled_channels]
+        enabled = policy.chatbot_enabled
         api_key = db_settings.get('api_key') or config.GROQ_API_KEY
 
         # Check if bot is mentioned
@@ -601,7 +719,7 @@ Prefix bot adalah `!` (default). Bot mendukung custom prefix per-server.
             return  # Chatbot not enabled
         if not api_key:
             return  # No API key
-        if str(channel_id) not in enabled_channels_str:
+        if not policy.is_chatbot_channel(channel_id):
             return  # Not in enabled channel
 
         # Get the message content for auto-respon
@@ -614,7 +732,7 @@ Prefix bot adalah `!` (default). Bot mendukung custom prefix per-server.
         # Process the message (auto-respon di enabled channel)
         async with message.channel.typing():
             # Get history (skip if has images - vision context works better without history)
-            history = [] if has_images else db.get_chat_history(guild_id, channel_id, limit=db_settings.get('max_history', 10))
+            history = [] if has_images else await self.history.get(guild_id, channel_id, limit=db_settings.get('max_history', 10))
 
             # Build messages (includes custom system prompt + commands knowledge)
             system_prompt_raw = db_settings.get('system_prompt', '')
@@ -664,8 +782,8 @@ Prefix bot adalah `!` (default). Bot mendukung custom prefix per-server.
 
                 # Save to history (simpan full cleaned version)
                 clean_response = self._clean_response(response)
-                db.add_chat_message(guild_id, channel_id, message.author.id, "user", prompt)
-                db.add_chat_message(guild_id, channel_id, self.bot.user.id, "assistant", clean_response)
+                self.history.add(guild_id, channel_id, message.author.id, "user", prompt)
+                self.history.add(guild_id, channel_id, self.bot.user.id, "assistant", clean_response)
             else:
                 await message.reply("❌ Maaf, terjadi error. Coba lagi.")
 
@@ -932,7 +1050,8 @@ Prefix bot adalah `!` (default). Bot mendukung custom prefix per-server.
         if not HAS_DATABASE:
             return await ctx.send("Database tidak tersedia.")
 
-        history = db.get_chat_history(ctx.guild.id, ctx.channel.id, limit=limit)
+        await self.history.flush()
+        history = await adb.get_chat_history(ctx.guild.id, ctx.channel.id, limit=limit)
 
         if not history:
             embed = self._create_embed(
@@ -966,7 +1085,7 @@ Prefix bot adalah `!` (default). Bot mendukung custom prefix per-server.
     async def chatbot_clear_history(self, ctx: commands.Context):
         """Hapus chat history untuk channel ini."""
         if HAS_DATABASE:
-            db.clear_chat_history(ctx.guild.id, ctx.channel.id)
+            await self.history.clear(ctx.guild.id, ctx.channel.id)
 
         embed = self._create_embed(
             "✅ History Cleared",
@@ -1010,10 +1129,17 @@ Prefix bot adalah `!` (default). Bot mendukung custom prefix per-server.
             )
             await ctx.send(embed=embed)
 
-    def cog_unload(self):
+    async def cog_load(self):
+        """Mulai chat history flush loop saat cog di-load."""
+        if HAS_DATABASE:
+            self.history.start()
+
+    async def cog_unload(self):
         """Cleanup saat cog unload."""
+        if HAS_DATABASE:
+            await self.history.stop()
         if self.session:
-            asyncio.create_task(self.session.close())
+            await self.session.close()
 
 
 # ==================== SETUP FUNCTION ====================
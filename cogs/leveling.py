@@ -7,11 +7,15 @@ Sistem leveling dan XP untuk Discord bot.
 import discord
 from discord.ext import commands
 from datetime import datetime
+from bisect import bisect_left, insort
 import asyncio
+import time
 import config
+from utils.message_policy import leveling_settings_from_db, message_policies
 
 try:
     from dashboard.backend import database as db
+    from dashboard.backend.async_database import adb
     HAS_DATABASE = True
 except ImportError:
     HAS_DATABASE = False
@@ -29,6 +33,10 @@ def xp_required_for_level(level: int, base_xp: int = None, xp_increment: int = N
     Level 3 -> 4: 250 XP (150 + 50*2)
     Level n -> n+1: 150 + (n-1)*50
     """
+    # Pakai rumus yang sama dengan database agar level selalu konsisten
+    if HAS_DATABASE:
+        base_xp = base_xp or db.BASE_XP_PER_LEVEL
+        xp_increment = xp_increment or db.XP_INCREMENT_PER_LEVEL
     base_xp = base_xp or getattr(config, 'BASE_XP_PER_LEVEL', 150)
     xp_increment = xp_increment or getattr(config, 'XP_INCREMENT_PER_LEVEL', 50)
 
@@ -37,6 +45,262 @@ def xp_required_for_level(level: int, base_xp: int = None, xp_increment: int = N
     return base_xp + (level - 1) * xp_increment
 
 
+# ==================== XP ACCUMULATOR ====================
+
+class XPAccumulator:
+    """
+    Write-behind buffer untuk XP dari on_message.
+    Level up dihitung langsung dari salinan row di memory, sedangkan
+    penulisan ke database dikumpulkan dan di-flush per interval atau
+    saat jumlah entry mencapai batas.
+    """
+
+    def __init__(self, flush_interval_ms: int = None, max_entries: int = None):
+        self.flush_interval = (flush_interval_ms or getattr(config, 'XP_FLUSH_INTERVAL_MS', 5000)) / 1000
+        self.max_entries = max_entries or getattr(config, 'XP_FLUSH_MAX_ENTRIES', 100)
+        # Salinan row yang belum di-flush: {(guild_id, user_id): dict}
+        self.pending = {}
+        # Batch yang sedang ditulis ke database
+        self.inflight = {}
+        # Jumlah flush yang sudah selesai (untuk mendeteksi read database yang basi)
+        self.flush_count = 0
+        self._flush_event = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def start(self):
+        """Mulai background flush loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Hentikan flush loop dan tulis semua data yang tersisa."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def get(self, guild_id: int, user_id: int) -> dict:
+        """Dapatkan salinan row yang belum di-flush (None jika tidak ada)."""
+        key = (guild_id, user_id)
+        return self.pending.get(key) or self.inflight.get(key)
+
+    def _buffered_row(self, key: tuple) -> dict:
+        """Row pending untuk key; dari batch yang sedang ditulis jika ada (bukan dari database)."""
+        row = self.pending.get(key)
+        if row is None and key in self.inflight:
+            row = dict(self.inflight[key], message_delta=0)
+            self.pending[key] = row
+        return row
+
+    async def add_xp(self, guild_id: int, user_id: int, xp_amount: int):
+        """Tambah XP di memory. Returns (leveled_up, old_level, new_level, new_xp)."""
+        key = (guild_id, user_id)
+        row = self._buffered_row(key)
+        while row is None:
+            flushes = self.flush_count
+            data = await adb.get_user_xp(guild_id, user_id)
+            # Pesan lain mungkin sudah membuat row selama menunggu query
+            row = self._buffered_row(key)
+            if row is None and self.flush_count != flushes:
+                # Flush selesai selama query: data mungkin sudah basi, baca ulang
+                continue
+            if row is None:
+                row = {
+                    'xp': data.get('xp', 0) or 0,
+                    'level': data.get('level', 1) or 1,
+                    'total_xp': data.get('total_xp', 0) or 0,
+                    'message_count': data.get('message_count', 0) or 0,
+                    'message_delta': 0
+                }
+                self.pending[key] = row
+
+        old_level = row['level']
+
+        # Sama dengan perhitungan di db.add_user_xp (closed-form)
+        new_level, new_xp = db.level_from_total_xp(db.total_xp_for_level(old_level) + row['xp'] + xp_amount)
+
+        row['xp'] = new_xp
+        row['level'] = new_level
+        row['total_xp'] += xp_amount
+        row['message_count'] += 1
+        row['message_delta'] += 1
+
+        if len(self.pending) >= self.max_entries:
+            self._flush_event.set()
+
+        return new_level > old_level, old_level, new_level, new_xp
+
+    async def discard(self, guild_id: int, user_id: int = None):
+        """Buang data pending (misal sebelum reset/set XP oleh admin).
+
+        Menunggu flush yang sedang berjalan selesai, supaya batch lama tidak
+        menimpa reset atau dikembalikan ke pending saat flush gagal.
+        """
+        async with self._lock:
+            if user_id is None:
+                for key in [k for k in self.pending if k[0] == guild_id]:
+                    del self.pending[key]
+            else:
+                self.pending.pop((guild_id, user_id), None)
+
+    async def flush(self):
+        """Tulis semua data pending ke database dalam satu batch."""
+        async with self._lock:
+            if not self.pending:
+                return
+
+            batch = self.pending
+            self.pending = {}
+            self.inflight = batch
+            rows = [
+                (guild_id, user_id, row['xp'], row['level'], row['total_xp'], row['message_delta'])
+                for (guild_id, user_id), row in batch.items()
+            ]
+
+            try:
+                success = await adb.flush_user_xp_batch(rows)
+            finally:
+                self.inflight = {}
+                self.flush_count += 1
+
+            if success:
+                return
+
+            # Gagal: kembalikan ke pending, gabungkan dengan data baru yang masuk selama flush
+            print(f"[Leveling] Flush failed, retrying {len(rows)} entries later")
+            for key, row in batch.items():
+                newer = self.pending.get(key)
+                if newer is None:
+                    self.pending[key] = row
+                else:
+                    newer['message_delta'] += row['message_delta']
+
+    async def _flush_loop(self):
+        """Background loop: flush per interval atau saat buffer penuh."""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[Leveling] Error flushing XP: {e}")
+
+
+# ==================== RANK INDEX ====================
+
+class RankIndex:
+    """
+    Index rank/leaderboard per guild di memory (sorted array + bisect).
+    Urutan sama dengan leaderboard: level DESC, xp DESC. Di-load saat pertama
+    dibutuhkan dan di-update setiap ada penulisan XP dari bot.
+    """
+
+    def __init__(self, xp_buffer: XPAccumulator = None, ttl: int = None):
+        # Data XP yang belum di-flush, ditimpakan setelah load dari database
+        self.xp_buffer = xp_buffer
+        # Reload berkala agar perubahan dari dashboard tetap terbaca
+        self.ttl = ttl or getattr(config, 'RANK_INDEX_TTL', 300)
+        # {guild_id: sorted list of (-level, -xp, user_id)}
+        self._keys = {}
+        # {guild_id: {user_id: row}}
+        self._rows = {}
+        self._loaded_at = {}
+        self._locks = {}
+
+    @staticmethod
+    def _sort_key(user_id: int, row: dict) -> tuple:
+        return (-(row.get('level') or 0), -(row.get('xp') or 0), user_id)
+
+    async def _ensure_loaded(self, guild_id: int):
+        """Load semua user XP guild dari database (lazy)."""
+        loaded_at = self._loaded_at.get(guild_id)
+        if loaded_at is not None and time.monotonic() - loaded_at < self.ttl:
+            return
+
+        lock = self._locks.setdefault(guild_id, asyncio.Lock())
+        async with lock:
+            loaded_at = self._loaded_at.get(guild_id)
+            if loaded_at is not None and time.monotonic() - loaded_at < self.ttl:
+                return
+
+            data = await adb.get_all_guild_users_xp(guild_id)
+            rows = {}
+            for entry in data:
+                rows[entry['user_id']] = {
+                    'user_id': entry['user_id'],
+                    'xp': entry.get('xp') or 0,
+                    'level': entry.get('level') or 0,
+                    'total_xp': entry.get('total_xp') or 0,
+                    'message_count': entry.get('message_count') or 0
+                }
+            self._rows[guild_id] = rows
+            self._keys[guild_id] = sorted(self._sort_key(uid, row) for uid, row in rows.items())
+            self._loaded_at[guild_id] = time.monotonic()
+
+            if self.xp_buffer is not None:
+                pending = list(self.xp_buffer.inflight.items()) + list(self.xp_buffer.pending.items())
+                for (pending_guild_id, user_id), row in pending:
+                    if pending_guild_id == guild_id:
+                        self.update(guild_id, user_id, row)
+
+    def update(self, guild_id: int, user_id: int, row: dict):
+        """Update posisi satu user secara incremental (no-op jika guild belum di-load)."""
+        rows = self._rows.get(guild_id)
+        if rows is None or row is None:
+            return
+
+        keys = self._keys[guild_id]
+        old = rows.get(user_id)
+        if old is not None:
+            old_key = self._sort_key(user_id, old)
+            i = bisect_left(keys, old_key)
+            if i < len(keys) and keys[i] == old_key:
+                del keys[i]
+
+        new = {
+            'user_id': user_id,
+            'xp': row.get('xp') or 0,
+            'level': row.get('level') or 0,
+            'total_xp': row.get('total_xp') or 0,
+            'message_count': row.get('message_count') or 0
+        }
+        rows[user_id] = new
+        insort(keys, self._sort_key(user_id, new))
+
+    def invalidate(self, guild_id: int = None):
+        """Buang index guild (atau semua guild), akan di-load ulang saat dibutuhkan."""
+        if guild_id is None:
+            self._keys.clear()
+            self._rows.clear()
+            self._loaded_at.clear()
+        else:
+            self._keys.pop(guild_id, None)
+            self._rows.pop(guild_id, None)
+            self._loaded_at.pop(guild_id, None)
+
+    async def get_rank(self, guild_id: int, user_id: int) -> int:
+        """Rank user (1 = teratas), 0 jika belum punya data."""
+        await self._ensure_loaded(guild_id)
+        row = self._rows.get(guild_id, {}).get(user_id)
+        if row is None:
+            return 0
+        return bisect_left(self._keys[guild_id], self._sort_key(user_id, row)) + 1
+
+    async def get_page(self, guild_id: int, limit: int = 10, offset: int = 0) -> list:
+        """Ambil satu halaman leaderboard."""
+        await self._ensure_loaded(guild_id)
+        rows = self._rows.get(guild_id, {})
+        return [dict(rows[key[2]]) for key in self._keys.get(guild_id, [])[offset:offset + limit]]
+
+
 # ==================== PERMISSION CHECK ====================
 
 def has_leveling_role():
@@ -66,12 +330,26 @@ class Leveling(commands.Cog):
         self.bot = bot
         # Cooldown tracking: {(guild_id, user_id): datetime}
         self.xp_cooldowns = {}
+        # Write-behind buffer untuk XP dari on_message
+        self.xp_buffer = XPAccumulator()
+        # Index rank/leaderboard per guild
+        self.rank_index = RankIndex(self.xp_buffer)
 
         # Initialize database on load
         if HAS_DATABASE:
             db.init_db()
             print("[Leveling] Database initialized")
 
+    async def cog_load(self):
+        """Mulai XP flush loop saat cog di-load."""
+        if HAS_DATABASE:
+            self.xp_buffer.start()
+
+    async def cog_unload(self):
+        """Flush XP yang tersisa saat cog di-unload."""
+        if HAS_DATABASE:
+            await self.xp_buffer.stop()
+
     def _create_embed(self, title: str, description: str, color: int) -> discord.Embed:
         """Helper untuk membuat embed."""
         return discord.Embed(
@@ -83,44 +361,14 @@ class Leveling(commands.Cog):
     def _get_leveling_settings(self, guild_id: int) -> dict:
         """Dapatkan guild leveling settings."""
         if HAS_DATABASE:
-            settings = db.get_leveling_settings(guild_id)
-            if settings:
-                # Parse exempt_roles from JSON if it's a string
-                exempt_roles = settings.get('exempt_roles', [])
-                if isinstance(exempt_roles, str):
-                    import json
-                    try:
-                        exempt_roles = json.loads(exempt_roles)
-                    except:
-                        exempt_roles = []
-
-                return {
-                    'leveling_enabled': settings.get('leveling_enabled', 1),
-                    'xp_per_message': settings.get('xp_per_message', 10),
-                    'cooldown_seconds': settings.get('cooldown_seconds', 60),
-                    'min_message_length': settings.get('min_message_length', 0),
-                    'level_up_channel_id': settings.get('level_up_channel_id'),
-                    'notify_level_up': settings.get('notify_level_up', 1),
-                    'level_up_image_url': settings.get('level_up_image_url'),
-                    'level_up_message': settings.get('level_up_message'),
-                    'exempt_roles': exempt_roles
-                }
-        return {
-            'leveling_enabled': getattr(config, 'LEVELING_ENABLED_BY_DEFAULT', True),
-            'xp_per_message': getattr(config, 'DEFAULT_XP_PER_MESSAGE', 10),
-            'cooldown_seconds': getattr(config, 'DEFAULT_XP_COOLDOWN', 60),
-            'min_message_length': 0,
-            'level_up_channel_id': None,
-            'notify_level_up': True,
-            'level_up_image_url': None,
-            'level_up_message': None,
-            'exempt_roles': []
-        }
+            return leveling_settings_from_db(db.get_leveling_settings(guild_id))
+        return leveling_settings_from_db(None)
 
     def _get_user_xp(self, guild_id: int, user_id: int) -> dict:
         """Dapatkan user XP data."""
         if HAS_DATABASE:
-            data = db.get_user_xp(guild_id, user_id)
+            # Data yang belum di-flush lebih baru dari database
+            data = self.xp_buffer.get(guild_id, user_id) or db.get_user_xp(guild_id, user_id)
             if data:
                 result = {
                     'total_xp': data.get('total_xp', 0),
@@ -137,7 +385,7 @@ class Leveling(commands.Cog):
 
     async def _handle_level_up(self, user: discord.Member, guild_id: int, old_level: int, new_level: int, current_xp: int):
         """Handle level up: notification and roles. Database already handled level calculation."""
-        settings = self._get_leveling_settings(guild_id)
+        settings = await adb.run(self._get_leveling_settings, guild_id)
 
         print(f"[Leveling] _handle_level_up: user={user.display_name}, level {old_level} -> {new_level}, xp={current_xp}")
 
@@ -185,18 +433,9 @@ class Leveling(commands.Cog):
                     print(f"[Leveling] Error sending level up notification: {e}")
 
         # Award roles
+        # (last_xp_gain sudah di-update oleh XP flush, tidak perlu query terpisah)
         await self._award_level_roles(user, guild_id, new_level)
 
-        # Update last_level_up timestamp in database
-        if HAS_DATABASE:
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE user_xp SET last_level_up = ? WHERE guild_id = ? AND user_id = ?
-            """, (new_level, guild_id, user.id))
-            conn.commit()
-            conn.close()
-
     async def _award_level_roles(self, user: discord.Member, guild_id: int, level: int):
         """Award roles untuk mencapai level tertentu."""
         if not HAS_DATABASE:
@@ -205,7 +444,7 @@ class Leveling(commands.Cog):
 
         print(f"[Leveling] _award_level_roles called: user={user.display_name}, guild_id={guild_id}, level={level}")
 
-        role_ids = db.get_all_level_roles_below(guild_id, level)
+        role_ids = await adb.get_all_level_roles_below(guild_id, level)
         print(f"[Leveling] get_all_level_roles_below returned: {role_ids}")
 
         if not role_ids:
@@ -244,27 +483,24 @@ class Leveling(commands.Cog):
         if message.author.bot or not message.guild:
             return
 
+        # XP hanya bisa disimpan jika database tersedia
+        if not HAS_DATABASE:
+            return
+
         guild_id = message.guild.id
         user_id = message.author.id
 
-        settings = self._get_leveling_settings(guild_id)
-        if not settings.get('leveling_enabled'):
+        # Policy di-compile sekali per perubahan settings (tanpa query per pesan)
+        policy = await message_policies.get(guild_id)
+        if not policy.leveling_enabled:
             return
 
-        # Cek exempt roles
-        exempt_roles = settings.get('exempt_roles', [])
-        if exempt_roles:
-            user_role_ids = [role.id for role in message.author.roles]
-            if any(role_id in user_role_ids for role_id in exempt_roles):
-                return  # User has exempt role, skip XP
-
-        # Cek excluded roles dari database (separate feature)
-        if HAS_DATABASE:
-            if db.is_user_excluded(guild_id, [role.id for role in message.author.roles]):
-                return  # User has excluded role, skip XP
+        # Cek exempt roles dan excluded roles
+        if policy.is_xp_blocked(role.id for role in message.author.roles):
+            return  # User has exempt/excluded role, skip XP
 
         # Cek minimum panjang pesan
-        min_length = settings.get('min_message_length', 0)
+        min_length = policy.min_message_length
         if min_length > 0 and len(message.content.strip()) < min_length:
             return  # Pesan terlalu pendek, skip XP
 
@@ -273,7 +509,7 @@ class Leveling(commands.Cog):
         last_time = self.xp_cooldowns.get(cooldown_key)
         now = datetime.utcnow()
 
-        cooldown_seconds = settings.get('cooldown_seconds', 60)
+        cooldown_seconds = policy.cooldown_seconds
 
         if last_time and (now - last_time).total_seconds() < cooldown_seconds:
             return  # Masih cooldown
@@ -281,27 +517,20 @@ class Leveling(commands.Cog):
         # Update cooldown
         self.xp_cooldowns[cooldown_key] = now
 
-        # Dapatkan data saat ini
-        current_data = self._get_user_xp(guild_id, user_id)
-        old_level = current_data.get('current_level', 0)
-
         # Award XP
-        xp_amount = settings.get('xp_per_message', 10)
+        xp_amount = policy.xp_per_message
 
-        # Simpan ke database dan dapatkan nilai baru
-        if HAS_DATABASE:
-            try:
-                leveled_up, new_level, new_xp = db.add_user_xp(guild_id, user_id, xp_amount)
-                print(f"[Leveling] Added {xp_amount} XP to user {user_id} in guild {guild_id} (Level: {old_level} -> {new_level}, XP: {new_xp}, leveled_up={leveled_up})")
+        # Hitung di memory, penulisan ke database di-batch oleh xp_buffer
+        try:
+            leveled_up, old_level, new_level, new_xp = await self.xp_buffer.add_xp(guild_id, user_id, xp_amount)
+            self.rank_index.update(guild_id, user_id, self.xp_buffer.get(guild_id, user_id))
 
-                # Handle level up if database detected one
-                if leveled_up:
-                    print(f"[Leveling] Level up detected! Calling _handle_level_up from level {old_level} to {new_level}")
-                    await self._handle_level_up(message.author, guild_id, old_level, new_level, new_xp)
-            except Exception as e:
-                print(f"[Leveling] ERROR: Failed to add XP for user {user_id} in guild {guild_id}: {e}")
-
-            db.update_message_count(guild_id, user_id)
+            # Handle level up langsung tanpa menunggu flush
+            if leveled_up:
+                print(f"[Leveling] Level up detected! Calling _handle_level_up from level {old_level} to {new_level}")
+                await self._handle_level_up(message.author, guild_id, old_level, new_level, new_xp)
+        except Exception as e:
+            print(f"[Leveling] ERROR: Failed to add XP for user {user_id} in guild {guild_id}: {e}")
 
     # ==================== LEVEL COMMAND ====================
 
@@ -324,7 +553,7 @@ class Leveling(commands.Cog):
         # Dapatkan rank
         rank = 0
         if HAS_DATABASE:
-            rank = db.get_user_rank(guild_id, user_id)
+            rank = await self.rank_index.get_rank(guild_id, user_id)
 
         # Buat progress bar
         progress_percent = (current_xp / xp_required) if xp_required > 0 else 1
@@ -369,7 +598,7 @@ class Leveling(commands.Cog):
 
         # Fetch lebih banyak data sebagai buffer untuk user yang leave (2x per_page)
         fetch_limit = per_page * 2
-        leaderboard_data = db.get_guild_leaderboard(ctx.guild.id, limit=fetch_limit, offset=offset)
+        leaderboard_data = await self.rank_index.get_page(ctx.guild.id, limit=fetch_limit, offset=offset)
 
         if not leaderboard_data:
             embed = self._create_embed(
@@ -656,7 +885,9 @@ class Leveling(commands.Cog):
         if not HAS_DATABASE:
             return await ctx.send("Database tidak tersedia.")
 
+        await self.xp_buffer.discard(ctx.guild.id, member.id)
         db.reset_user_xp(ctx.guild.id, member.id)
+        self.rank_index.invalidate(ctx.guild.id)
 
         embed = self._create_embed(
             "✅ XP Reset",
@@ -673,10 +904,14 @@ class Leveling(commands.Cog):
         if not HAS_DATABASE:
             return await ctx.send("Database tidak tersedia.")
 
+        # Pastikan XP dari pesan sudah tersimpan sebelum ditambah manual
+        await self.xp_buffer.flush()
+
         current_data = self._get_user_xp(ctx.guild.id, member.id)
         old_level = current_data.get('current_level', 0)
 
         success, new_level, new_xp = db.add_user_xp(ctx.guild.id, member.id, amount)
+        self.rank_index.invalidate(ctx.guild.id)
 
         if success:
             # Cek level up
@@ -730,8 +965,10 @@ class Leveling(commands.Cog):
         working_msg = await ctx.send("🔄 Memperbaiki data XP...")
 
         # Run recalculation
+        await self.xp_buffer.flush()
         guild_id = ctx.guild.id if scope == "guild" else None
-        result = db.recalculate_all_user_levels(guild_id=guild_id)
+        result = await adb.recalculate_all_user_levels(guild_id=guild_id)
+        self.rank_index.invalidate(guild_id)
 
         if result.get('success'):
             embed = self._create_embed(
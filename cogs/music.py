@@ -8,13 +8,15 @@ import discord
 from discord.ext import commands
 from discord import ui
 import asyncio
+import time
 from typing import Optional, TYPE_CHECKING
 import config
-from utils.ytmusic_player import ytmusic_player, Song, FFMPEG_OPTIONS
+from utils.ytmusic_player import ytmusic_player, Song, FFMPEG_OPTIONS, format_duration, PRIORITY_PLAYBACK, PRIORITY_PREFETCH
 
 # Check if database is available
 try:
     from dashboard.backend import database as db
+    from dashboard.backend.async_database import adb
     HAS_DATABASE = True
 except Exception as e:
     HAS_DATABASE = False
@@ -84,29 +86,6 @@ class MusicControlView(ui.View):
             except:
                 pass
 
-    def _calculate_total_duration(self, songs: list) -> str:
-        """Calculate total duration dari list lagu. Returns formatted string."""
-        total_seconds = 0
-        for song in songs:
-            if song.duration:
-                try:
-                    parts = song.duration.split(":")
-                    if len(parts) == 2:  # MM:SS
-                        total_seconds += int(parts[0]) * 60 + int(parts[1])
-                    elif len(parts) == 3:  # HH:MM:SS
-                        total_seconds += int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-                except (ValueError, IndexError):
-                    pass
-
-        hours = total_seconds // 3600
-        minutes = (total_seconds % 3600) // 60
-        seconds = total_seconds % 60
-
-        if hours > 0:
-            return f"{hours}:{minutes:02d}:{seconds:02d}"
-        else:
-            return f"{minutes}:{seconds:02d}"
-
     def _get_queue_info(self) -> str:
         """Get current queue info for embed footer."""
         queue = ytmusic_player.get_queue(self.ctx.guild.id)
@@ -114,9 +93,10 @@ class MusicControlView(ui.View):
 
         info = f"🔊 {volume}%"
 
-        if len(queue.upcoming) > 0:
-            total_duration = self._calculate_total_duration(queue.upcoming)
-            info += f" | 📋 {len(queue.upcoming)} in queue ({total_duration})"
+        upcoming_count = queue.upcoming_count
+        if upcoming_count > 0:
+            total_duration = format_duration(queue.upcoming_seconds) or "0:00"
+            info += f" | 📋 {upcoming_count} in queue ({total_duration})"
 
         if queue.loop_single:
             info += " | 🔂 Loop Current"
@@ -142,20 +122,10 @@ class MusicControlView(ui.View):
         secs = seconds % 60
         return f"{mins}:{secs:02d}"
 
-    def _parse_duration(self, duration_str: str) -> int:
-        """Parse duration string like '3:34' to seconds."""
-        if not duration_str or duration_str == "Unknown":
-            return 0
-        
-        try:
-            parts = duration_str.split(":")
-            if len(parts) == 2:
-                return int(parts[0]) * 60 + int(parts[1])
-            elif len(parts) == 3:
-                return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-        except:
-            pass
-        return 0
+    def _progress_text(self, elapsed_seconds: int, duration_seconds: int) -> str:
+        """Teks field Progress: waktu + progress bar."""
+        progress_bar = self._create_progress_bar(elapsed_seconds, duration_seconds)
+        return f"`{self._format_time(elapsed_seconds)}` / `{self._format_time(duration_seconds)}`\n{progress_bar}"
 
     def _create_now_playing_embed(self, song: 'Song', elapsed_seconds: int = 0) -> discord.Embed:
         """Create now playing embed with progress bar."""
@@ -176,19 +146,18 @@ class MusicControlView(ui.View):
         embed.add_field(name="Artist", value=song.artist, inline=True)
         embed.add_field(name="Duration", value=song.duration or "Unknown", inline=True)
 
-        if song.requester:
-            embed.add_field(name="Requested by", value=song.requester.mention, inline=True)
+        if song.requester_id:
+            embed.add_field(name="Requested by", value=song.requester_mention, inline=True)
 
         if song.thumbnail:
             embed.set_thumbnail(url=song.thumbnail)
 
         # Add progress bar if duration is known
-        duration_seconds = self._parse_duration(song.duration or "0")
+        duration_seconds = song.duration_seconds
         if duration_seconds > 0:
-            progress_bar = self._create_progress_bar(elapsed_seconds, duration_seconds)
             embed.add_field(
                 name="Progress",
-                value=f"`{self._format_time(elapsed_seconds)}` / `{self._format_time(duration_seconds)}`\n{progress_bar}",
+                value=self._progress_text(elapsed_seconds, duration_seconds),
                 inline=False
             )
 
@@ -225,12 +194,16 @@ class MusicControlView(ui.View):
         """Previous song button."""
         queue = ytmusic_player.get_queue(self.ctx.guild.id)
 
-        if queue.current_index > 0:
-            queue.current_index -= 2  # -2 because _play_next will +1
-            if interaction.guild.voice_client and interaction.guild.voice_client.is_playing():
+        previous_song = queue.previous()
+        if previous_song:
+            voice_client = interaction.guild.voice_client
+            if voice_client and (voice_client.is_playing() or voice_client.is_paused()):
+                # stop() memicu _play_next, yang memutar lagu dari history
                 ytmusic_player.set_transitioning(interaction.guild.id, True)
-                interaction.guild.voice_client.stop()
-            await interaction.response.send_message("⏮️ Playing previous song...", ephemeral=True)
+                voice_client.stop()
+            elif voice_client:
+                self.cog._play_next(self.ctx)
+            await interaction.response.send_message(f"⏮️ Playing previous song: **{previous_song.title}**", ephemeral=True)
         else:
             await interaction.response.send_message("❌ Tidak ada lagu sebelumnya!", ephemeral=True)
 
@@ -306,12 +279,6 @@ class MusicControlView(ui.View):
                 view=self
             )
 
-            # Clean up references but don't delete the message (user can see it stopped)
-            if self.ctx.guild.id in self.cog.now_playing_views:
-                del self.cog.now_playing_views[self.ctx.guild.id]
-            if self.ctx.guild.id in self.cog.song_start_times:
-                del self.cog.song_start_times[self.ctx.guild.id]
-            self.cog._cancel_progress_task(self.ctx.guild.id)
         else:
             await interaction.response.send_message("❌ Bot tidak ada di voice channel!", ephemeral=True)
 
@@ -388,9 +355,7 @@ class MusicControlView(ui.View):
             except Exception as e:
                 print(f"Error saving volume to DB: {e}")
 
-        vc = interaction.guild.voice_client
-        if vc and vc.source:
-            vc.source.volume = new_vol
+        ytmusic_player.apply_volume(interaction.guild.voice_client, new_vol)
 
         # Update embed with new volume in footer
         await self.update_embed()
@@ -416,9 +381,7 @@ class MusicControlView(ui.View):
             except Exception as e:
                 print(f"Error saving volume to DB: {e}")
 
-        vc = interaction.guild.voice_client
-        if vc and vc.source:
-            vc.source.volume = new_vol
+        ytmusic_player.apply_volume(interaction.guild.voice_client, new_vol)
 
         # Update embed with new volume in footer
         await self.update_embed()
@@ -450,12 +413,12 @@ class MusicControlView(ui.View):
         """Remove the last song from the queue."""
         queue = ytmusic_player.get_queue(self.ctx.guild.id)
 
-        if len(queue.songs) <= 1:  # Only current song or empty
+        # Remove the last song (most recently added)
+        removed_song = queue.pop_last()
+        if not removed_song:  # Only current song or empty
             await interaction.response.send_message("❌ Tidak ada lagu dalam queue untuk dihapus!", ephemeral=True)
             return
 
-        # Remove the last song (most recently added)
-        removed_song = queue.songs.pop()
         await interaction.response.send_message(f"🗑️ Menghapus lagu terakhir: **{removed_song.title}**", ephemeral=True)
 
     @ui.button(label="Lyrics", emoji="📜", style=discord.ButtonStyle.success, custom_id="lyrics", row=2)
@@ -686,7 +649,7 @@ class QueuePaginationView(ui.View):
     def update_queue(self):
         """Update queue info dan hitung total pages."""
         self.queue = ytmusic_player.get_queue(self.guild_id)
-        upcoming_count = len(self.queue.upcoming)
+        upcoming_count = self.queue.upcoming_count
         self.total_pages = max(1, (upcoming_count + self.page_size - 1) // self.page_size)
         self.update_buttons()
 
@@ -721,20 +684,19 @@ class QueuePaginationView(ui.View):
         current = self.queue.current_song
         if current:
             duration_str = f" [{current.duration}]" if current.duration else ""
-            requester_str = f" | Requested by {current.requester.display_name}" if current.requester else ""
+            requester_str = f" | Requested by {current.requester_name}" if current.requester_name else ""
             description += f"**Now Playing:**\n🎵 {current.title} - {current.artist}{duration_str}{requester_str}\n\n"
 
         # Upcoming songs
-        upcoming = self.queue.upcoming
-        if upcoming:
+        if self.queue.upcoming_count:
             start_idx = self.page * self.page_size
             end_idx = start_idx + self.page_size
-            page_songs = upcoming[start_idx:end_idx]
+            page_songs = self.queue.iter_upcoming(start_idx, end_idx)
 
             description += f"**Up Next (Page {self.page + 1}/{self.total_pages}):**\n"
             for i, song in enumerate(page_songs, start_idx + 1):
                 duration_str = f" [{song.duration}]" if song.duration else ""
-                requester_str = f" | {song.requester.display_name}" if song.requester else ""
+                requester_str = f" | {song.requester_name}" if song.requester_name else ""
                 description += f"`{i}.` {song.title} - {song.artist}{duration_str}{requester_str}\n"
         else:
             description += "*Tidak ada lagu dalam antrian*"
@@ -758,38 +720,17 @@ class QueuePaginationView(ui.View):
         embed.add_field(name="Volume", value=f"{volume}%", inline=True)
 
         # Add footer dengan page info dan total duration
-        upcoming_count = len(self.queue.upcoming)
+        upcoming_count = self.queue.upcoming_count
+        pending_count = self.queue.pending_count
+        pending_str = f" + {pending_count} from playlist" if pending_count else ""
         if upcoming_count > 0:
-            total_duration = self._calculate_total_duration(upcoming)
-            embed.set_footer(text=f"⏹️ Page {self.page + 1}/{self.total_pages} | {upcoming_count} in queue ({total_duration})")
+            total_duration = format_duration(self.queue.upcoming_seconds) or "0:00"
+            embed.set_footer(text=f"⏹️ Page {self.page + 1}/{self.total_pages} | {upcoming_count} in queue ({total_duration}){pending_str}")
         else:
             embed.set_footer(text=f"⏹️ Page {self.page + 1}/{self.total_pages}")
 
         return embed
 
-    def _calculate_total_duration(self, songs: list) -> str:
-        """Calculate total duration dari list lagu. Returns formatted string."""
-        total_seconds = 0
-        for song in songs:
-            if song.duration:
-                try:
-                    parts = song.duration.split(":")
-                    if len(parts) == 2:  # MM:SS
-                        total_seconds += int(parts[0]) * 60 + int(parts[1])
-                    elif len(parts) == 3:  # HH:MM:SS
-                        total_seconds += int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-                except (ValueError, IndexError):
-                    pass
-
-        hours = total_seconds // 3600
-        minutes = (total_seconds % 3600) // 60
-        seconds = total_seconds % 60
-
-        if hours > 0:
-            return f"{hours}:{minutes:02d}:{seconds:02d}"
-        else:
-            return f"{minutes}:{seconds:02d}"
-
     @ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary, row=0)
     async def first_page_button(self, interaction: discord.Interaction, _button: ui.Button):
         """Go to first page."""
@@ -826,13 +767,21 @@ class Music(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        # State per guild disimpan di GuildPlayerState; ini view dict-like ke field-nya
+        states = ytmusic_player.states
         # Store now playing message and view per guild
-        self.now_playing_messages: dict[int, discord.Message] = {}
-        self.now_playing_views: dict[int, MusicControlView] = {}
+        self.now_playing_messages = states.field('now_playing_message')
+        self.now_playing_views = states.field('now_playing_view')
         # Track song start times for progress bar
-        self.song_start_times: dict[int, float] = {}
-        # Track progress update tasks
-        self.progress_tasks: dict[int, asyncio.Task] = {}
+        self.song_start_times = states.field('song_start_time')
+
+    async def cog_unload(self):
+        """Hentikan update progress (render-nya memegang referensi cog ini), worker extraction dan isi cache audio."""
+        ytmusic_player.progress.stop()
+        # Worker dibuat ulang saat dipakai lagi setelah cog di-reload
+        ytmusic_player.engine.shutdown()
+        # Batalkan pengisian cache audio (FFmpeg) yang sedang berjalan
+        ytmusic_player.audio_cache.shutdown()
 
     def _create_embed(self, title: str, description: str, color: int) -> discord.Embed:
         """Helper untuk membuat embed."""
@@ -908,8 +857,8 @@ class Music(commands.Cog):
         embed.add_field(name="Artist", value=song.artist, inline=True)
         embed.add_field(name="Duration", value=song.duration or "Unknown", inline=True)
 
-        if song.requester:
-            embed.add_field(name="Requested by", value=song.requester.mention, inline=True)
+        if song.requester_id:
+            embed.add_field(name="Requested by", value=song.requester_mention, inline=True)
 
         if song.thumbnail:
             embed.set_thumbnail(url=song.thumbnail)
@@ -1030,66 +979,46 @@ class Music(commands.Cog):
             print(f"Error checking messages: {e}")
             return True  # Default to new message on error
 
-    async def _update_progress(self, guild_id: int, view: MusicControlView, duration_seconds: int):
-        """Background task to update progress bar."""
-        import time
-
-        message = self.now_playing_messages.get(guild_id)
-        if not message or not view:
-            return
-
-        start_time = view.start_time or 0
-        interval = getattr(config, 'PROGRESS_UPDATE_INTERVAL', 1)
-
-        while True:
-            await asyncio.sleep(interval)
-
-            # Check if still connected
-            vc = self.bot.get_guild(guild_id).voice_client
-            if not vc:
-                break
+    def _render_progress(self, guild_id: int, view: MusicControlView, duration_seconds: int):
+        """Render progress untuk ProgressScheduler (None = berhenti update)."""
+        guild = self.bot.get_guild(guild_id)
+        vc = guild.voice_client if guild else None
+        if not vc:
+            return None
 
-            # Check if song changed or stopped (not paused)
-            current_song = ytmusic_player.now_playing.get(guild_id)
-            if not current_song:
-                break
+        # Check if song changed or stopped (not paused)
+        current_song = ytmusic_player.now_playing.get(guild_id)
+        if not current_song or (not vc.is_playing() and not vc.is_paused()):
+            return None
 
-            # If completely stopped (not playing AND not paused), exit
-            if not vc.is_playing() and not vc.is_paused():
-                break
+        # Calculate elapsed time
+        current_time = time.time()
+        elapsed = int((current_time - (view.start_time or 0)) - view.paused_duration)
 
-            # Calculate elapsed time
-            current_time = time.time()
-            elapsed = int((current_time - start_time) - view.paused_duration)
+        # If currently paused, don't count the pause time
+        if vc.is_paused() and view.pause_start_time:
+            elapsed = int(elapsed - (current_time - view.pause_start_time))
 
-            # If currently paused, don't count the pause time
-            if vc.is_paused() and view.pause_start_time:
-                # Subtract the current pause duration from elapsed
-                current_pause_duration = current_time - view.pause_start_time
-                elapsed = int(elapsed - current_pause_duration)
+        elapsed = max(0, elapsed)
+        if elapsed > duration_seconds:
+            return None
 
-            elapsed = max(0, elapsed)
+        def build_embed() -> discord.Embed:
+            view._elapsed_seconds = elapsed
+            return view._create_now_playing_embed(current_song, elapsed)
 
-            # Update if still under duration
-            if elapsed <= duration_seconds:
-                try:
-                    embed = view._create_now_playing_embed(current_song, elapsed)
-                    await message.edit(embed=embed)
-                except discord.NotFound:
-                    break
-                except Exception as e:
-                    print(f"Error updating progress: {e}")
-                    break
-            else:
-                break
+        # Edit hanya jika teks progress/footer berubah (misal tidak saat pause)
+        key = (current_song.video_id, view._progress_text(elapsed, duration_seconds), view._get_queue_info())
+        return key, build_embed
 
-    def _cancel_progress_task(self, guild_id: int):
-        """Cancel progress update task for a guild."""
-        if guild_id in self.progress_tasks:
-            task = self.progress_tasks[guild_id]
-            if not task.done():
-                task.cancel()
-            del self.progress_tasks[guild_id]
+    def _start_progress(self, guild_id: int, view: MusicControlView, duration_seconds: int):
+        """Daftarkan pesan now playing ke progress scheduler."""
+        ytmusic_player.progress.untrack(guild_id)
+        message = self.now_playing_messages.get(guild_id)
+        if message and view and duration_seconds > 0:
+            ytmusic_player.progress.track(
+                guild_id, message, lambda: self._render_progress(guild_id, view, duration_seconds)
+            )
 
     async def _cleanup_old_messages(self, guild_id: int):
         """Clean up old now playing messages for a guild."""
@@ -1124,8 +1053,8 @@ class Music(commands.Cog):
         if guild_id in self.song_start_times:
             del self.song_start_times[guild_id]
 
-        # Cancel any running progress task
-        self._cancel_progress_task(guild_id)
+        # Stop progress updates
+        ytmusic_player.progress.untrack(guild_id)
 
         print(f"[CLEANUP] Cleanup completed for guild {guild_id}")
 
@@ -1133,11 +1062,25 @@ class Music(commands.Cog):
         """Callback untuk play next song."""
         if error:
             print(f"Player error: {error}")
+            # Stream URL mungkin sudah expire/ditolak, jangan dipakai ulang dari cache
+            failed_song = ytmusic_player.now_playing.get(ctx.guild.id)
+            if failed_song:
+                self.bot.loop.call_soon_threadsafe(ytmusic_player.invalidate_stream_url, failed_song.video_id)
+
+        if ytmusic_player.states.peek(ctx.guild.id) is None:
+            # Guild sudah di-cleanup (stop/disconnect), jangan buat state baru
+            return
 
         queue = ytmusic_player.get_queue(ctx.guild.id)
         next_song = queue.next()
 
-        if next_song and ctx.voice_client:
+        if not next_song and queue.sources and ctx.voice_client:
+            # Queue habis tapi playlist lazy masih punya halaman - muat dulu
+            asyncio.run_coroutine_threadsafe(
+                self._play_next_playlist_page(ctx),
+                self.bot.loop
+            )
+        elif next_song and ctx.voice_client:
             # User song in queue - play it (priority over buffer)
             asyncio.run_coroutine_threadsafe(
                 self._play_song(ctx, next_song),
@@ -1174,13 +1117,27 @@ class Music(commands.Cog):
                     self.bot.loop
                 )
 
+    async def _play_next_playlist_page(self, ctx: commands.Context):
+        """Muat halaman playlist berikutnya lalu lanjut putar (atau fallback jika habis)."""
+        await ytmusic_player.refill_queue(ctx.guild.id, force=True, priority=PRIORITY_PLAYBACK)
+        queue = ytmusic_player.get_queue(ctx.guild.id)
+        if queue.current_song and ctx.voice_client:
+            await self._play_song(ctx, queue.current_song)
+        else:
+            # Playlist sudah habis, lanjut ke buffer/autoplay/disconnect
+            for source in queue.sources:
+                source.close()
+            queue.sources.clear()
+            self._play_next(ctx)
+
     async def _play_unlimited_song(self, ctx: commands.Context, genre: str):
         """Fetch and play a random song for unlimited play."""
         # Get 1 random song from genre
         songs = await ytmusic_player.get_random_songs_by_genre(
             genre,
             count=1,
-            requester=ctx.guild.me  # Bot as requester
+            requester=ctx.guild.me,  # Bot as requester
+            priority=PRIORITY_PLAYBACK
         )
 
         if not songs:
@@ -1192,7 +1149,7 @@ class Music(commands.Cog):
         song = songs[0]
 
         # Verify stream URL is available before playing
-        stream_url = await ytmusic_player.get_stream_url(song.video_id)
+        stream_url = await ytmusic_player.get_stream_url(song.video_id, guild_id=ctx.guild.id)
         if not stream_url:
             # Stream URL not available, try to get another song
             print(f"[UPLAY] Stream URL not available for {song.title}, trying another...")
@@ -1220,7 +1177,7 @@ class Music(commands.Cog):
         print(f"[AUTOPLAY] Finding similar songs to: {current_song.title} - {current_song.artist}")
 
         # Get similar songs based on current song
-        songs = await ytmusic_player.get_similar_songs(current_song, count=1)
+        songs = await ytmusic_player.get_similar_songs(current_song, count=1, priority=PRIORITY_PLAYBACK, guild_id=ctx.guild.id)
 
         if not songs:
             print(f"[AUTOPLAY] No similar songs found, trying fallback to popular songs...")
@@ -1228,7 +1185,8 @@ class Music(commands.Cog):
             songs = await ytmusic_player.get_random_songs_by_genre(
                 "pop",  # Use pop as fallback genre
                 count=1,
-                requester=ctx.guild.me
+                requester=ctx.guild.me,
+                priority=PRIORITY_PLAYBACK
             )
 
             if not songs:
@@ -1241,7 +1199,7 @@ class Music(commands.Cog):
         song = songs[0]
 
         # Verify stream URL is available before playing
-        stream_url = await ytmusic_player.get_stream_url(song.video_id)
+        stream_url = await ytmusic_player.get_stream_url(song.video_id, guild_id=ctx.guild.id)
         if not stream_url:
             print(f"[AUTOPLAY] Stream URL not available for {song.title}, trying another...")
             await self._play_autoplay_song(ctx)
@@ -1265,7 +1223,8 @@ class Music(commands.Cog):
             songs = await ytmusic_player.get_random_songs_by_genre(
                 genre,
                 count=1,
-                requester=ctx.guild.me
+                requester=ctx.guild.me,
+                priority=PRIORITY_PREFETCH
             )
 
             if not songs:
@@ -1274,7 +1233,7 @@ class Music(commands.Cog):
             song = songs[0]
 
             # Verify stream URL is available
-            stream_url = await ytmusic_player.get_stream_url(song.video_id)
+            stream_url = await ytmusic_player.get_stream_url(song.video_id, priority=PRIORITY_PREFETCH, guild_id=ctx.guild.id)
             if stream_url:
                 # Valid song - add to buffer
                 ytmusic_player.set_buffer(ctx.guild.id, song)
@@ -1296,7 +1255,7 @@ class Music(commands.Cog):
         print(f"[AUTOPLAY BUFFER] Finding similar songs to: {current_song.title} - {current_song.artist}")
 
         # Get similar songs based on current song
-        songs = await ytmusic_player.get_similar_songs(current_song, count=1)
+        songs = await ytmusic_player.get_similar_songs(current_song, count=1, priority=PRIORITY_PREFETCH, guild_id=ctx.guild.id)
 
         if not songs:
             print(f"[AUTOPLAY BUFFER] No similar songs found, trying fallback...")
@@ -1304,7 +1263,8 @@ class Music(commands.Cog):
             songs = await ytmusic_player.get_random_songs_by_genre(
                 "pop",
                 count=1,
-                requester=ctx.guild.me
+                requester=ctx.guild.me,
+                priority=PRIORITY_PREFETCH
             )
             if songs:
                 print(f"[AUTOPLAY BUFFER] Using fallback pop song: {songs[0].title}")
@@ -1316,7 +1276,7 @@ class Music(commands.Cog):
         song = songs[0]
 
         # Verify stream URL is available before buffering
-        stream_url = await ytmusic_player.get_stream_url(song.video_id)
+        stream_url = await ytmusic_player.get_stream_url(song.video_id, priority=PRIORITY_PREFETCH, guild_id=ctx.guild.id)
         if stream_url:
             # Valid song - add to buffer
             ytmusic_player.set_buffer(ctx.guild.id, song)
@@ -1330,7 +1290,7 @@ class Music(commands.Cog):
         timeout = config.AUTO_DISCONNECT_TIMEOUT  # Default from config
         if HAS_DATABASE:
             try:
-                settings = db.get_guild_settings(ctx.guild.id)
+                settings = await adb.get_guild_settings(ctx.guild.id)
                 if settings and settings.get('auto_disconnect_time'):
                     timeout = settings['auto_disconnect_time']
             except Exception as e:
@@ -1340,17 +1300,9 @@ class Music(commands.Cog):
 
         if ctx.voice_client and not ctx.voice_client.is_playing():
             await ctx.voice_client.disconnect()
+            # Queue, pesan, view dan task progress dilepas sekaligus
             ytmusic_player.cleanup(ctx.guild.id)
 
-            # Clean up all references
-            if ctx.guild.id in self.now_playing_messages:
-                del self.now_playing_messages[ctx.guild.id]
-            if ctx.guild.id in self.now_playing_views:
-                del self.now_playing_views[ctx.guild.id]
-            if ctx.guild.id in self.song_start_times:
-                del self.song_start_times[ctx.guild.id]
-            self._cancel_progress_task(ctx.guild.id)
-
             embed = self._create_embed(
                 "👋 Disconnected",
                 "Bot telah disconnect karena tidak ada aktivitas.",
@@ -1358,13 +1310,114 @@ class Music(commands.Cog):
             )
             await ctx.send(embed=embed)
 
+    async def _play_spotify_collection(self, ctx: commands.Context, query: str, spotify_type: str,
+                                       loading_msg: discord.Message, voice_client: discord.VoiceClient):
+        """Load Spotify playlist/album secara progresif.
+
+        Lagu pertama langsung diputar, sisanya ditambahkan ke queue sesuai urutan
+        asli sambil embed "Loaded" di-update dengan progress.
+        """
+        queue = ytmusic_player.get_queue(ctx.guild.id)
+        embed_title = "💿 Album Loaded" if spotify_type == 'album' else "📂 Spotify Playlist Loaded"
+
+        # Check if unlimited play is active with buffer - prioritize user request
+        is_unlimited_active = ytmusic_player.is_unlimited_play_active(ctx.guild.id)
+        has_buffer = ytmusic_player.has_buffer(ctx.guild.id) if is_unlimited_active else False
+        was_playing = voice_client.is_playing() or voice_client.is_paused()
+        insert_at_front = is_unlimited_active and has_buffer and was_playing
+
+        added = []
+        missing = 0
+        total = 0
+        last_edit = 0.0
+
+        def progress_embed(done: bool) -> discord.Embed:
+            description = f"Berhasil menambahkan **{len(added)}** lagu ke queue!"
+            if not done:
+                description += f"\n\n⏳ Memuat... **{len(added) + missing}/{total}**"
+            elif missing:
+                description += f"\n\n⚠️ {missing} lagu tidak ditemukan di YouTube"
+            if insert_at_front:
+                description += "\n\n⭐ **Playing next (priority over unlimited play)**"
+            embed = self._create_embed(embed_title, description, config.COLORS["success"])
+            embed.add_field(name="First Song", value=f"{added[0].title} - {added[0].artist}", inline=False)
+            return embed
+
+        async for index, total, song in ytmusic_player.iter_spotify_playlist_songs(query, ctx.author):
+            # Berhenti jika bot sudah disconnect selama loading
+            if not ctx.voice_client:
+                print(f"[SPOTIFY] Voice disconnected, stop loading {spotify_type}")
+                return
+
+            if not song:
+                missing += 1
+                continue
+
+            if insert_at_front:
+                queue.insert_at_front(song, offset=len(added))
+            else:
+                queue.add(song)
+            added.append(song)
+
+            if len(added) == 1:
+                if not was_playing:
+                    # Enable autoplay automatically for user-requested playlist (so skip button always works)
+                    if not is_unlimited_active:
+                        ytmusic_player.set_autoplay(ctx.guild.id, True)
+                        # Clear any existing buffer since the vibe is changing
+                        ytmusic_player.clear_buffer(ctx.guild.id)
+                        print("[AUTOPLAY] Automatically enabled for user-requested playlist (buffer cleared)")
+                    first_song = queue.current_song
+                    if first_song:
+                        await self._play_song(ctx, first_song)
+                elif not is_unlimited_active:
+                    # Clear buffer since user is adding new songs (vibe change)
+                    ytmusic_player.clear_buffer(ctx.guild.id)
+                    print("[AUTOPLAY] Buffer cleared - user added playlist to queue")
+
+            # Update progress maksimal setiap 2 detik (rate limit edit message)
+            if time.monotonic() - last_edit >= 2:
+                last_edit = time.monotonic()
+                try:
+                    await loading_msg.edit(embed=progress_embed(done=False))
+                except discord.HTTPException:
+                    pass
+
+        if not added:
+            embed = self._create_embed(
+                "❌ Error",
+                "Tidak dapat memuat playlist! Pastikan playlist bersifat publik.",
+                config.COLORS["error"]
+            )
+            await loading_msg.edit(embed=embed)
+            return
+
+        try:
+            await loading_msg.edit(embed=progress_embed(done=True))
+        except discord.HTTPException:
+            pass
+
+        if insert_at_front:
+            print(f"[PRIORITY] Playlist with {len(added)} songs inserted at front")
+
+        if was_playing:
+            # Already playing - refresh now playing message
+            current_song = queue.current_song
+            if current_song:
+                await self._send_now_playing_message(ctx, current_song)
+
     async def _play_song(self, ctx: commands.Context, song: Song):
         """Play a song with smart message editing."""
         try:
+            # Lagu yang sudah ada di cache disk tidak perlu extract ke YouTube
+            stream_url = None
+            cached_path = ytmusic_player.audio_cache.get_path(song.video_id)
+
             # Get fresh stream URL
-            stream_url = await ytmusic_player.get_stream_url(song.video_id)
+            if not cached_path:
+                stream_url = await ytmusic_player.get_stream_url(song.video_id, guild_id=ctx.guild.id)
 
-            if not stream_url:
+            if not stream_url and not cached_path:
                 embed = self._create_embed(
                     "❌ Error",
                     f"Gagal mendapatkan stream URL untuk **{song.title}**",
@@ -1374,13 +1427,14 @@ class Music(commands.Cog):
                 self._play_next(ctx)
                 return
 
-            song.url = stream_url
+            if stream_url:
+                song.url = stream_url
 
             # Load volume from database (always check for dashboard changes)
             volume = None
             if HAS_DATABASE:
                 try:
-                    settings = db.get_guild_settings(ctx.guild.id)
+                    settings = await adb.get_guild_settings(ctx.guild.id)
                     if settings and settings.get('music_default_volume') is not None:
                         volume = settings['music_default_volume'] / 100  # Convert to 0.0-1.0
                 except Exception as e:
@@ -1393,7 +1447,14 @@ class Music(commands.Cog):
             # Update in-memory volume to match what we're using
             ytmusic_player.set_volume(ctx.guild.id, volume)
 
-            source = ytmusic_player.create_audio_source(stream_url, volume)
+            # Pakai FFmpeg yang sudah di-spawn sebelum lagu sebelumnya selesai (jika ada)
+            source = ytmusic_player.take_warm_source(ctx.guild.id, song, volume)
+            if source is None and cached_path:
+                source = ytmusic_player.create_audio_source(cached_path, volume, opus=True, local=True)
+            if source is None:
+                source = ytmusic_player.create_audio_source(
+                    stream_url, volume, opus=ytmusic_player.is_opus_stream(song.video_id)
+                )
 
             ytmusic_player.now_playing[ctx.guild.id] = song
 
@@ -1410,6 +1471,19 @@ class Music(commands.Cog):
             # Clear transitioning state now that song is playing
             ytmusic_player.set_transitioning(ctx.guild.id, False)
 
+            # Simpan ke cache disk di background untuk pemutaran berikutnya
+            if stream_url:
+                ytmusic_player.cache_audio(song, stream_url)
+
+            # Resolve stream URL lagu berikutnya di queue agar transisi instan
+            ytmusic_player.schedule_lookahead(ctx.guild.id)
+            ytmusic_player.schedule_warm_source(ctx.guild.id, ctx.voice_client, song.duration_seconds, volume)
+
+            # Muat halaman playlist berikutnya sebelum queue habis (background task)
+            queue = ytmusic_player.get_queue(ctx.guild.id)
+            if queue.needs_refill():
+                asyncio.create_task(ytmusic_player.refill_queue(ctx.guild.id))
+
             # Preload next song if unlimited play is active (background task)
             if ytmusic_player.is_unlimited_play_active(ctx.guild.id):
                 asyncio.create_task(self._preload_next_song(ctx))
@@ -1422,8 +1496,7 @@ class Music(commands.Cog):
             existing_view = self.now_playing_views.get(ctx.guild.id)
 
             # Calculate duration for progress bar (do this early for both cases)
-            temp_view = MusicControlView(self, ctx)
-            duration_seconds = temp_view._parse_duration(song.duration or "0")
+            duration_seconds = song.duration_seconds
 
             should_edit = False
 
@@ -1447,12 +1520,8 @@ class Music(commands.Cog):
                 embed = existing_view._create_now_playing_embed(song, 0)
                 await existing_message.edit(embed=embed, view=existing_view)
 
-                # Start progress update task
-                self._cancel_progress_task(ctx.guild.id)
-                if duration_seconds > 0:
-                    self.progress_tasks[ctx.guild.id] = asyncio.create_task(
-                        self._update_progress(ctx.guild.id, existing_view, duration_seconds)
-                    )
+                # Start progress updates
+                self._start_progress(ctx.guild.id, existing_view, duration_seconds)
             else:
                 # Delete old message if exists
                 if existing_message:
@@ -1475,12 +1544,8 @@ class Music(commands.Cog):
                 self.now_playing_messages[ctx.guild.id] = message
                 self.now_playing_views[ctx.guild.id] = view
 
-                # Start progress update task
-                self._cancel_progress_task(ctx.guild.id)
-                if duration_seconds > 0:
-                    self.progress_tasks[ctx.guild.id] = asyncio.create_task(
-                        self._update_progress(ctx.guild.id, view, duration_seconds)
-                    )
+                # Start progress updates
+                self._start_progress(ctx.guild.id, view, duration_seconds)
             
         except Exception as e:
             print(f"Error playing song: {e}")
@@ -1512,7 +1577,7 @@ class Music(commands.Cog):
         view._elapsed_seconds = 0
 
         # Calculate duration
-        duration_seconds = view._parse_duration(song.duration or "0")
+        duration_seconds = song.duration_seconds
 
         # Create embed
         embed = view._create_now_playing_embed(song, 0)
@@ -1547,12 +1612,8 @@ class Music(commands.Cog):
             view.message = message
             self.now_playing_messages[ctx.guild.id] = message
 
-        # Start/restart progress update task
-        self._cancel_progress_task(ctx.guild.id)
-        if duration_seconds > 0:
-            self.progress_tasks[ctx.guild.id] = asyncio.create_task(
-                self._update_progress(ctx.guild.id, view, duration_seconds)
-            )
+        # Start/restart progress updates
+        self._start_progress(ctx.guild.id, view, duration_seconds)
 
     # ==================== PLAY COMMAND ====================
     @commands.command(name="play", aliases=["p"])
@@ -1598,18 +1659,16 @@ class Music(commands.Cog):
             )
             loading_msg = await ctx.send(embed=loading_embed)
 
-            # Get songs based on URL type
-            if spotify_type == 'playlist':
-                songs = await ytmusic_player.get_spotify_playlist_songs(query, ctx.author)
-            elif spotify_type == 'album':
-                songs = await ytmusic_player.get_spotify_playlist_songs(query, ctx.author)
-            else:
-                songs = await ytmusic_player.get_playlist_songs(query, ctx.author)
+            # Spotify: resolve paralel dan mulai putar begitu lagu pertama ketemu
+            if spotify_type in ('playlist', 'album'):
+                await self._play_spotify_collection(ctx, query, spotify_type, loading_msg, voice_client)
+                return
+
+            # Playlist YouTube: hanya halaman pertama, sisanya dimuat saat queue hampir habis
+            source, songs = await ytmusic_player.open_playlist(query, ctx.author)
             
             if not songs:
                 error_msg = "Tidak dapat memuat playlist! Pastikan playlist bersifat publik."
-                if spotify_type:
-                    error_msg = "Fitur playlist/album Spotify belum tersedia. Untuk saat ini gunakan **single track link** saja.\n\nContoh: `!play https://open.spotify.com/track/xxx`"
 
                 embed = self._create_embed(
                     "❌ Error",
@@ -1637,24 +1696,21 @@ class Music(commands.Cog):
             else:
                 for song in songs:
                     queue.add(song)
+            if source is not None:
+                queue.sources.append(source)
+            total_songs = len(songs) + (source.remaining if source else 0)
 
             await loading_msg.delete()
 
-            # Set embed title based on source
-            if spotify_type == 'album':
-                embed_title = "💿 Album Loaded"
-            elif spotify_type == 'playlist':
-                embed_title = "📂 Spotify Playlist Loaded"
-            else:
-                embed_title = "📂 Playlist Loaded"
+            embed_title = "📂 Playlist Loaded"
 
             # Check if we inserted at front for priority
             is_priority = is_unlimited_active and has_buffer and voice_client and (voice_client.is_playing() or voice_client.is_paused())
 
             if is_priority:
-                description = f"Berhasil menambahkan **{len(songs)}** lagu ke queue!\n\n⭐ **Playing next (priority over unlimited play)**"
+                description = f"Berhasil menambahkan **{total_songs}** lagu ke queue!\n\n⭐ **Playing next (priority over unlimited play)**"
             else:
-                description = f"Berhasil menambahkan **{len(songs)}** lagu ke queue!"
+                description = f"Berhasil menambahkan **{total_songs}** lagu ke queue!"
 
             embed = self._create_embed(
                 embed_title,
@@ -1906,8 +1962,7 @@ class Music(commands.Cog):
                 print(f"Error saving volume to DB: {e}")
 
         # Update current source volume if playing
-        if ctx.voice_client and ctx.voice_client.source:
-            ctx.voice_client.source.volume = volume / 100
+        ytmusic_player.apply_volume(ctx.voice_client, volume / 100)
 
         embed = self._create_embed(
             "🔊 Volume Set",
@@ -2034,7 +2089,9 @@ class Music(commands.Cog):
         """Hapus lagu terakhir dari queue."""
         queue = ytmusic_player.get_queue(ctx.guild.id)
 
-        if len(queue.songs) <= 1:  # Only current song or empty
+        # Remove the last song (most recently added) - songs[0] is current
+        removed_song = queue.pop_last()
+        if not removed_song:  # Only current song or empty
             embed = self._create_embed(
                 "❌ Error",
                 "Tidak ada lagu dalam queue untuk dihapus!",
@@ -2042,8 +2099,6 @@ class Music(commands.Cog):
             )
             return await ctx.send(embed=embed)
 
-        # Remove the last song (most recently added) - songs[0] is current
-        removed_song = queue.songs.pop()
         embed = self._create_embed(
             "🗑️ Lagu Terakhir Dihapus",
             f"Menghapus: **{removed_song.title}**",
@@ -2062,7 +2117,7 @@ class Music(commands.Cog):
         )
         searching_msg = await ctx.send(embed=searching_embed)
 
-        results = await ytmusic_player.search(query, limit=5)
+        results = await ytmusic_player.search(query, limit=5, guild_id=ctx.guild.id)
         
         if not results:
             embed = self._create_embed(
@@ -2491,7 +2546,7 @@ class Music(commands.Cog):
         song = song[0]  # Get first (and only) song
 
         # Verify stream URL is available before playing
-        stream_url = await ytmusic_player.get_stream_url(song.video_id)
+        stream_url = await ytmusic_player.get_stream_url(song.video_id, guild_id=ctx.guild.id)
         if not stream_url:
             embed = self._create_embed(
                 "❌ Error",
@@ -2533,7 +2588,7 @@ class Music(commands.Cog):
             description = f"Memutar **{song.title}** - {song.artist}"
         else:
             # Check position in queue
-            position = len(queue.upcoming)
+            position = queue.upcoming_count
             if position == 0:
                 description = f"Berikutnya: **{song.title}** - {song.artist}"
             else:
@@ -2603,7 +2658,7 @@ class Music(commands.Cog):
         song = song[0]  # Get first (and only) song
 
         # Verify stream URL is available before playing
-        stream_url = await ytmusic_player.get_stream_url(song.video_id)
+        stream_url = await ytmusic_player.get_stream_url(song.video_id, guild_id=ctx.guild.id)
         if not stream_url:
             embed = self._create_embed(
                 "❌ Error",
@@ -2645,7 +2700,7 @@ class Music(commands.Cog):
             description = f"Memutar **{song.title}** - {song.artist}"
         else:
             # Check position in queue
-            position = len(queue.upcoming)
+            position = queue.upcoming_count
             if position == 0:
                 description = f"Berikutnya: **{song.title}** - {song.artist}"
             else:
@@ -2671,7 +2726,8 @@ class Music(commands.Cog):
             song = await ytmusic_player.get_random_songs_by_genre(
                 search_query,
                 count=1,
-                requester=ctx.author
+                requester=ctx.author,
+                priority=PRIORITY_PREFETCH
             )
             if song:
                 song = song[0]
@@ -2934,10 +2990,6 @@ async def setup(bot: commands.Bot):
     """Setup function untuk load cog."""
     # Reset all autoplay states on bot startup to ensure clean state
     print("[MUSIC] Resetting autoplay states on startup...")
-    ytmusic_player.autoplay_mode.clear()
-    ytmusic_player.buffered_songs.clear()
-    ytmusic_player.transitioning.clear()
-    ytmusic_player.unlimited_play_mode.clear()
-    ytmusic_player.unlimited_play_genre.clear()
+    ytmusic_player.states.reset_modes()
     print("[MUSIC] Autoplay states reset complete.")
     await bot.add_cog(Music(bot))
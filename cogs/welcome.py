@@ -21,6 +21,7 @@ except ImportError:
 # Import database (try/except in case dashboard not installed)
 try:
     from dashboard.backend import database as db
+    from dashboard.backend.async_database import adb
     HAS_DATABASE = True
 except ImportError:
     HAS_DATABASE = False
@@ -46,6 +47,15 @@ def get_guild_settings(guild_id: int) -> dict:
     return {}
 
 
+async def async_get_guild_settings(guild_id: int) -> dict:
+    """Get guild settings from database tanpa blocking event loop."""
+    if HAS_DATABASE:
+        settings = await adb.get_guild_settings(guild_id)
+        if settings:
+            return settings
+    return {}
+
+
 def has_welcome_role():
     """Custom check for welcome admin role permission."""
     async def predicate(ctx: commands.Context) -> bool:
@@ -187,10 +197,11 @@ class Welcome(commands.Cog):
 
         return embed
 
-    def _get_welcome_channel(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
+    def _get_welcome_channel(self, guild: discord.Guild, settings: dict = None) -> Optional[discord.TextChannel]:
         """Get welcome channel untuk guild."""
         # Check database first
-        settings = get_guild_settings(guild.id)
+        if settings is None:
+            settings = get_guild_settings(guild.id)
         if settings and settings.get('welcome_channel_id'):
             channel_id = int(settings['welcome_channel_id'])  # Convert to int
             channel = guild.get_channel(channel_id)
@@ -249,12 +260,13 @@ class Welcome(commands.Cog):
         # Last resort: system channel
         return guild.system_channel
 
-    def _get_auto_roles(self, guild: discord.Guild) -> list[discord.Role]:
+    def _get_auto_roles(self, guild: discord.Guild, settings: dict = None) -> list[discord.Role]:
         """Get multiple auto-assign roles untuk guild."""
         roles = []
 
         # Check database first for new auto_role_ids (multi-select)
-        settings = get_guild_settings(guild.id)
+        if settings is None:
+            settings = get_guild_settings(guild.id)
         if settings and settings.get('auto_role_ids'):
             auto_role_ids = settings['auto_role_ids']
             if isinstance(auto_role_ids, list):
@@ -286,12 +298,14 @@ class Welcome(commands.Cog):
         if member.bot:
             return
 
+        # Ambil settings sekali tanpa blocking event loop
+        settings = await async_get_guild_settings(member.guild.id)
+
         # Get welcome channel
-        channel = self._get_welcome_channel(member.guild)
+        channel = self._get_welcome_channel(member.guild, settings)
 
         if channel:
             # Check if we should use image
-            settings = get_guild_settings(member.guild.id)
             use_image = settings.get('use_image', 0) if settings else 0
             send_gif_as_is = settings.get('send_gif_as_is', 0) if settings else 0
             send_banner_as_is = settings.get('send_banner_as_is', 0) if settings else 0
@@ -464,7 +478,7 @@ class Welcome(commands.Cog):
                     await channel.send(content=welcome_message)
 
         # Auto-assign roles
-        roles = self._get_auto_roles(member.guild)
+        roles = self._get_auto_roles(member.guild, settings)
 
         if roles:
             try:
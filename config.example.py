@@ -22,6 +22,27 @@ BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN", "")
 # Command prefix untuk bot
 PREFIX = "!"
 
+# Jumlah thread khusus untuk query database dari bot (async facade)
+DB_EXECUTOR_WORKERS = 4
+
+# PostgreSQL connection pool (dipakai bot dan dashboard)
+DB_POOL_MIN_SIZE = 1
+DB_POOL_MAX_SIZE = 10
+DB_POOL_TIMEOUT = 10.0              # Detik menunggu connection kosong
+DB_POOL_RECYCLE_USES = 1000         # Tutup connection setelah N checkout
+DB_POOL_CHECK_IDLE_SECONDS = 30.0   # Cek SELECT 1 jika idle lebih lama dari ini
+
+# Interval (detik) pengecekan versi cache guild settings
+SETTINGS_CACHE_CHECK_INTERVAL = 5.0
+
+# SQLite production mode (hanya jika DATABASE_URL kosong): WAL + satu writer thread
+SQLITE_PRODUCTION_MODE = False
+SQLITE_MMAP_SIZE = 268435456        # 256 MB
+SQLITE_CACHE_SIZE = -65536          # Negatif = KB (64 MB)
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_WRITE_BATCH_SIZE = 64        # Maksimal commit yang digabung dalam satu transaksi
+SQLITE_WRITE_BATCH_WAIT_MS = 2.0    # Tunggu commit lain sebelum menulis batch
+
 # ==================== DASHBOARD CONFIGURATION ====================
 
 # Discord OAuth2 credentials (dari Discord Developer Portal)
@@ -42,6 +63,54 @@ DEFAULT_ROLE_ID = None
 DEFAULT_VOLUME = 100
 AUTO_DISCONNECT_TIMEOUT = 300
 
+# Cache stream URL YouTube (per video_id), refresh N detik sebelum expire
+STREAM_URL_CACHE_SIZE = 256
+STREAM_URL_REFRESH_MARGIN = 600
+STREAM_URL_DEFAULT_TTL = 1800
+
+# Extraction engine yt-dlp/ytmusicapi (process pool terpisah dari event loop)
+EXTRACTION_WORKERS = 2
+EXTRACTION_TIMEOUT = 30             # Detik
+EXTRACTION_USE_PROCESSES = True     # False = thread pool (misal di host tanpa multiprocessing)
+
+# Cache hasil search YouTube Music (LRU + TTL)
+SEARCH_CACHE_MAX_ENTRIES = 512
+SEARCH_CACHE_TTL = 21600            # Detik (6 jam)
+SEARCH_CACHE_PATH = None            # Contoh: "search_cache.json" agar cache tetap ada setelah restart
+SEARCH_CACHE_SAVE_INTERVAL = 300    # Detik antar penyimpanan ke disk
+
+# Jumlah pencarian YouTube paralel saat memuat playlist/album Spotify
+SPOTIFY_RESOLVE_CONCURRENCY = 8
+# Padanan Spotify -> YouTube tersimpan dengan confidence (0..1) di bawah ini dicari ulang
+SPOTIFY_MATCH_MIN_CONFIDENCE = 0.5
+
+# Playlist YouTube dimuat per halaman (lagu per halaman) dan halaman berikutnya
+# dimuat saat sisa lagu di queue kurang dari threshold
+YOUTUBE_PLAYLIST_PAGE_SIZE = 100
+YOUTUBE_PLAYLIST_REFILL_THRESHOLD = 5
+# Batas waktu (detik) mengambil seluruh track playlist di background
+PLAYLIST_FETCH_TIMEOUT = 300
+
+# Jumlah lagu yang sudah diputar yang diingat untuk tombol Prev
+QUEUE_HISTORY_SIZE = 50
+
+# Kirim paket Opus langsung ke Discord tanpa decode/encode di Python.
+# Stream Opus di-copy apa adanya saat volume 100%; selain itu FFmpeg yang encode ulang
+OPUS_PASSTHROUGH = True
+OPUS_BITRATE = 128  # kbps, dipakai saat FFmpeg encode ulang
+
+# Jumlah lagu berikutnya di queue yang stream URL-nya di-resolve lebih dulu (0 = mati)
+PREFETCH_LOOKAHEAD = 2
+
+# Spawn FFmpeg lagu berikutnya N detik sebelum lagu saat ini selesai (0 = mati)
+WARM_SOURCE_LEAD = 5
+
+# Cache audio Opus di disk untuk lagu yang sering diputar (None = mati)
+AUDIO_CACHE_DIR = None  # contoh: "data/audio_cache"
+AUDIO_CACHE_MAX_BYTES = 2 * 1024 ** 3  # 2 GB, file paling lama dipakai dihapus duluan
+AUDIO_CACHE_MAX_TRACK_SECONDS = 900  # Lagu lebih panjang tidak di-cache
+AUDIO_CACHE_CONCURRENCY = 2  # Jumlah download cache paralel
+
 # ==================== MODERATION CONFIGURATION ====================
 
 DEFAULT_MUTE_DURATION = 10
@@ -61,6 +130,13 @@ XP_INCREMENT_PER_LEVEL = 50
 LEVELING_ENABLED_BY_DEFAULT = True
 LEVELING_ADMIN_ROLE_IDS = None
 
+# Write-behind XP: flush ke database setiap N ms atau saat M user tertunda
+XP_FLUSH_INTERVAL_MS = 5000
+XP_FLUSH_MAX_ENTRIES = 100
+
+# Index rank/leaderboard di-load ulang setiap N detik (untuk perubahan dari dashboard)
+RANK_INDEX_TTL = 300
+
 # ==================== CHATBOT CONFIGURATION ====================
 
 # Groq API Key untuk chatbot (https://console.groq.com/keys)
@@ -70,9 +146,20 @@ DEFAULT_SYSTEM_PROMPT = "Kamu 'Nothing Bot', chatbot Discord sarkas yang lucu da
 MAX_CHAT_HISTORY = 20
 GROQ_TIMEOUT = 30
 
+# Chat history: write-behind ke database setiap N ms
+CHAT_HISTORY_FLUSH_INTERVAL_MS = 2000
+# Retention: maksimal pesan yang disimpan per channel, dicek setiap N detik
+CHAT_HISTORY_MAX_PER_CHANNEL = 200
+CHAT_HISTORY_RETENTION_INTERVAL = 3600
+
 # ==================== MUSIC PROGRESS CONFIGURATION ====================
 
+# Interval minimum edit progress bar per pesan (detik)
 PROGRESS_UPDATE_INTERVAL = 1
+# Interval maksimum saat pesan tertahan rate limit / banyak guild aktif
+PROGRESS_MAX_INTERVAL = 15
+# Budget edit pesan progress per detik untuk semua guild
+PROGRESS_EDIT_BUDGET = 5
 
 # ==================== EMBED COLORS ====================
 
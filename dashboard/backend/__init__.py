@@ -4,6 +4,7 @@ Web interface and database management
 """
 
 from . import database
+from .async_database import adb
 from .app import app, DISCORD_CLIENT_ID
 
-__all__ = ['database', 'app', 'DISCORD_CLIENT_ID']
+__all__ = ['database', 'adb', 'app', 'DISCORD_CLIENT_ID']
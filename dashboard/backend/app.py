@@ -1299,6 +1299,23 @@ def serve_frontend(path=''):
     return send_from_directory(FRONTEND_DIST, 'index.html')
 
 
+# ============================================================================
+# DATABASE POOL
+# ============================================================================
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Return the request's database connection to the pool."""
+    db.release_connection()
+
+
+@app.route('/api/health/db', methods=['GET'])
+@require_login
+def db_pool_stats():
+    """Get database connection pool statistics."""
+    return jsonify(db.get_pool_stats())
+
+
 # ============================================================================
 # ERROR HANDLERS
 # ============================================================================
@@ -0,0 +1,86 @@
+"""
+Async database facade for Discord Bot
+Runs the synchronous database functions on a dedicated, bounded executor
+so the gateway event loop never waits on disk or network I/O.
+
+Usage:
+    from dashboard.backend.async_database import adb
+    settings = await adb.get_guild_settings(guild_id)
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from . import database
+
+# Jumlah thread untuk query database (default 4)
+DB_EXECUTOR_WORKERS = 4
+try:
+    from config import DB_EXECUTOR_WORKERS as CONFIG_DB_WORKERS
+    if CONFIG_DB_WORKERS:
+        DB_EXECUTOR_WORKERS = int(CONFIG_DB_WORKERS)
+except ImportError:
+    pass
+
+
+class AsyncDatabase:
+    """Mirror async dari module database: `await adb.<nama_fungsi>(...)`."""
+
+    def __init__(self, module, max_workers: int = DB_EXECUTOR_WORKERS):
+        self._module = module
+        self._max_workers = max_workers
+        self._executor = None
+        self._wrappers = {}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Executor khusus database (dibuat saat pertama dipakai)."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix="db"
+            )
+        return self._executor
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Jalankan fungsi sync apa pun di executor database."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._call, func, args, kwargs)
+
+    def _call(self, func: Callable, args: tuple, kwargs: dict) -> Any:
+        # Kembalikan connection ke pool setelah setiap panggilan
+        try:
+            return func(*args, **kwargs)
+        finally:
+            database.release_connection()
+
+    def shutdown(self, wait: bool = True):
+        """Matikan executor database."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def __getattr__(self, name: str):
+        # Hanya dipanggil untuk atribut yang tidak ada di class ini
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        wrapper = self._wrappers.get(name)
+        if wrapper is not None:
+            return wrapper
+
+        attr = getattr(self._module, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        self._wrappers[name] = wrapper
+        return wrapper
+
+
+adb = AsyncDatabase(database)
@@ -5,8 +5,13 @@ Uses SQLite for persistent storage
 
 import sqlite3
 import os
+import functools
 import sys
+import math
+import time
+import queue
 import threading
+from concurrent.futures import Future
 from typing import Optional, Dict, List, Tuple, Any
 
 # Add parent directory to path for config import
@@ -37,6 +42,36 @@ if not DATABASE_URL:
 
 IS_POSTGRES = DATABASE_URL and DATABASE_URL.startswith("postgres")
 
+
+def _get_setting(name: str, default):
+    """Get a setting from environment variables first, then config.py."""
+    value = os.getenv(name)
+    if value is not None:
+        if isinstance(default, bool):
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        return type(default)(value)
+    try:
+        import config
+        return getattr(config, name, default)
+    except ImportError:
+        return default
+
+
+# PostgreSQL connection pool configuration
+DB_POOL_MIN_SIZE = _get_setting('DB_POOL_MIN_SIZE', 1)
+DB_POOL_MAX_SIZE = _get_setting('DB_POOL_MAX_SIZE', 10)
+DB_POOL_TIMEOUT = _get_setting('DB_POOL_TIMEOUT', 10.0)
+DB_POOL_RECYCLE_USES = _get_setting('DB_POOL_RECYCLE_USES', 1000)
+DB_POOL_CHECK_IDLE_SECONDS = _get_setting('DB_POOL_CHECK_IDLE_SECONDS', 30.0)
+
+# SQLite production profile (opt-in): WAL, tuned pragmas, single writer thread
+SQLITE_PRODUCTION_MODE = _get_setting('SQLITE_PRODUCTION_MODE', False)
+SQLITE_MMAP_SIZE = _get_setting('SQLITE_MMAP_SIZE', 268435456)
+SQLITE_CACHE_SIZE = _get_setting('SQLITE_CACHE_SIZE', -65536)
+SQLITE_BUSY_TIMEOUT_MS = _get_setting('SQLITE_BUSY_TIMEOUT_MS', 5000)
+SQLITE_WRITE_BATCH_SIZE = _get_setting('SQLITE_WRITE_BATCH_SIZE', 64)
+SQLITE_WRITE_BATCH_WAIT_MS = _get_setting('SQLITE_WRITE_BATCH_WAIT_MS', 2.0)
+
 # SQLite fallback path
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'bot_database.db')
 
@@ -84,6 +119,9 @@ class PostgresConnectionWrapper:
     """Wrapper for Postgres connection."""
     def __init__(self, conn):
         self.conn = conn
+        # Pool bookkeeping
+        self.uses = 0
+        self.last_used = time.monotonic()
         
     def cursor(self):
         return PostgresCursorWrapper(self.conn.cursor(cursor_factory=RealDictCursor))
@@ -95,523 +133,1068 @@ class PostgresConnectionWrapper:
         return self.conn.rollback()
 
     def close(self):
+        # Connection dimiliki pool, kembalikan ke pool alih-alih menutupnya
+        if _pool is not None and getattr(_local, 'conn', None) is self:
+            return release_connection()
         return self.conn.close()
 
 
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class PostgresConnectionPool:
+    """Bounded, thread-safe pool of PostgreSQL connections."""
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, timeout: float = 10.0,
+                 recycle_uses: int = 1000, check_idle_seconds: float = 30.0):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.timeout = timeout
+        self.recycle_uses = recycle_uses
+        self.check_idle_seconds = check_idle_seconds
+
+        self._idle: List[PostgresConnectionWrapper] = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'discarded': 0,
+            'failed_checks': 0,
+            'timeouts': 0,
+            'waiting': 0,
+        }
 
+        for _ in range(self.min_size):
+            self._idle.append(self._connect())
+            self._size += 1
+            self._stats['created'] += 1
+
+    def _connect(self) -> PostgresConnectionWrapper:
+        pg_conn = psycopg2.connect(self.dsn)
+        pg_conn.autocommit = True
+        return PostgresConnectionWrapper(pg_conn)
+
+    def _is_alive(self, conn: PostgresConnectionWrapper) -> bool:
+        """Liveness check for connections that have been idle for a while."""
+        if conn.conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.check_idle_seconds:
+            return True
+        try:
+            with conn.conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except psycopg2.Error:
+            return False
 
-def get_connection():
-    """Get a thread-local database connection."""
-    if not hasattr(_local, 'conn') or _local.conn is None or (IS_POSTGRES and _local.conn.conn.closed):
-        if IS_POSTGRES:
+    def _close_quietly(self, conn: PostgresConnectionWrapper):
+        try:
+            conn.conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self) -> PostgresConnectionWrapper:
+        """Check out a connection, waiting up to `timeout` seconds."""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve the slot, connect outside the lock
+                    self._size += 1
+                    conn = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._stats['waiting'] += 1
+                self._cond.wait(remaining)
+                self._stats['waiting'] -= 1
+
+        failed_check = False
+        created = False
+        try:
+            if conn is not None and not self._is_alive(conn):
+                failed_check = True
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+                created = True
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._stats['failed_checks'] += failed_check
+                self._cond.notify()
+            raise
+
+        conn.uses += 1
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['created'] += created
+            self._stats['failed_checks'] += failed_check
+        return conn
+
+    def putconn(self, conn: PostgresConnectionWrapper, discard: bool = False):
+        """Return a connection to the pool (recycled after `recycle_uses` checkouts)."""
+        recycle = self.recycle_uses and conn.uses >= self.recycle_uses
+        if discard or recycle or conn.conn.closed:
+            self._close_quietly(conn)
+            with self._cond:
+                self._size -= 1
+                self._stats['recycled' if recycle and not discard else 'discarded'] += 1
+                self._cond.notify()
+            return
+
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        """Close all idle connections."""
+        with self._cond:
+            for conn in self._idle:
+                self._close_quietly(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool statistics."""
+        with self._cond:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                **self._stats,
+            }
+
+
+_pool: Optional[PostgresConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> PostgresConnectionPool:
+    """Get (and lazily create) the global PostgreSQL pool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                try:
+                    _pool = PostgresConnectionPool(
+                        DATABASE_URL,
+                        min_size=DB_POOL_MIN_SIZE,
+                        max_size=DB_POOL_MAX_SIZE,
+                        timeout=DB_POOL_TIMEOUT,
+                        recycle_uses=DB_POOL_RECYCLE_USES,
+                        check_idle_seconds=DB_POOL_CHECK_IDLE_SECONDS
+                    )
+                except Exception as e:
+                    print(f"Failed to connect to PostgreSQL: {e}")
+                    raise e
+    return _pool
+
+
+# ============================================================================
+# SQLITE PRODUCTION PROFILE
+# ============================================================================
+
+_READ_PREFIXES = ('SELECT', 'PRAGMA', 'WITH', 'EXPLAIN')
+
+
+def _connect_sqlite(readonly: bool = False, autocommit: bool = False) -> sqlite3.Connection:
+    """Open a SQLite connection with the production pragmas applied."""
+    if readonly:
+        if not os.path.exists(DB_PATH):
+            # Read-only connections cannot create the database file
+            _connect_sqlite().close()
+        conn = sqlite3.connect(f'file:{DB_PATH}?mode=ro', uri=True, check_same_thread=False,
+                               timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    else:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None if autocommit else '')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}')
+    conn.execute(f'PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}')
+    conn.execute(f'PRAGMA cache_size={int(SQLITE_CACHE_SIZE)}')
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class SQLiteWriter:
+    """
+    Single writer thread for SQLite.
+    Each commit() from any thread becomes one unit (wrapped in a SAVEPOINT);
+    units that arrive together are committed in one transaction.
+    """
+
+    def __init__(self, batch_size: int = 64, batch_wait_ms: float = 2.0):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, statements: List[Tuple[str, Any, bool]]) -> List[int]:
+        """Run statements atomically on the writer thread. Returns rowcount per statement."""
+        future = Future()
+        self._queue.put((statements, future))
+        return future.result()
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
             try:
-                # Connect to PostgreSQL
-                pg_conn = psycopg2.connect(DATABASE_URL)
-                pg_conn.autocommit = True
-                _local.conn = PostgresConnectionWrapper(pg_conn)
-            except Exception as e:
-                print(f"Failed to connect to PostgreSQL: {e}")
-                # Fallback to SQLite if Postgres fails? 
-                # For now let's raise the error to be explicit
-                raise e
+                batch.append(self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = _connect_sqlite(autocommit=True)
+        while True:
+            batch = self._next_batch()
+            results = []
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for statements, future in batch:
+                    conn.execute('SAVEPOINT unit')
+                    try:
+                        rowcounts = []
+                        for sql, params, many in statements:
+                            if many:
+                                cursor = conn.executemany(sql, params)
+                            else:
+                                cursor = conn.execute(sql, params or ())
+                            rowcounts.append(cursor.rowcount)
+                        conn.execute('RELEASE unit')
+                        results.append((future, rowcounts, None))
+                    except sqlite3.Error as e:
+                        conn.execute('ROLLBACK TO unit')
+                        conn.execute('RELEASE unit')
+                        results.append((future, None, e))
+                conn.execute('COMMIT')
+            except sqlite3.Error as e:
+                try:
+                    conn.execute('ROLLBACK')
+                except sqlite3.Error:
+                    pass
+                results = [(future, None, e) for _, future in batch]
+
+            for future, rowcounts, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(rowcounts)
+
+
+_writer: Optional[SQLiteWriter] = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer() -> SQLiteWriter:
+    """Get (and lazily start) the SQLite writer thread."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = SQLiteWriter(SQLITE_WRITE_BATCH_SIZE, SQLITE_WRITE_BATCH_WAIT_MS)
+    return _writer
+
+
+class SQLiteCursorProxy:
+    """Reads go to the read-only connection, writes are queued until commit()."""
+    def __init__(self, owner, cursor):
+        self.owner = owner
+        self.cursor = cursor
+        self.rowcount = -1
+
+    def execute(self, query, params=None):
+        if query.lstrip().upper().startswith(_READ_PREFIXES):
+            if params is None:
+                return self.cursor.execute(query)
+            return self.cursor.execute(query, params)
+        self.owner.pending.append((query, params, False, self))
+        return self
+
+    def executemany(self, query, params):
+        self.owner.pending.append((query, list(params), True, self))
+        return self
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class SQLiteConnectionProxy:
+    """Per-thread SQLite connection for production mode."""
+    def __init__(self, read_conn):
+        self.read_conn = read_conn
+        self.pending = []
+
+    def cursor(self):
+        return SQLiteCursorProxy(self, self.read_conn.cursor())
+
+    def commit(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        rowcounts = _get_writer().submit([(sql, params, many) for sql, params, many, _ in pending])
+        for (_, _, _, cursor), rowcount in zip(pending, rowcounts):
+            cursor.rowcount = rowcount
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        self.pending = []
+        return self.read_conn.close()
+
+
+def get_connection(direct: bool = False):
+    """
+    Get the database connection for the current thread.
+    PostgreSQL connections are checked out from the pool and stay bound to the
+    thread until release_connection() is called (public functions of this
+    module release it automatically, see _scoped_connection).
+    direct=True returns a plain read-write SQLite connection even in production
+    mode (for schema changes in init_db).
+    """
+    if IS_POSTGRES:
+        conn = getattr(_local, 'conn', None)
+        if conn is not None and conn.conn.closed:
+            _get_pool().putconn(conn, discard=True)
+            conn = None
+        if conn is None:
+            conn = _get_pool().getconn()
+            _local.conn = conn
+        return conn
+
+    if SQLITE_PRODUCTION_MODE and direct:
+        if getattr(_local, 'direct_conn', None) is None:
+            _local.direct_conn = _connect_sqlite()
+        return _local.direct_conn
+
+    if not hasattr(_local, 'conn') or _local.conn is None:
+        if SQLITE_PRODUCTION_MODE:
+            _local.conn = SQLiteConnectionProxy(_connect_sqlite(readonly=True))
         else:
             # Connect to SQLite
             _local.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
             _local.conn.row_factory = sqlite3.Row
-            
+
     return _local.conn
 
 
-def init_db() -> bool:
-    """
-    Initialize database tables.
-    Returns True if successful, False otherwise.
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
+def release_connection():
+    """Return the current thread's PostgreSQL connection to the pool (no-op for SQLite)."""
+    if not IS_POSTGRES:
+        return
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        _local.conn = None
+        _get_pool().putconn(conn)
 
-    try:
-        # Define table schemas based on DB type
-        pk_type = "SERIAL PRIMARY KEY" if IS_POSTGRES else "INTEGER PRIMARY KEY AUTOINCREMENT"
-        bool_type = "BOOLEAN" if IS_POSTGRES else "BOOLEAN" # Postgres has native boolean
-        
-        # Guild settings table
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS guild_settings (
-                    guild_id BIGINT PRIMARY KEY,
-                    music_auto_delete BOOLEAN DEFAULT TRUE,
-                    music_default_volume INTEGER DEFAULT 50,
-                    music_shuffle BOOLEAN DEFAULT FALSE,
-                    music_repeat BOOLEAN DEFAULT FALSE,
-                    welcome_channel_id BIGINT,
-                    welcome_message TEXT DEFAULT 'Welcome {user} to the server!',
-                    welcome_enabled BOOLEAN DEFAULT FALSE,
-                    goodbye_channel_id BIGINT,
-                    goodbye_message TEXT DEFAULT 'Goodbye {user}!',
-                    goodbye_enabled BOOLEAN DEFAULT FALSE,
-                    auto_role_enabled BOOLEAN DEFAULT FALSE,
-                    auto_role_id BIGINT,
-                    moderation_log_channel_id BIGINT,
-                    prefix TEXT DEFAULT '!'
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS guild_settings (
-                    guild_id INTEGER PRIMARY KEY,
-                    music_auto_delete BOOLEAN DEFAULT 1,
-                    music_default_volume INTEGER DEFAULT 50,
-                    music_shuffle BOOLEAN DEFAULT 0,
-                    music_repeat BOOLEAN DEFAULT 0,
-                    welcome_channel_id INTEGER,
-                    welcome_message TEXT DEFAULT 'Welcome {user} to the server!',
-                    welcome_enabled BOOLEAN DEFAULT 0,
-                    goodbye_channel_id INTEGER,
-                    goodbye_message TEXT DEFAULT 'Goodbye {user}!',
-                    goodbye_enabled BOOLEAN DEFAULT 0,
-                    auto_role_enabled BOOLEAN DEFAULT 0,
-                    auto_role_id INTEGER,
-                    moderation_log_channel_id INTEGER,
-                    prefix TEXT DEFAULT '!'
-                )
-            ''')
-
-        # Add welcome/goodbye image settings columns if they don't exist
-        # This is for migrations - adding new columns to existing databases
-        
-        # Define column types for SQLite vs Postgres
-        col_definitions = {
-            'use_image': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'banner_url': 'TEXT',
-            'welcome_text': 'TEXT DEFAULT "WELCOME"' if not IS_POSTGRES else "TEXT DEFAULT 'WELCOME'",
-            'profile_position': 'TEXT DEFAULT "center"' if not IS_POSTGRES else "TEXT DEFAULT 'center'",
-            'text_color': 'TEXT DEFAULT "#FFD700"' if not IS_POSTGRES else "TEXT DEFAULT '#FFD700'",
-            'font_family': 'TEXT DEFAULT "arial"' if not IS_POSTGRES else "TEXT DEFAULT 'arial'",
-            'banner_offset_x': 'INTEGER DEFAULT 0',
-            'banner_offset_y': 'INTEGER DEFAULT 0',
-            'avatar_offset_x': 'INTEGER DEFAULT 0',
-            'avatar_offset_y': 'INTEGER DEFAULT 0',
-            'text_offset_x': 'INTEGER DEFAULT 0',
-            'text_offset_y': 'INTEGER DEFAULT 0',
-            'send_gif_as_is': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'send_banner_as_is': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'welcome_text_size': 'INTEGER DEFAULT 56',
-            'username_text_size': 'INTEGER DEFAULT 32',
-            'avatar_size': 'INTEGER DEFAULT 180',
-            'use_goodbye_image': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'goodbye_text': 'TEXT DEFAULT "GOODBYE"' if not IS_POSTGRES else "TEXT DEFAULT 'GOODBYE'",
-            'goodbye_text_color': 'TEXT DEFAULT "#FF6B6B"' if not IS_POSTGRES else "TEXT DEFAULT '#FF6B6B'",
-            'goodbye_profile_position': 'TEXT DEFAULT "center"' if not IS_POSTGRES else "TEXT DEFAULT 'center'",
-            'goodbye_font_family': 'TEXT DEFAULT "arial"' if not IS_POSTGRES else "TEXT DEFAULT 'arial'",
-            'goodbye_banner_url': 'TEXT',
-            'goodbye_banner_offset_x': 'INTEGER DEFAULT 0',
-            'goodbye_banner_offset_y': 'INTEGER DEFAULT 0',
-            'goodbye_avatar_offset_x': 'INTEGER DEFAULT 0',
-            'goodbye_avatar_offset_y': 'INTEGER DEFAULT 0',
-            'goodbye_text_offset_x': 'INTEGER DEFAULT 0',
-            'goodbye_text_offset_y': 'INTEGER DEFAULT 0',
-            'goodbye_send_gif_as_is': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'goodbye_send_banner_as_is': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'welcome_text_bold': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'welcome_text_italic': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'welcome_text_underline': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'username_text_bold': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'username_text_italic': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'username_text_underline': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'goodbye_text_bold': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'goodbye_text_italic': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'goodbye_text_underline': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'goodbye_username_text_bold': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'goodbye_username_text_italic': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'goodbye_username_text_underline': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
-            'google_font_family': 'TEXT',
-            'custom_font_path': 'TEXT',
-            'avatar_shape': 'TEXT DEFAULT "circle"' if not IS_POSTGRES else "TEXT DEFAULT 'circle'",
-            'avatar_border_enabled': 'INTEGER DEFAULT 1' if not IS_POSTGRES else 'BOOLEAN DEFAULT TRUE',
-            'avatar_border_width': 'INTEGER DEFAULT 6',
-            'avatar_border_color': 'TEXT DEFAULT "#FFFFFF"' if not IS_POSTGRES else "TEXT DEFAULT '#FFFFFF'",
-            'goodbye_avatar_shape': 'TEXT DEFAULT "circle"' if not IS_POSTGRES else "TEXT DEFAULT 'circle'",
-            'goodbye_avatar_border_enabled': 'INTEGER DEFAULT 1' if not IS_POSTGRES else 'BOOLEAN DEFAULT TRUE',
-            'goodbye_avatar_border_width': 'INTEGER DEFAULT 6',
-            'goodbye_avatar_border_color': 'TEXT DEFAULT "#FFFFFF"' if not IS_POSTGRES else "TEXT DEFAULT '#FFFFFF'",
-            'goodbye_avatar_size': 'INTEGER DEFAULT 180',
-            'goodbye_welcome_text_size': 'INTEGER DEFAULT 56',
-            'goodbye_username_text_size': 'INTEGER DEFAULT 32',
-            'auto_role_ids': 'TEXT DEFAULT ""' if not IS_POSTGRES else "TEXT DEFAULT ''",
-            'music_channel_id': 'BIGINT' if IS_POSTGRES else 'INTEGER',
-            'auto_disconnect_time': 'INTEGER DEFAULT 300',
-        }
 
-        new_columns = [(k, v) for k, v in col_definitions.items()]
+def _scoped_connection(func):
+    """Return the pooled connection after the outermost database call that checked it out."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not IS_POSTGRES or getattr(_local, 'conn', None) is not None:
+            # SQLite, atau connection milik pemanggil luar (nested call / request Flask)
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            release_connection()
+    return wrapper
 
-        # Get existing columns
-        if IS_POSTGRES:
-            cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'guild_settings'")
-            existing_columns = {row['column_name'] for row in cursor.fetchall()}
-        else:
-            cursor.execute("PRAGMA table_info(guild_settings)")
-            existing_columns = {row[1] for row in cursor.fetchall()}
 
-        # Add missing columns
-        for column_name, column_def in new_columns:
-            if column_name not in existing_columns:
-                try:
-                    cursor.execute(f'ALTER TABLE guild_settings ADD COLUMN {column_name} {column_def}')
-                    print(f"[DB] Added column: {column_name}")
-                except Exception as e:
-                    print(f"[DB] Error adding column {column_name}: {e}")
+def get_pool_stats() -> Dict[str, Any]:
+    """Get connection pool statistics."""
+    if not IS_POSTGRES:
+        return {'backend': 'sqlite', 'pooled': False}
+    if _pool is None:
+        return {'backend': 'postgres', 'pooled': True, 'size': 0}
+    return {'backend': 'postgres', 'pooled': True, **_pool.stats()}
 
-        # Chatbot settings table
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS chatbot_settings (
-                    guild_id BIGINT PRIMARY KEY,
-                    enabled BOOLEAN DEFAULT FALSE,
-                    model_name TEXT DEFAULT 'llama-3.3-70b-versatile',
-                    max_history INTEGER DEFAULT 10,
-                    system_prompt TEXT,
-                    temperature REAL DEFAULT 0.7,
-                    channel_whitelist TEXT,
-                    enabled_channels TEXT,
-                    api_key TEXT
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS chatbot_settings (
-                    guild_id INTEGER PRIMARY KEY,
-                    enabled BOOLEAN DEFAULT 0,
-                    model_name TEXT DEFAULT 'llama-3.3-70b-versatile',
-                    max_history INTEGER DEFAULT 10,
-                    system_prompt TEXT,
-                    temperature REAL DEFAULT 0.7,
-                    channel_whitelist TEXT,
-                    enabled_channels TEXT,
-                    api_key TEXT
-                )
-            ''')
-
-        # Add missing columns to chatbot_settings (for existing databases)
-        # Add missing columns to chatbot_settings (for existing databases)
-        if IS_POSTGRES:
-            cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'chatbot_settings'")
-            existing_chatbot_columns = {row['column_name'] for row in cursor.fetchall()}
-        else:
-            cursor.execute("PRAGMA table_info(chatbot_settings)")
-            existing_chatbot_columns = {row[1] for row in cursor.fetchall()}
 
-        chatbot_new_columns = [
-            ('enabled_channels', 'TEXT'),
-            ('api_key', 'TEXT')
-        ]
+# ============================================================================
+# SCHEMA MIGRATIONS
+# ============================================================================
 
-        for column_name, column_def in chatbot_new_columns:
-            if column_name not in existing_chatbot_columns:
-                try:
-                    cursor.execute(f'ALTER TABLE chatbot_settings ADD COLUMN {column_name} {column_def}')
-                    print(f"[DB] Added chatbot_settings column: {column_name}")
-                except Exception as e:
-                    print(f"[DB] Error adding chatbot_settings column {column_name}: {e}")
+def _get_table_columns(cursor, table: str) -> set:
+    """Get existing column names of a table."""
+    if IS_POSTGRES:
+        cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name = ?", (table,))
+        return {row['column_name'] for row in cursor.fetchall()}
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
 
-        # Chat history table
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS chat_history (
-                    id SERIAL PRIMARY KEY,
-                    guild_id BIGINT NOT NULL,
-                    channel_id BIGINT NOT NULL,
-                    user_id BIGINT NOT NULL,
-                    role TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS chat_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id INTEGER NOT NULL,
-                    channel_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    role TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_guild_channel ON chat_history(guild_id, channel_id)')
-
-        # Leveling settings table
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS leveling_settings (
-                    guild_id BIGINT PRIMARY KEY,
-                    enabled BOOLEAN DEFAULT FALSE,
-                    xp_per_message INTEGER DEFAULT 10,
-                    xp_per_minute REAL DEFAULT 60.0,
-                    cooldown_seconds INTEGER DEFAULT 60,
-                    level_up_announcements BOOLEAN DEFAULT TRUE,
-                    level_up_channel_id BIGINT,
-                    xp_multiplier REAL DEFAULT 1.0
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS leveling_settings (
-                    guild_id INTEGER PRIMARY KEY,
-                    enabled BOOLEAN DEFAULT 0,
-                    xp_per_message INTEGER DEFAULT 10,
-                    xp_per_minute REAL DEFAULT 60.0,
-                    cooldown_seconds INTEGER DEFAULT 60,
-                    level_up_announcements BOOLEAN DEFAULT 1,
-                    level_up_channel_id INTEGER,
-                    xp_multiplier REAL DEFAULT 1.0
-                )
-            ''')
-        # Add min_message_length column if not exists (for existing databases)
-        try:
-            cursor.execute('ALTER TABLE leveling_settings ADD COLUMN min_message_length INTEGER DEFAULT 0')
-        except Exception:
-            pass  # Column already exists
 
-        # User XP table
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_xp (
-                    guild_id BIGINT NOT NULL,
-                    user_id BIGINT NOT NULL,
-                    xp INTEGER DEFAULT 0,
-                    level INTEGER DEFAULT 1,
-                    message_count INTEGER DEFAULT 0,
-                    total_xp BIGINT DEFAULT 0,
-                    last_xp_gain TIMESTAMP,
-                    PRIMARY KEY (guild_id, user_id),
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_xp (
-                    guild_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    xp INTEGER DEFAULT 0,
-                    level INTEGER DEFAULT 1,
-                    message_count INTEGER DEFAULT 0,
-                    total_xp INTEGER DEFAULT 0,
-                    last_xp_gain DATETIME,
-                    PRIMARY KEY (guild_id, user_id),
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_xp_level ON user_xp(guild_id, level DESC, xp DESC)')
-
-        # Level roles table
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS level_roles (
-                    id SERIAL PRIMARY KEY,
-                    guild_id BIGINT NOT NULL,
-                    level INTEGER NOT NULL,
-                    role_id BIGINT NOT NULL,
-                    stack BOOLEAN DEFAULT FALSE,
-                    UNIQUE(guild_id, level, role_id),
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS level_roles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id INTEGER NOT NULL,
-                    level INTEGER NOT NULL,
-                    role_id INTEGER NOT NULL,
-                    stack BOOLEAN DEFAULT 0,
-                    UNIQUE(guild_id, level, role_id),
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_level_roles_guild ON level_roles(guild_id, level)')
-
-        # Excluded roles table (roles that cannot gain XP)
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS excluded_roles (
-                    guild_id BIGINT NOT NULL,
-                    role_id BIGINT NOT NULL,
-                    PRIMARY KEY (guild_id, role_id),
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS excluded_roles (
-                    guild_id INTEGER NOT NULL,
-                    role_id INTEGER NOT NULL,
-                    PRIMARY KEY (guild_id, role_id),
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_excluded_roles_guild ON excluded_roles(guild_id)')
-
-        # Moderation roles table
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS moderation_roles (
-                    guild_id BIGINT NOT NULL,
-                    role_id BIGINT NOT NULL,
-                    permissions TEXT DEFAULT 'all',
-                    PRIMARY KEY (guild_id, role_id),
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS moderation_roles (
-                    guild_id INTEGER NOT NULL,
-                    role_id INTEGER NOT NULL,
-                    permissions TEXT DEFAULT 'all',
-                    PRIMARY KEY (guild_id, role_id),
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-
-        # Moderation logs table
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS moderation_logs (
-                    id SERIAL PRIMARY KEY,
-                    guild_id BIGINT NOT NULL,
-                    moderator_id BIGINT NOT NULL,
-                    user_id BIGINT NOT NULL,
-                    action TEXT NOT NULL,
-                    reason TEXT,
-                    duration INTEGER,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS moderation_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id INTEGER NOT NULL,
-                    moderator_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    action TEXT NOT NULL,
-                    reason TEXT,
-                    duration INTEGER,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_moderation_logs_guild ON moderation_logs(guild_id, timestamp DESC)')
-
-        # Welcome roles table
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS welcome_roles (
-                    id SERIAL PRIMARY KEY,
-                    guild_id BIGINT NOT NULL,
-                    role_id BIGINT NOT NULL,
-                    UNIQUE(guild_id, role_id),
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS welcome_roles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id INTEGER NOT NULL,
-                    role_id INTEGER NOT NULL,
-                    UNIQUE(guild_id, role_id),
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-
-        # Audit logs table (dashboard changes)
-        if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id SERIAL PRIMARY KEY,
-                    guild_id BIGINT NOT NULL,
-                    user_id BIGINT NOT NULL,
-                    user_name TEXT NOT NULL,
-                    action TEXT NOT NULL,
-                    category TEXT NOT NULL,
-                    details TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    guild_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    user_name TEXT NOT NULL,
-                    action TEXT NOT NULL,
-                    category TEXT NOT NULL,
-                    details TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
-                )
-            ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_logs_guild ON audit_logs(guild_id, timestamp DESC)')
-
-        # User music genres table (per-user custom music genres)
+def _add_missing_columns(cursor, table: str, columns: List[Tuple[str, str]]):
+    """ALTER TABLE ADD COLUMN untuk kolom yang belum ada (database lama)."""
+    existing_columns = _get_table_columns(cursor, table)
+    for column_name, column_def in columns:
+        if column_name not in existing_columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column_name} {column_def}')
+            print(f"[DB] Added {table} column: {column_name}")
+
+
+def _migration_001_base_schema(cursor):
+    """Baseline schema (juga meng-upgrade database lama yang dibuat sebelum schema_version ada)."""
+    # Guild settings table
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS guild_settings (
+                guild_id BIGINT PRIMARY KEY,
+                music_auto_delete BOOLEAN DEFAULT TRUE,
+                music_default_volume INTEGER DEFAULT 50,
+                music_shuffle BOOLEAN DEFAULT FALSE,
+                music_repeat BOOLEAN DEFAULT FALSE,
+                welcome_channel_id BIGINT,
+                welcome_message TEXT DEFAULT 'Welcome {user} to the server!',
+                welcome_enabled BOOLEAN DEFAULT FALSE,
+                goodbye_channel_id BIGINT,
+                goodbye_message TEXT DEFAULT 'Goodbye {user}!',
+                goodbye_enabled BOOLEAN DEFAULT FALSE,
+                auto_role_enabled BOOLEAN DEFAULT FALSE,
+                auto_role_id BIGINT,
+                moderation_log_channel_id BIGINT,
+                prefix TEXT DEFAULT '!'
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS guild_settings (
+                guild_id INTEGER PRIMARY KEY,
+                music_auto_delete BOOLEAN DEFAULT 1,
+                music_default_volume INTEGER DEFAULT 50,
+                music_shuffle BOOLEAN DEFAULT 0,
+                music_repeat BOOLEAN DEFAULT 0,
+                welcome_channel_id INTEGER,
+                welcome_message TEXT DEFAULT 'Welcome {user} to the server!',
+                welcome_enabled BOOLEAN DEFAULT 0,
+                goodbye_channel_id INTEGER,
+                goodbye_message TEXT DEFAULT 'Goodbye {user}!',
+                goodbye_enabled BOOLEAN DEFAULT 0,
+                auto_role_enabled BOOLEAN DEFAULT 0,
+                auto_role_id INTEGER,
+                moderation_log_channel_id INTEGER,
+                prefix TEXT DEFAULT '!'
+            )
+        ''')
+
+    # Add welcome/goodbye image settings columns if they don't exist
+    # This is for migrations - adding new columns to existing databases
+    
+    # Define column types for SQLite vs Postgres
+    col_definitions = {
+        'use_image': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'banner_url': 'TEXT',
+        'welcome_text': 'TEXT DEFAULT "WELCOME"' if not IS_POSTGRES else "TEXT DEFAULT 'WELCOME'",
+        'profile_position': 'TEXT DEFAULT "center"' if not IS_POSTGRES else "TEXT DEFAULT 'center'",
+        'text_color': 'TEXT DEFAULT "#FFD700"' if not IS_POSTGRES else "TEXT DEFAULT '#FFD700'",
+        'font_family': 'TEXT DEFAULT "arial"' if not IS_POSTGRES else "TEXT DEFAULT 'arial'",
+        'banner_offset_x': 'INTEGER DEFAULT 0',
+        'banner_offset_y': 'INTEGER DEFAULT 0',
+        'avatar_offset_x': 'INTEGER DEFAULT 0',
+        'avatar_offset_y': 'INTEGER DEFAULT 0',
+        'text_offset_x': 'INTEGER DEFAULT 0',
+        'text_offset_y': 'INTEGER DEFAULT 0',
+        'send_gif_as_is': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'send_banner_as_is': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'welcome_text_size': 'INTEGER DEFAULT 56',
+        'username_text_size': 'INTEGER DEFAULT 32',
+        'avatar_size': 'INTEGER DEFAULT 180',
+        'use_goodbye_image': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'goodbye_text': 'TEXT DEFAULT "GOODBYE"' if not IS_POSTGRES else "TEXT DEFAULT 'GOODBYE'",
+        'goodbye_text_color': 'TEXT DEFAULT "#FF6B6B"' if not IS_POSTGRES else "TEXT DEFAULT '#FF6B6B'",
+        'goodbye_profile_position': 'TEXT DEFAULT "center"' if not IS_POSTGRES else "TEXT DEFAULT 'center'",
+        'goodbye_font_family': 'TEXT DEFAULT "arial"' if not IS_POSTGRES else "TEXT DEFAULT 'arial'",
+        'goodbye_banner_url': 'TEXT',
+        'goodbye_banner_offset_x': 'INTEGER DEFAULT 0',
+        'goodbye_banner_offset_y': 'INTEGER DEFAULT 0',
+        'goodbye_avatar_offset_x': 'INTEGER DEFAULT 0',
+        'goodbye_avatar_offset_y': 'INTEGER DEFAULT 0',
+        'goodbye_text_offset_x': 'INTEGER DEFAULT 0',
+        'goodbye_text_offset_y': 'INTEGER DEFAULT 0',
+        'goodbye_send_gif_as_is': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'goodbye_send_banner_as_is': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'welcome_text_bold': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'welcome_text_italic': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'welcome_text_underline': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'username_text_bold': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'username_text_italic': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'username_text_underline': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'goodbye_text_bold': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'goodbye_text_italic': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'goodbye_text_underline': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'goodbye_username_text_bold': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'goodbye_username_text_italic': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'goodbye_username_text_underline': 'INTEGER DEFAULT 0' if not IS_POSTGRES else 'BOOLEAN DEFAULT FALSE',
+        'google_font_family': 'TEXT',
+        'custom_font_path': 'TEXT',
+        'avatar_shape': 'TEXT DEFAULT "circle"' if not IS_POSTGRES else "TEXT DEFAULT 'circle'",
+        'avatar_border_enabled': 'INTEGER DEFAULT 1' if not IS_POSTGRES else 'BOOLEAN DEFAULT TRUE',
+        'avatar_border_width': 'INTEGER DEFAULT 6',
+        'avatar_border_color': 'TEXT DEFAULT "#FFFFFF"' if not IS_POSTGRES else "TEXT DEFAULT '#FFFFFF'",
+        'goodbye_avatar_shape': 'TEXT DEFAULT "circle"' if not IS_POSTGRES else "TEXT DEFAULT 'circle'",
+        'goodbye_avatar_border_enabled': 'INTEGER DEFAULT 1' if not IS_POSTGRES else 'BOOLEAN DEFAULT TRUE',
+        'goodbye_avatar_border_width': 'INTEGER DEFAULT 6',
+        'goodbye_avatar_border_color': 'TEXT DEFAULT "#FFFFFF"' if not IS_POSTGRES else "TEXT DEFAULT '#FFFFFF'",
+        'goodbye_avatar_size': 'INTEGER DEFAULT 180',
+        'goodbye_welcome_text_size': 'INTEGER DEFAULT 56',
+        'goodbye_username_text_size': 'INTEGER DEFAULT 32',
+        'auto_role_ids': 'TEXT DEFAULT ""' if not IS_POSTGRES else "TEXT DEFAULT ''",
+        'music_channel_id': 'BIGINT' if IS_POSTGRES else 'INTEGER',
+        'auto_disconnect_time': 'INTEGER DEFAULT 300',
+    }
+    _add_missing_columns(cursor, 'guild_settings', list(col_definitions.items()))
+
+    # Chatbot settings table
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chatbot_settings (
+                guild_id BIGINT PRIMARY KEY,
+                enabled BOOLEAN DEFAULT FALSE,
+                model_name TEXT DEFAULT 'llama-3.3-70b-versatile',
+                max_history INTEGER DEFAULT 10,
+                system_prompt TEXT,
+                temperature REAL DEFAULT 0.7,
+                channel_whitelist TEXT,
+                enabled_channels TEXT,
+                api_key TEXT
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chatbot_settings (
+                guild_id INTEGER PRIMARY KEY,
+                enabled BOOLEAN DEFAULT 0,
+                model_name TEXT DEFAULT 'llama-3.3-70b-versatile',
+                max_history INTEGER DEFAULT 10,
+                system_prompt TEXT,
+                temperature REAL DEFAULT 0.7,
+                channel_whitelist TEXT,
+                enabled_channels TEXT,
+                api_key TEXT
+            )
+        ''')
+
+    # Add missing columns to chatbot_settings (for existing databases)
+    _add_missing_columns(cursor, 'chatbot_settings', [
+        ('enabled_channels', 'TEXT'),
+        ('api_key', 'TEXT')
+    ])
+
+    # Chat history table
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chat_history (
+                id SERIAL PRIMARY KEY,
+                guild_id BIGINT NOT NULL,
+                channel_id BIGINT NOT NULL,
+                user_id BIGINT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chat_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_guild_channel ON chat_history(guild_id, channel_id)')
+
+    # Leveling settings table
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS leveling_settings (
+                guild_id BIGINT PRIMARY KEY,
+                enabled BOOLEAN DEFAULT FALSE,
+                xp_per_message INTEGER DEFAULT 10,
+                xp_per_minute REAL DEFAULT 60.0,
+                cooldown_seconds INTEGER DEFAULT 60,
+                level_up_announcements BOOLEAN DEFAULT TRUE,
+                level_up_channel_id BIGINT,
+                xp_multiplier REAL DEFAULT 1.0
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS leveling_settings (
+                guild_id INTEGER PRIMARY KEY,
+                enabled BOOLEAN DEFAULT 0,
+                xp_per_message INTEGER DEFAULT 10,
+                xp_per_minute REAL DEFAULT 60.0,
+                cooldown_seconds INTEGER DEFAULT 60,
+                level_up_announcements BOOLEAN DEFAULT 1,
+                level_up_channel_id INTEGER,
+                xp_multiplier REAL DEFAULT 1.0
+            )
+        ''')
+    # Add min_message_length column if not exists (for existing databases)
+    _add_missing_columns(cursor, 'leveling_settings', [('min_message_length', 'INTEGER DEFAULT 0')])
+
+    # User XP table
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_xp (
+                guild_id BIGINT NOT NULL,
+                user_id BIGINT NOT NULL,
+                xp INTEGER DEFAULT 0,
+                level INTEGER DEFAULT 1,
+                message_count INTEGER DEFAULT 0,
+                total_xp BIGINT DEFAULT 0,
+                last_xp_gain TIMESTAMP,
+                PRIMARY KEY (guild_id, user_id),
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_xp (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                xp INTEGER DEFAULT 0,
+                level INTEGER DEFAULT 1,
+                message_count INTEGER DEFAULT 0,
+                total_xp INTEGER DEFAULT 0,
+                last_xp_gain DATETIME,
+                PRIMARY KEY (guild_id, user_id),
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_xp_level ON user_xp(guild_id, level DESC, xp DESC)')
+
+    # Level roles table
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS level_roles (
+                id SERIAL PRIMARY KEY,
+                guild_id BIGINT NOT NULL,
+                level INTEGER NOT NULL,
+                role_id BIGINT NOT NULL,
+                stack BOOLEAN DEFAULT FALSE,
+                UNIQUE(guild_id, level, role_id),
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS level_roles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                level INTEGER NOT NULL,
+                role_id INTEGER NOT NULL,
+                stack BOOLEAN DEFAULT 0,
+                UNIQUE(guild_id, level, role_id),
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_level_roles_guild ON level_roles(guild_id, level)')
+
+    # Excluded roles table (roles that cannot gain XP)
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS excluded_roles (
+                guild_id BIGINT NOT NULL,
+                role_id BIGINT NOT NULL,
+                PRIMARY KEY (guild_id, role_id),
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS excluded_roles (
+                guild_id INTEGER NOT NULL,
+                role_id INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, role_id),
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_excluded_roles_guild ON excluded_roles(guild_id)')
+
+    # Moderation roles table
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS moderation_roles (
+                guild_id BIGINT NOT NULL,
+                role_id BIGINT NOT NULL,
+                permissions TEXT DEFAULT 'all',
+                PRIMARY KEY (guild_id, role_id),
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS moderation_roles (
+                guild_id INTEGER NOT NULL,
+                role_id INTEGER NOT NULL,
+                permissions TEXT DEFAULT 'all',
+                PRIMARY KEY (guild_id, role_id),
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+
+    # Moderation logs table
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS moderation_logs (
+                id SERIAL PRIMARY KEY,
+                guild_id BIGINT NOT NULL,
+                moderator_id BIGINT NOT NULL,
+                user_id BIGINT NOT NULL,
+                action TEXT NOT NULL,
+                reason TEXT,
+                duration INTEGER,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS moderation_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                moderator_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                reason TEXT,
+                duration INTEGER,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_moderation_logs_guild ON moderation_logs(guild_id, timestamp DESC)')
+
+    # Welcome roles table
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS welcome_roles (
+                id SERIAL PRIMARY KEY,
+                guild_id BIGINT NOT NULL,
+                role_id BIGINT NOT NULL,
+                UNIQUE(guild_id, role_id),
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS welcome_roles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                role_id INTEGER NOT NULL,
+                UNIQUE(guild_id, role_id),
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+
+    # Audit logs table (dashboard changes)
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS audit_logs (
+                id SERIAL PRIMARY KEY,
+                guild_id BIGINT NOT NULL,
+                user_id BIGINT NOT NULL,
+                user_name TEXT NOT NULL,
+                action TEXT NOT NULL,
+                category TEXT NOT NULL,
+                details TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS audit_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                user_name TEXT NOT NULL,
+                action TEXT NOT NULL,
+                category TEXT NOT NULL,
+                details TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (guild_id) REFERENCES guild_settings(guild_id) ON DELETE CASCADE
+            )
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_audit_logs_guild ON audit_logs(guild_id, timestamp DESC)')
+
+    # User music genres table (per-user custom music genres)
+    if IS_POSTGRES:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_music_genres (
+                id SERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                genre_name TEXT NOT NULL,
+                search_query TEXT NOT NULL,
+                emoji TEXT DEFAULT '🎵',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, genre_name)
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_music_genres (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                genre_name TEXT NOT NULL,
+                search_query TEXT NOT NULL,
+                emoji TEXT DEFAULT '🎵',
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, genre_name)
+            )
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_music_genres_user ON user_music_genres(user_id)')
+
+    # Migration: Add goodbye columns if they don't exist
+    if not IS_POSTGRES:
+        _add_missing_columns(cursor, 'guild_settings', [
+            ('goodbye_channel_id', 'INTEGER'),
+            ('goodbye_message', "TEXT DEFAULT 'Goodbye {user}!'"),
+            ('goodbye_enabled', 'BOOLEAN DEFAULT 0')
+        ])
+
+
+def _migration_002_settings_version(cursor):
+    """Versi settings per guild untuk invalidasi cache."""
+    _add_missing_columns(cursor, 'guild_settings', [('settings_version', 'INTEGER DEFAULT 0')])
+
+
+def _migration_003_chat_history_index(cursor):
+    """Index (guild_id, channel_id, timestamp) untuk ambil history terbaru tanpa sort."""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_channel_time ON chat_history(guild_id, channel_id, timestamp)')
+    # Prefix dari index baru, tidak diperlukan lagi
+    cursor.execute('DROP INDEX IF EXISTS idx_chat_history_guild_channel')
+
+
+def _migration_004_spotify_matches(cursor):
+    """Tabel padanan Spotify track -> YouTube video."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS spotify_matches (
+            spotify_track_id TEXT PRIMARY KEY,
+            video_id TEXT NOT NULL,
+            title TEXT,
+            artist TEXT,
+            thumbnail TEXT,
+            duration TEXT,
+            confidence REAL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# Ordered migration registry: (version, description, function)
+# Tambahkan migration baru di akhir list dengan versi berikutnya, jangan ubah yang lama.
+MIGRATIONS = [
+    (1, 'base schema', _migration_001_base_schema),
+    (2, 'guild_settings.settings_version', _migration_002_settings_version),
+    (3, 'chat_history channel/timestamp index', _migration_003_chat_history_index),
+    (4, 'spotify_matches', _migration_004_spotify_matches),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Key untuk pg_advisory_xact_lock saat migrate
+SCHEMA_MIGRATION_LOCK_ID = 7210501
+
+_schema_ready = False
+
+
+def _get_schema_version(conn) -> int:
+    """Single version check. Returns 0 if schema_version table doesn't exist yet."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT MAX(version) AS version FROM schema_version')
+        row = cursor.fetchone()
+        return (row['version'] if row else None) or 0
+    except DBError:
+        conn.rollback()
+        return 0
+
+
+def init_db() -> bool:
+    """
+    Initialize database tables.
+    Only pending migrations are applied, all inside one transaction.
+    Returns True if successful, False otherwise.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return True
+
+    conn = get_connection(direct=True)
+    if _get_schema_version(conn) >= LATEST_SCHEMA_VERSION:
+        _schema_ready = True
+        return True
+
+    if IS_POSTGRES:
+        # Koneksi pool autocommit; matikan agar lock + migrasi + versi jadi satu transaksi
+        conn.conn.autocommit = False
+    cursor = conn.cursor()
+    try:
+        # Lock supaya bot dan dashboard yang start bersamaan tidak migrate dua kali
         if IS_POSTGRES:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_music_genres (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    genre_name TEXT NOT NULL,
-                    search_query TEXT NOT NULL,
-                    emoji TEXT DEFAULT '🎵',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, genre_name)
-                )
-            ''')
+            cursor.execute('SELECT pg_advisory_xact_lock(?)', (SCHEMA_MIGRATION_LOCK_ID,))
         else:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_music_genres (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    genre_name TEXT NOT NULL,
-                    search_query TEXT NOT NULL,
-                    emoji TEXT DEFAULT '🎵',
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, genre_name)
-                )
-            ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_music_genres_user ON user_music_genres(user_id)')
-
-        # Migration: Add goodbye columns if they don't exist
-        if not IS_POSTGRES:
-            try:
-                cursor.execute("SELECT goodbye_enabled FROM guild_settings LIMIT 1")
-            except sqlite3.OperationalError:
-                cursor.execute("ALTER TABLE guild_settings ADD COLUMN goodbye_channel_id INTEGER")
-                cursor.execute("ALTER TABLE guild_settings ADD COLUMN goodbye_message TEXT DEFAULT 'Goodbye {user}!'")
-                cursor.execute("ALTER TABLE guild_settings ADD COLUMN goodbye_enabled BOOLEAN DEFAULT 0")
+            cursor.execute('BEGIN IMMEDIATE')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('SELECT MAX(version) AS version FROM schema_version')
+        row = cursor.fetchone()
+        current_version = (row['version'] if row else None) or 0
+
+        for version, description, migration in MIGRATIONS:
+            if version <= current_version:
+                continue
+            migration(cursor)
+            cursor.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)', (version, description))
+            print(f"[DB] Applied migration {version}: {description}")
 
         conn.commit()
+        _schema_ready = True
         return True
 
-    except sqlite3.Error as e:
+    except DBError as e:
         print(f"Database initialization error: {e}")
         conn.rollback()
         return False
 
+    finally:
+        if IS_POSTGRES:
+            # Lepas transaksi yang mungkin masih terbuka sebelum autocommit dinyalakan lagi
+            conn.rollback()
+            conn.conn.autocommit = True
+
 
 # ============================================================================
 # GUILD SETTINGS
 # ============================================================================
 
+# Seberapa sering (detik) cache settings dicek terhadap settings_version di database
+SETTINGS_CACHE_CHECK_INTERVAL = _get_setting('SETTINGS_CACHE_CHECK_INTERVAL', 5.0)
+
+# Read-through cache: {guild_id: (settings_version, settings)}
+_settings_cache: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+_settings_cache_lock = threading.Lock()
+_settings_last_check = 0.0
+# Jumlah guild per query IN (...) saat validasi cache (batas parameter SQLite)
+SETTINGS_VERSION_BATCH_SIZE = 500
+
+
+def _settings_changed_externally(cursor) -> bool:
+    """
+    SQLite: PRAGMA data_version hanya berubah jika connection lain melakukan commit,
+    jadi pengecekan versi bisa dilewati jika tidak ada perubahan.
+    """
+    if IS_POSTGRES:
+        return True
+    cursor.execute('PRAGMA data_version')
+    data_version = cursor.fetchone()[0]
+    last_version = getattr(_local, 'data_version', None)
+    _local.data_version = data_version
+    return data_version != last_version
+
+
+def _validate_settings_cache():
+    """Buang cache guild yang settings_version-nya sudah berubah di database."""
+    global _settings_last_check
+
+    now = time.monotonic()
+    if not _settings_cache or now - _settings_last_check < SETTINGS_CACHE_CHECK_INTERVAL:
+        return
+    _settings_last_check = now
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    with _settings_cache_lock:
+        guild_ids = list(_settings_cache)
+    versions = {}
+
+    try:
+        if not _settings_changed_externally(cursor):
+            return
+        # Hanya versi guild yang ada di cache, bukan seluruh tabel
+        for start in range(0, len(guild_ids), SETTINGS_VERSION_BATCH_SIZE):
+            chunk = guild_ids[start:start + SETTINGS_VERSION_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in chunk)
+            cursor.execute(
+                f'SELECT guild_id, settings_version FROM guild_settings WHERE guild_id IN ({placeholders})',
+                chunk
+            )
+            versions.update((row['guild_id'], row['settings_version'] or 0) for row in cursor.fetchall())
+    except DBError as e:
+        print(f"Error validating guild settings cache: {e}")
+        return
+
+    with _settings_cache_lock:
+        for guild_id in guild_ids:
+            cached = _settings_cache.get(guild_id)
+            if cached is not None and versions.get(guild_id) != cached[0]:
+                del _settings_cache[guild_id]
+
+
+def invalidate_guild_settings(guild_id: int = None):
+    """Hapus cache settings satu guild (atau semua guild jika guild_id None)."""
+    with _settings_cache_lock:
+        if guild_id is None:
+            _settings_cache.clear()
+        else:
+            _settings_cache.pop(guild_id, None)
+
+
 def get_guild_settings(guild_id: int) -> Dict[str, Any]:
-    """Get guild settings. Creates default settings if not exists."""
+    """Get guild settings (cached per settings_version). Creates default settings if not exists."""
+    _validate_settings_cache()
+
+    cached = _settings_cache.get(guild_id)
+    if cached is not None:
+        return dict(cached[1])
+
+    settings = _load_guild_settings(guild_id)
+    with _settings_cache_lock:
+        _settings_cache[guild_id] = (settings.get('settings_version') or 0, settings)
+    return dict(settings)
+
+
+def _load_guild_settings(guild_id: int) -> Dict[str, Any]:
+    """Load guild settings from database. Creates default settings if not exists."""
     conn = get_connection()
     cursor = conn.cursor()
 
@@ -706,13 +1289,15 @@ def get_guild_settings(guild_id: int) -> Dict[str, Any]:
             'username_text_size': 32,
             'goodbye_welcome_text_size': 56,
             'goodbye_username_text_size': 32,
+            # Cache version (dinaikkan setiap settings berubah)
+            'settings_version': 0,
         }
         cursor.execute('''
             INSERT INTO guild_settings (
                 guild_id, music_auto_delete, music_default_volume, music_shuffle, music_repeat,
                 welcome_channel_id, welcome_message, welcome_enabled,
                 goodbye_channel_id, goodbye_message, goodbye_enabled,
-                auto_role_enabled, auto_role_id, moderation_log_channel_id, music_channel_id, prefix,
+                auto_role_enabled, auto_role_id, moderation_log_channel_id, music_channel_id, auto_disconnect_time, prefix,
                 use_image, banner_url, welcome_text, profile_position,
                 text_color, font_family, banner_offset_x, banner_offset_y, avatar_offset_x, avatar_offset_y,
                 text_offset_x, text_offset_y, send_gif_as_is, send_banner_as_is,
@@ -729,7 +1314,7 @@ def get_guild_settings(guild_id: int) -> Dict[str, Any]:
                 avatar_border_enabled, avatar_border_width, avatar_border_color, goodbye_avatar_border_enabled, goodbye_avatar_border_width, goodbye_avatar_border_color,
                 avatar_size, goodbye_avatar_size,
                 goodbye_welcome_text_size, goodbye_username_text_size
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             guild_id, default_settings['music_auto_delete'], default_settings['music_default_volume'],
             default_settings['music_shuffle'], default_settings['music_repeat'],
@@ -905,10 +1490,13 @@ def update_guild_settings(guild_id: int, settings: Dict[str, Any]) -> bool:
                 values.append(value)
 
         if updates:
+            # Naikkan versi agar cache settings di proses lain ikut ter-invalidate
+            updates.append("settings_version = COALESCE(settings_version, 0) + 1")
             values.append(guild_id)
             query = f"UPDATE guild_settings SET {', '.join(updates)} WHERE guild_id = ?"
             cursor.execute(query, values)
             conn.commit()
+            invalidate_guild_settings(guild_id)
             return True
 
         return False
@@ -919,6 +1507,42 @@ def update_guild_settings(guild_id: int, settings: Dict[str, Any]) -> bool:
         return False
 
 
+def touch_guild_settings(guild_id: int) -> bool:
+    """
+    Naikkan settings_version tanpa mengubah settings lain.
+    Dipakai oleh settings lain (leveling, chatbot, excluded roles) agar cache
+    dan message policy di bot ikut di-rebuild.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            UPDATE guild_settings SET settings_version = COALESCE(settings_version, 0) + 1
+            WHERE guild_id = ?
+        ''', (guild_id,))
+        conn.commit()
+        invalidate_guild_settings(guild_id)
+        return True
+
+    except DBError as e:
+        print(f"Error touching guild settings: {e}")
+        conn.rollback()
+        return False
+
+
+def peek_settings_version(guild_id: int) -> Optional[int]:
+    """Versi settings yang ada di cache (tanpa query). None jika belum/tidak lagi di-cache."""
+    cached = _settings_cache.get(guild_id)
+    return cached[0] if cached is not None else None
+
+
+def settings_version(guild_id: int) -> Optional[int]:
+    """Seperti peek_settings_version, tapi validasi cache terhadap database dulu (throttled)."""
+    _validate_settings_cache()
+    return peek_settings_version(guild_id)
+
+
 # ============================================================================
 # CHATBOT
 # ============================================================================
@@ -1491,6 +2115,7 @@ def add_excluded_role(guild_id: int, role_id: int) -> bool:
             VALUES (?, ?)
         ''', (guild_id, role_id))
         conn.commit()
+        touch_guild_settings(guild_id)
         return True
 
     except sqlite3.Error as e:
@@ -1510,6 +2135,7 @@ def remove_excluded_role(guild_id: int, role_id: int) -> bool:
             WHERE guild_id = ? AND role_id = ?
         ''', (guild_id, role_id))
         conn.commit()
+        touch_guild_settings(guild_id)
         return True
 
     except sqlite3.Error as e:
@@ -1558,7 +2184,7 @@ def set_user_xp(guild_id: int, user_id: int, level: int, xp: int) -> bool:
         row = cursor.fetchone()
 
         # Recalculate total_xp based on new level and xp
-        total_xp = sum(get_xp_for_level(l) for l in range(1, level)) + xp
+        total_xp = total_xp_for_level(level) + xp
 
         if row:
             # Update existing user, preserve message_count
@@ -1584,43 +2210,41 @@ def set_user_xp(guild_id: int, user_id: int, level: int, xp: int) -> bool:
         return False
 
 
-def recalculate_all_user_levels(guild_id: int) -> bool:
-    """Recalculate all user levels based on total XP."""
+def recalculate_all_user_levels(guild_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Recalculate level dan XP semua user dari total_xp (satu guild, atau semua jika None).
+    Level dihitung dengan rumus closed-form dan hanya row yang berubah di-update
+    dalam satu batch executemany.
+    """
     conn = get_connection()
     cursor = conn.cursor()
 
     try:
-        cursor.execute('''
-            SELECT user_id, total_xp FROM user_xp WHERE guild_id = ?
-        ''', (guild_id,))
-
-        users = cursor.fetchall()
-
-        for user in users:
-            user_id = user['user_id']
-            total_xp = user['total_xp']
-
-            # Calculate level from total XP
-            level = 1
-            remaining_xp = total_xp
+        if guild_id is None:
+            cursor.execute('SELECT guild_id, user_id, total_xp, level, xp FROM user_xp')
+        else:
+            cursor.execute('''
+                SELECT guild_id, user_id, total_xp, level, xp FROM user_xp WHERE guild_id = ?
+            ''', (guild_id,))
 
-            while remaining_xp >= calculate_required_xp(level):
-                remaining_xp -= calculate_required_xp(level)
-                level += 1
+        updates = []
+        for row in cursor.fetchall():
+            level, xp = level_from_total_xp(row['total_xp'])
+            if level != row['level'] or xp != row['xp']:
+                updates.append((level, xp, row['guild_id'], row['user_id']))
 
-            # Update user
-            cursor.execute('''
+        if updates:
+            cursor.executemany('''
                 UPDATE user_xp SET level = ?, xp = ?
                 WHERE guild_id = ? AND user_id = ?
-            ''', (level, remaining_xp, guild_id, user_id))
-
+            ''', updates)
         conn.commit()
-        return True
+        return {'success': True, 'updated_count': len(updates)}
 
-    except sqlite3.Error as e:
+    except DBError as e:
         print(f"Error recalculating user levels: {e}")
         conn.rollback()
-        return False
+        return {'success': False, 'updated_count': 0, 'error': str(e)}
 
 
 # ============================================================================
@@ -1917,6 +2541,86 @@ def get_all_genres_for_user(user_id: int) -> Dict[str, Any]:
         'custom': custom_genres
     }
 
+# ============================================================================
+# SPOTIFY MATCHES (Spotify track -> YouTube video)
+# ============================================================================
+
+SPOTIFY_MATCH_BATCH_SIZE = 500
+
+
+def get_spotify_matches(track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Batch lookup padanan YouTube untuk Spotify track IDs. Returns {track_id: match}."""
+    track_ids = [track_id for track_id in dict.fromkeys(track_ids) if track_id]
+    if not track_ids:
+        return {}
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    matches = {}
+
+    try:
+        for start in range(0, len(track_ids), SPOTIFY_MATCH_BATCH_SIZE):
+            chunk = track_ids[start:start + SPOTIFY_MATCH_BATCH_SIZE]
+            placeholders = ', '.join('?' for _ in chunk)
+            cursor.execute(f'''
+                SELECT spotify_track_id, video_id, title, artist, thumbnail, duration, confidence
+                FROM spotify_matches
+                WHERE spotify_track_id IN ({placeholders})
+            ''', chunk)
+            for row in cursor.fetchall():
+                row = dict(row)
+                matches[row['spotify_track_id']] = row
+
+    except DBError as e:
+        print(f"Error getting spotify matches: {e}")
+        conn.rollback()
+
+    return matches
+
+
+def get_spotify_match(track_id: str) -> Optional[Dict[str, Any]]:
+    """Lookup padanan YouTube untuk satu Spotify track ID."""
+    return get_spotify_matches([track_id]).get(track_id)
+
+
+def save_spotify_matches(rows: List[Dict[str, Any]]) -> bool:
+    """
+    Simpan/update padanan Spotify -> YouTube.
+    rows: list of dict dengan spotify_track_id, video_id, title, artist, thumbnail, duration, confidence.
+    """
+    rows = [row for row in rows if row.get('spotify_track_id') and row.get('video_id')]
+    if not rows:
+        return True
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.executemany('''
+            INSERT INTO spotify_matches (spotify_track_id, video_id, title, artist, thumbnail, duration, confidence)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (spotify_track_id) DO UPDATE SET
+                video_id = EXCLUDED.video_id,
+                title = EXCLUDED.title,
+                artist = EXCLUDED.artist,
+                thumbnail = EXCLUDED.thumbnail,
+                duration = EXCLUDED.duration,
+                confidence = EXCLUDED.confidence,
+                updated_at = CURRENT_TIMESTAMP
+        ''', [
+            (row['spotify_track_id'], row['video_id'], row.get('title'), row.get('artist'),
+             row.get('thumbnail'), row.get('duration'), row.get('confidence', 0))
+            for row in rows
+        ])
+        conn.commit()
+        return True
+
+    except DBError as e:
+        print(f"Error saving spotify matches: {e}")
+        conn.rollback()
+        return False
+
+
 # ============================================================================
 # CHATBOT
 # ============================================================================
@@ -1999,6 +2703,7 @@ def save_chatbot_settings(guild_id: int, settings: Dict[str, Any]) -> bool:
             settings.get('api_key')
         ))
         conn.commit()
+        touch_guild_settings(guild_id)
         return True
 
     except psycopg2.Error as e:
@@ -2019,6 +2724,7 @@ def toggle_chatbot(guild_id: int, enabled: bool) -> bool:
             ON CONFLICT(guild_id) DO UPDATE SET enabled = %s
         ''', (guild_id, enabled, enabled))
         conn.commit()
+        touch_guild_settings(guild_id)
         return True
 
     except psycopg2.Error as e:
@@ -2028,16 +2734,16 @@ def toggle_chatbot(guild_id: int, enabled: bool) -> bool:
 
 
 def get_chat_history(guild_id: int, channel_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-    """Get chat history for a channel."""
+    """Get chat history for a channel (newest first)."""
     conn = get_connection()
     cursor = conn.cursor()
 
     cursor.execute('''
         SELECT user_id, role, content, timestamp
         FROM chat_history
-        WHERE guild_id = %s AND channel_id = %s
-        ORDER BY timestamp DESC
-        LIMIT %s
+        WHERE guild_id = ? AND channel_id = ?
+        ORDER BY timestamp DESC, id DESC
+        LIMIT ?
     ''', (guild_id, channel_id, limit))
 
     rows = cursor.fetchall()
@@ -2082,6 +2788,62 @@ def clear_chat_history(guild_id: int, channel_id: int) -> bool:
         return False
 
 
+def add_chat_messages_batch(rows: List[Tuple[int, int, int, str, str]]) -> bool:
+    """
+    Insert banyak pesan chat sekaligus (write-behind dari cog Chatbot).
+    rows: list of (guild_id, channel_id, user_id, role, content), urut dari yang terlama.
+    """
+    if not rows:
+        return True
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.executemany('''
+            INSERT INTO chat_history (guild_id, channel_id, user_id, role, content)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        return True
+
+    except DBError as e:
+        print(f"Error adding chat messages: {e}")
+        conn.rollback()
+        return False
+
+
+def trim_chat_history(max_per_channel: int) -> int:
+    """
+    Retention: simpan hanya max_per_channel pesan terbaru per channel.
+    Returns jumlah row yang dihapus (-1 jika error).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            DELETE FROM chat_history
+            WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY guild_id, channel_id
+                        ORDER BY timestamp DESC, id DESC
+                    ) AS rn
+                    FROM chat_history
+                ) ranked
+                WHERE rn > ?
+            )
+        ''', (max_per_channel,))
+        conn.commit()
+        return max(cursor.rowcount, 0)
+
+    except DBError as e:
+        print(f"Error trimming chat history: {e}")
+        conn.rollback()
+        return -1
+
+
 # ============================================================================
 # LEVELING
 # ============================================================================
@@ -2145,6 +2907,7 @@ def set_leveling_settings(guild_id: int, settings: Dict[str, Any]) -> bool:
             settings.get('min_message_length', 0)
         ))
         conn.commit()
+        touch_guild_settings(guild_id)
         return True
 
     except psycopg2.Error as e:
@@ -2165,6 +2928,7 @@ def toggle_leveling(guild_id: int, enabled: bool) -> bool:
             ON CONFLICT(guild_id) DO UPDATE SET enabled = %s
         ''', (guild_id, enabled, enabled))
         conn.commit()
+        touch_guild_settings(guild_id)
         return True
 
     except psycopg2.Error as e:
@@ -2195,11 +2959,43 @@ def get_user_xp(guild_id: int, user_id: int) -> Dict[str, Any]:
     return dict(row)
 
 
+# Rumus level (sama dengan xp_required_for_level di cogs/leveling.py)
+BASE_XP_PER_LEVEL = _get_setting('BASE_XP_PER_LEVEL', 150)
+XP_INCREMENT_PER_LEVEL = _get_setting('XP_INCREMENT_PER_LEVEL', 50)
+
+
 def calculate_required_xp(level: int) -> int:
-    """Calculate XP required for a given level."""
+    """Calculate XP required to go from `level` to `level + 1`."""
     if level <= 1:
-        return 150
-    return 150 + (level - 1) * 50
+        return BASE_XP_PER_LEVEL
+    return BASE_XP_PER_LEVEL + (level - 1) * XP_INCREMENT_PER_LEVEL
+
+
+def total_xp_for_level(level: int) -> int:
+    """Total XP needed to reach `level` from level 1 (closed form)."""
+    n = max(level - 1, 0)
+    return n * BASE_XP_PER_LEVEL + XP_INCREMENT_PER_LEVEL * n * (n - 1) // 2
+
+
+def level_from_total_xp(total_xp: int) -> Tuple[int, int]:
+    """Level and leftover XP for a total XP amount (closed form). Returns (level, xp)."""
+    total_xp = max(int(total_xp or 0), 0)
+    base, inc = BASE_XP_PER_LEVEL, XP_INCREMENT_PER_LEVEL
+
+    # Solve inc/2*n^2 + (base - inc/2)*n <= total_xp for n = level - 1
+    if inc == 0:
+        n = total_xp // base
+    else:
+        b = base - inc / 2
+        n = int((-b + math.sqrt(b * b + 2 * inc * total_xp)) / inc)
+
+    # Koreksi pembulatan floating point
+    while n > 0 and total_xp_for_level(n + 1) > total_xp:
+        n -= 1
+    while total_xp_for_level(n + 2) <= total_xp:
+        n += 1
+
+    return n + 1, total_xp - total_xp_for_level(n + 1)
 
 
 def add_user_xp(guild_id: int, user_id: int, xp_amount: int) -> Tuple[bool, int, int]:
@@ -2213,18 +3009,10 @@ def add_user_xp(guild_id: int, user_id: int, xp_amount: int) -> Tuple[bool, int,
         current_level = current['level']
         total_xp = current['total_xp']
 
-        new_xp = current_xp + xp_amount
         new_total_xp = total_xp + xp_amount
-        new_level = current_level
-
-        required_xp = calculate_required_xp(new_level)
-        leveled_up = False
-
-        while new_xp >= required_xp:
-            new_xp -= required_xp
-            new_level += 1
-            required_xp = calculate_required_xp(new_level)
-            leveled_up = True
+        # Hitung dari level + xp saat ini (total_xp bisa saja belum konsisten)
+        new_level, new_xp = level_from_total_xp(total_xp_for_level(current_level) + current_xp + xp_amount)
+        leveled_up = new_level > current_level
 
         cursor.execute('''
             INSERT INTO user_xp (guild_id, user_id, xp, level, total_xp)
@@ -2276,6 +3064,38 @@ def update_message_count(guild_id: int, user_id: int) -> bool:
         return False
 
 
+def flush_user_xp_batch(rows: List[Tuple[int, int, int, int, int, int]]) -> bool:
+    """
+    Simpan banyak perubahan XP sekaligus dalam satu transaksi.
+    Setiap row: (guild_id, user_id, xp, level, total_xp, message_count_delta).
+    xp/level/total_xp ditulis apa adanya, message_count ditambahkan (delta).
+    """
+    if not rows:
+        return True
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.executemany('''
+            INSERT INTO user_xp (guild_id, user_id, xp, level, total_xp, message_count, last_xp_gain)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (guild_id, user_id) DO UPDATE SET
+                xp = EXCLUDED.xp,
+                level = EXCLUDED.level,
+                total_xp = EXCLUDED.total_xp,
+                message_count = user_xp.message_count + EXCLUDED.message_count,
+                last_xp_gain = CURRENT_TIMESTAMP
+        ''', rows)
+        conn.commit()
+        return True
+
+    except DBError as e:
+        print(f"Error flushing user XP batch: {e}")
+        conn.rollback()
+        return False
+
+
 def get_user_rank(guild_id: int, user_id: int) -> int:
     """Get user's rank position in the guild leaderboard."""
     conn = get_connection()
@@ -2441,8 +3261,19 @@ def update_level_role(guild_id: int, old_level: int, old_role_id: int,
         return False
 
 
-def get_xp_for_level(level: int, base_xp: int = 100, xp_increment: int = 50) -> int:
+def get_xp_for_level(level: int, base_xp: int = None, xp_increment: int = None) -> int:
     """Get XP required for a specific level."""
+    base_xp = base_xp or BASE_XP_PER_LEVEL
+    xp_increment = xp_increment or XP_INCREMENT_PER_LEVEL
     if level <= 1:
         return base_xp
     return base_xp + (level - 1) * xp_increment
+
+
+# Pemanggil sync (misal cog di event loop) tidak memanggil release_connection(),
+# jadi setiap fungsi publik mengembalikan connection ke pool setelah selesai agar
+# recycle dan liveness check pool tetap berlaku.
+for _name, _func in list(globals().items()):
+    if (callable(_func) and getattr(_func, '__module__', None) == __name__ and not isinstance(_func, type)
+            and not _name.startswith('_') and _name not in ('get_connection', 'release_connection')):
+        globals()[_name] = _scoped_connection(_func)
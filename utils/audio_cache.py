@@ -0,0 +1,183 @@
+"""
+Audio Cache
+===========
+Cache audio Opus di disk per video_id untuk lagu yang sering diputar.
+File diisi di background saat lagu pertama kali diputar (FFmpeg copy/encode ke
+Ogg Opus), lalu pemutaran berikutnya langsung dari file lokal tanpa extract
+ulang ke YouTube. Total ukuran dibatasi byte budget dengan eviction LRU.
+"""
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+import config
+
+# Folder cache (None = cache mati)
+AUDIO_CACHE_DIR = getattr(config, 'AUDIO_CACHE_DIR', None)
+AUDIO_CACHE_MAX_BYTES = getattr(config, 'AUDIO_CACHE_MAX_BYTES', 2 * 1024 ** 3)
+# Lagu yang lebih panjang dari ini tidak di-cache (mix, livestream, dll)
+AUDIO_CACHE_MAX_TRACK_SECONDS = getattr(config, 'AUDIO_CACHE_MAX_TRACK_SECONDS', 900)
+AUDIO_CACHE_CONCURRENCY = getattr(config, 'AUDIO_CACHE_CONCURRENCY', 2)
+AUDIO_CACHE_FILL_TIMEOUT = getattr(config, 'AUDIO_CACHE_FILL_TIMEOUT', 300)
+AUDIO_CACHE_BITRATE = getattr(config, 'AUDIO_CACHE_BITRATE', 128)
+
+FILE_EXT = '.opus'
+
+
+class AudioCache:
+    """Cache file Opus di disk dengan budget byte dan eviction LRU."""
+
+    def __init__(self, directory: Optional[str] = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_MAX_BYTES,
+                 max_track_seconds: int = AUDIO_CACHE_MAX_TRACK_SECONDS,
+                 concurrency: int = AUDIO_CACHE_CONCURRENCY):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_track_seconds = max_track_seconds
+        self.concurrency = max(1, int(concurrency))
+        # video_id -> ukuran file (urutan = LRU, paling lama dipakai di depan)
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._filling: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.fill_errors = 0
+        self.evictions = 0
+        if self.enabled:
+            self._load()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.max_bytes > 0
+
+    def _path(self, video_id: str) -> str:
+        return os.path.join(self.directory, f"{video_id}{FILE_EXT}")
+
+    def _load(self):
+        """Scan folder cache; urutan LRU dari waktu akses/modifikasi file."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(FILE_EXT):
+                    stat = entry.stat()
+                    files.append((max(stat.st_atime, stat.st_mtime), entry.name[:-len(FILE_EXT)], stat.st_size))
+                elif entry.name.endswith('.tmp'):
+                    # Sisa pengisian yang terputus
+                    os.remove(entry.path)
+            for _, video_id, size in sorted(files):
+                self._entries[video_id] = size
+                self._total_bytes += size
+            self._evict()
+            print(f"[AudioCache] Loaded {len(self._entries)} tracks ({self._total_bytes / 1024 ** 2:.1f} MB) from {self.directory}")
+        except OSError as e:
+            print(f"[AudioCache] Error loading cache: {e}")
+
+    def get_path(self, video_id: str) -> Optional[str]:
+        """Path file cache untuk video (None jika belum ada)."""
+        if not self.enabled:
+            return None
+        if video_id not in self._entries:
+            self.misses += 1
+            return None
+        path = self._path(video_id)
+        if not os.path.exists(path):
+            self._total_bytes -= self._entries.pop(video_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(video_id)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return path
+
+    def fill(self, video_id: str, url: str, opus: bool = False, duration_seconds: int = 0):
+        """Download audio ke cache di background (sekali per video)."""
+        if not self.enabled or video_id in self._entries or video_id in self._filling:
+            return
+        if not duration_seconds or duration_seconds > self.max_track_seconds:
+            return
+        task = asyncio.create_task(self._fill(video_id, url, opus))
+        self._filling[video_id] = task
+        task.add_done_callback(lambda _: self._filling.pop(video_id, None))
+
+    async def _fill(self, video_id: str, url: str, opus: bool):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        path = self._path(video_id)
+        tmp_path = f"{path}.tmp"
+        codec = ['-c:a', 'copy'] if opus else ['-c:a', 'libopus', '-b:a', f'{AUDIO_CACHE_BITRATE}k']
+
+        async with self._semaphore:
+            process = None
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    'ffmpeg', '-nostdin', '-loglevel', 'error',
+                    '-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5',
+                    '-i', url, '-vn', '-map_metadata', '-1', *codec, '-f', 'opus', '-y', tmp_path,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                _, stderr = await asyncio.wait_for(process.communicate(), AUDIO_CACHE_FILL_TIMEOUT)
+                if process.returncode != 0:
+                    raise RuntimeError(stderr.decode(errors='ignore').strip()[:200] or f"exit {process.returncode}")
+                os.replace(tmp_path, path)
+                size = os.path.getsize(path)
+                self._entries[video_id] = size
+                self._total_bytes += size
+                self.fills += 1
+            except (Exception, asyncio.CancelledError) as e:
+                if process is not None and process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self.fill_errors += 1
+                print(f"[AudioCache] Error caching {video_id}: {e}")
+                return
+
+        self._evict()
+
+    def _evict(self):
+        """Hapus file paling lama dipakai sampai total di bawah budget."""
+        for video_id in list(self._entries):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(video_id))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # File masih dipakai (misal sedang diputar di Windows); coba lagi di eviction berikutnya
+                continue
+            self._total_bytes -= self._entries.pop(video_id)
+            self.evictions += 1
+
+    def shutdown(self):
+        """Batalkan pengisian yang sedang berjalan."""
+        for task in list(self._filling.values()):
+            task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        """Metrics cache: hit/miss, jumlah file dan total byte."""
+        total = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'tracks': len(self._entries),
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'filling': len(self._filling),
+            'hits': self.hits,
+            'misses': self.misses,
+            'fills': self.fills,
+            'fill_errors': self.fill_errors,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,271 @@
+"""
+Extraction Engine
+=================
+Pool worker khusus untuk yt-dlp dan ytmusicapi.
+Interpretasi JavaScript signature/nsig yt-dlp menahan GIL cukup lama, jadi
+extraction dijalankan di process pool terpisah (satu YoutubeDL per worker)
+agar tidak menambah latency event loop gateway.
+
+Job diantrikan berdasarkan prioritas (request user lebih dulu dari preload),
+dan dalam satu prioritas dilayani round-robin per guild.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+import config
+
+# Prioritas job (angka kecil = lebih dulu)
+PRIORITY_USER = 0       # Command user (!play, !search)
+PRIORITY_PLAYBACK = 1   # Lagu yang akan segera diputar
+PRIORITY_PREFETCH = 2   # Preload/buffer di background
+
+EXTRACTION_WORKERS = getattr(config, 'EXTRACTION_WORKERS', 2)
+EXTRACTION_TIMEOUT = getattr(config, 'EXTRACTION_TIMEOUT', 30)
+EXTRACTION_USE_PROCESSES = getattr(config, 'EXTRACTION_USE_PROCESSES', True)
+# Ambil seluruh track playlist butuh banyak request continuation
+PLAYLIST_FETCH_TIMEOUT = getattr(config, 'PLAYLIST_FETCH_TIMEOUT', 300)
+
+# Field dari info yt-dlp yang dikirim balik ke bot (info lengkap sangat besar)
+INFO_FIELDS = (
+    'id', 'title', 'uploader', 'thumbnail', 'duration', 'url', 'webpage_url',
+    'ext', 'acodec', 'abr', 'asr', 'http_headers', 'is_live',
+)
+
+# ==================== WORKER SIDE ====================
+
+_worker = threading.local()
+
+
+def _init_worker(ytdl_options: dict):
+    """Initializer worker: satu YoutubeDL dan satu YTMusic per worker."""
+    import yt_dlp
+    from ytmusicapi import YTMusic
+    _worker.ytdl = yt_dlp.YoutubeDL(ytdl_options)
+    _worker.ytmusic = YTMusic()
+
+
+def _extract_info(url: str) -> Optional[Dict[str, Any]]:
+    info = _worker.ytdl.extract_info(url, download=False)
+    if not info:
+        return None
+    return {key: info.get(key) for key in INFO_FIELDS}
+
+
+def _ytmusic_call(method: str, args: tuple, kwargs: dict) -> Any:
+    return getattr(_worker.ytmusic, method)(*args, **kwargs)
+
+
+def _compact_track(track: dict) -> Dict[str, Any]:
+    """Hanya field track yang dipakai Song."""
+    artists = track.get('artists') or []
+    thumbnails = track.get('thumbnails') or []
+    return {
+        'videoId': track.get('videoId'),
+        'title': track.get('title'),
+        'artist': artists[0].get('name') if artists else None,
+        'thumbnail': thumbnails[-1].get('url') if thumbnails else None,
+        'duration': track.get('duration'),
+    }
+
+
+def _playlist_tracks(playlist_id: str, limit: Optional[int]) -> Optional[Dict[str, Any]]:
+    """Track playlist (limit=None = semua, lewat continuation ytmusicapi)."""
+    data = _worker.ytmusic.get_playlist(playlist_id, limit=limit)
+    if not data:
+        return None
+    tracks = [_compact_track(track) for track in (data.get('tracks') or [])]
+    return {'title': data.get('title'), 'trackCount': data.get('trackCount'), 'tracks': tracks}
+
+
+# ==================== BOT SIDE ====================
+
+class _Job:
+    __slots__ = ('func', 'args', 'priority', 'guild_id', 'future', 'timeout')
+
+    def __init__(self, func, args, priority, guild_id, future, timeout):
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.guild_id = guild_id
+        self.future = future
+        self.timeout = timeout
+
+
+class ExtractionEngine:
+    """Scheduler job extraction di atas pool worker yang dibatasi."""
+
+    def __init__(self, ytdl_options: dict, max_workers: int = EXTRACTION_WORKERS,
+                 timeout: float = EXTRACTION_TIMEOUT, use_processes: bool = EXTRACTION_USE_PROCESSES):
+        self.ytdl_options = dict(ytdl_options)
+        self.max_workers = max(1, int(max_workers))
+        self.timeout = timeout
+        self.use_processes = use_processes
+        self._executor = None
+        # {priority: OrderedDict[guild_id, deque[_Job]]} - round-robin per guild
+        self._queues: Dict[int, OrderedDict] = {}
+        self._running = 0
+        # Pool yang worker-nya sengaja dihentikan setelah timeout: job lain di pool itu diantrikan ulang
+        self._killed_executors = weakref.WeakSet()
+        # Referensi task _run agar tidak di-GC
+        self._tasks = set()
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'timeouts': 0, 'requeued': 0}
+
+    @property
+    def executor(self):
+        """Pool worker (dibuat saat pertama dipakai)."""
+        if self._executor is None:
+            if self.use_processes:
+                # spawn: jangan fork proses bot yang punya banyak thread
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.ytdl_options,)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="extract",
+                    initializer=_init_worker,
+                    initargs=(self.ytdl_options,)
+                )
+        return self._executor
+
+    async def extract_info(self, url: str, priority: int = PRIORITY_USER, guild_id: int = None) -> Optional[Dict[str, Any]]:
+        """yt-dlp extract_info (tanpa download), hanya field INFO_FIELDS."""
+        return await self._submit(_extract_info, (url,), priority, guild_id)
+
+    async def ytmusic(self, method: str, *args, priority: int = PRIORITY_USER, guild_id: int = None, **kwargs) -> Any:
+        """Panggil method YTMusic (search, get_playlist, ...) di worker."""
+        return await self._submit(_ytmusic_call, (method, args, kwargs), priority, guild_id)
+
+    async def playlist_page(self, playlist_id: str, count: int,
+                            priority: int = PRIORITY_USER, guild_id: int = None) -> Optional[Dict[str, Any]]:
+        """Halaman pertama playlist YouTube Music (count track pertama)."""
+        return await self._submit(_playlist_tracks, (playlist_id, count), priority, guild_id)
+
+    async def playlist_tracks(self, playlist_id: str, priority: int = PRIORITY_PREFETCH,
+                              guild_id: int = None) -> Optional[Dict[str, Any]]:
+        """Seluruh track playlist YouTube Music dalam satu job (satu pass continuation)."""
+        return await self._submit(_playlist_tracks, (playlist_id, None), priority, guild_id,
+                                  timeout=PLAYLIST_FETCH_TIMEOUT)
+
+    async def _submit(self, func, args: tuple, priority: int, guild_id: Optional[int],
+                      timeout: float = None) -> Any:
+        loop = asyncio.get_running_loop()
+        job = _Job(func, args, priority, guild_id, loop.create_future(), timeout or self.timeout)
+        self._enqueue(job)
+        self.stats['submitted'] += 1
+        self._pump()
+
+        # Timeout dihitung sejak job mulai jalan di worker (lihat _run), bukan sejak antri
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            # Job yang belum mulai dibuang dari antrian
+            job.future.cancel()
+            raise
+
+    def _enqueue(self, job: _Job, front: bool = False):
+        guilds = self._queues.setdefault(job.priority, OrderedDict())
+        jobs = guilds.setdefault(job.guild_id, deque())
+        if front:
+            jobs.appendleft(job)
+            guilds.move_to_end(job.guild_id, last=False)
+        else:
+            jobs.append(job)
+
+    def _next_job(self) -> Optional[_Job]:
+        for priority in sorted(self._queues):
+            guilds = self._queues[priority]
+            while guilds:
+                guild_id, jobs = next(iter(guilds.items()))
+                job = jobs.popleft()
+                if jobs:
+                    # Guild ini ke belakang antrian round-robin
+                    guilds.move_to_end(guild_id)
+                else:
+                    del guilds[guild_id]
+                if not job.future.cancelled():
+                    return job
+        return None
+
+    def _pump(self):
+        """Jalankan job dari antrian selama masih ada worker kosong."""
+        while self._running < self.max_workers:
+            job = self._next_job()
+            if job is None:
+                return
+            self._running += 1
+            executor = self.executor
+            try:
+                pool_future = executor.submit(job.func, *job.args)
+            except BrokenProcessPool:
+                self._reset_executor(executor, "broken")
+                executor = self.executor
+                pool_future = executor.submit(job.func, *job.args)
+            task = asyncio.ensure_future(self._run(job, executor, asyncio.wrap_future(pool_future)))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: _Job, executor, pool_future: asyncio.Future):
+        try:
+            result = await asyncio.wait_for(pool_future, job.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            if not job.future.done():
+                job.future.set_exception(asyncio.TimeoutError())
+            # Worker yang hang tidak bisa dibatalkan; ganti pool agar slot tidak tertahan selamanya
+            self._reset_executor(executor, "job timed out", kill=True)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and executor in self._killed_executors and not job.future.done():
+                # Worker-nya ikut dihentikan karena job lain hang: jalankan ulang di pool baru
+                self.stats['requeued'] += 1
+                self._enqueue(job, front=True)
+                return
+            self.stats['failed'] += 1
+            if isinstance(e, BrokenProcessPool):
+                self._reset_executor(executor, "broken")
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.stats['completed'] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            # Slot worker baru dilepas saat job benar-benar selesai (termasuk yang timeout)
+            self._running -= 1
+            self._pump()
+
+    def _reset_executor(self, executor, reason: str, kill: bool = False):
+        if executor is not self._executor:
+            # Pool ini sudah diganti sebelumnya
+            return
+        print(f"[Extraction] Worker pool {reason}, restarting")
+        self._executor = None
+        if kill and self.use_processes:
+            self._killed_executors.add(executor)
+            # ProcessPoolExecutor tidak punya API untuk menghentikan job yang sedang jalan
+            for process in list((getattr(executor, '_processes', None) or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Statistik engine: jumlah job per status, yang berjalan dan yang antri."""
+        queued = sum(
+            1 for guilds in self._queues.values() for jobs in guilds.values()
+            for job in jobs if not job.future.cancelled()
+        )
+        return {**self.stats, 'running': self._running, 'queued': queued}
+
+    def shutdown(self, wait: bool = False):
+        """Matikan pool worker."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
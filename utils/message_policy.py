@@ -0,0 +1,153 @@
+"""
+Message Policy
+==============
+Snapshot immutable per guild untuk listener on_message (leveling & chatbot).
+Policy di-compile sekali dari database dan hanya di-rebuild saat
+settings_version guild berubah, jadi pengecekan per pesan cukup
+berupa operasi set tanpa query database.
+"""
+
+import json
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional
+import config
+
+try:
+    from dashboard.backend import database as db
+    from dashboard.backend.async_database import adb
+    HAS_DATABASE = True
+except ImportError:
+    HAS_DATABASE = False
+
+
+def leveling_settings_from_db(settings: Optional[Dict[str, Any]]) -> dict:
+    """Map leveling settings dari database ke format yang dipakai cog Leveling."""
+    if settings:
+        # Parse exempt_roles from JSON if it's a string
+        exempt_roles = settings.get('exempt_roles', [])
+        if isinstance(exempt_roles, str):
+            try:
+                exempt_roles = json.loads(exempt_roles)
+            except (json.JSONDecodeError, TypeError):
+                exempt_roles = []
+
+        return {
+            'leveling_enabled': settings.get('leveling_enabled', 1),
+            'xp_per_message': settings.get('xp_per_message', 10),
+            'cooldown_seconds': settings.get('cooldown_seconds', 60),
+            'min_message_length': settings.get('min_message_length', 0),
+            'level_up_channel_id': settings.get('level_up_channel_id'),
+            'notify_level_up': settings.get('notify_level_up', 1),
+            'level_up_image_url': settings.get('level_up_image_url'),
+            'level_up_message': settings.get('level_up_message'),
+            'exempt_roles': exempt_roles
+        }
+    return {
+        'leveling_enabled': getattr(config, 'LEVELING_ENABLED_BY_DEFAULT', True),
+        'xp_per_message': getattr(config, 'DEFAULT_XP_PER_MESSAGE', 10),
+        'cooldown_seconds': getattr(config, 'DEFAULT_XP_COOLDOWN', 60),
+        'min_message_length': 0,
+        'level_up_channel_id': None,
+        'notify_level_up': True,
+        'level_up_image_url': None,
+        'level_up_message': None,
+        'exempt_roles': []
+    }
+
+
+def _id_set(values: Optional[Iterable]) -> frozenset:
+    """Convert list ID (int/str) ke frozenset of int."""
+    ids = set()
+    for value in values or []:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return frozenset(ids)
+
+
+@dataclass(frozen=True)
+class MessagePolicy:
+    """Policy per guild yang sudah di-compile (immutable)."""
+    guild_id: int
+    version: Optional[int]
+    # Leveling
+    leveling_enabled: bool
+    xp_per_message: int
+    cooldown_seconds: int
+    min_message_length: int
+    exempt_role_ids: frozenset
+    excluded_role_ids: frozenset
+    # Chatbot
+    chatbot_enabled: bool
+    chatbot_channel_ids: frozenset
+    chatbot_settings: Mapping[str, Any]
+
+    def is_xp_blocked(self, role_ids: Iterable[int]) -> bool:
+        """True jika user punya exempt role atau excluded role."""
+        role_ids = frozenset(role_ids)
+        return not self.exempt_role_ids.isdisjoint(role_ids) or not self.excluded_role_ids.isdisjoint(role_ids)
+
+    def is_chatbot_channel(self, channel_id: int) -> bool:
+        """Cek apakah channel adalah enabled channel chatbot."""
+        return channel_id in self.chatbot_channel_ids
+
+
+def build_message_policy(guild_id: int) -> MessagePolicy:
+    """Compile policy dari database (blocking, jalankan di executor)."""
+    guild_settings = db.get_guild_settings(guild_id)
+    leveling = leveling_settings_from_db(db.get_leveling_settings(guild_id))
+    excluded_roles = db.get_excluded_roles(guild_id)
+    chatbot = db.get_chatbot_settings(guild_id) or {}
+
+    return MessagePolicy(
+        guild_id=guild_id,
+        version=guild_settings.get('settings_version') or 0,
+        leveling_enabled=bool(leveling.get('leveling_enabled')),
+        xp_per_message=leveling.get('xp_per_message', 10),
+        cooldown_seconds=leveling.get('cooldown_seconds', 60),
+        min_message_length=leveling.get('min_message_length', 0) or 0,
+        exempt_role_ids=_id_set(leveling.get('exempt_roles')),
+        excluded_role_ids=_id_set(excluded_roles),
+        chatbot_enabled=chatbot.get('enabled', 0) == 1,
+        chatbot_channel_ids=_id_set(chatbot.get('enabled_channels')),
+        chatbot_settings=MappingProxyType(dict(chatbot))
+    )
+
+
+class MessagePolicyCache:
+    """Cache MessagePolicy per guild, di-rebuild hanya saat settings_version berubah."""
+
+    def __init__(self):
+        self._policies: Dict[int, MessagePolicy] = {}
+        self._last_check = 0.0
+
+    async def get(self, guild_id: int) -> MessagePolicy:
+        """Dapatkan policy guild (rebuild jika versi settings berubah)."""
+        policy = self._policies.get(guild_id)
+        now = time.monotonic()
+        if now - self._last_check >= db.SETTINGS_CACHE_CHECK_INTERVAL:
+            # Validasi cache settings terhadap database (perubahan dari dashboard) di executor
+            self._last_check = now
+            version = await adb.settings_version(guild_id)
+        else:
+            version = db.peek_settings_version(guild_id)
+        if policy is not None and version is not None and policy.version == version:
+            return policy
+
+        policy = await adb.run(build_message_policy, guild_id)
+        self._policies[guild_id] = policy
+        return policy
+
+    def invalidate(self, guild_id: int = None):
+        """Paksa rebuild policy satu guild (atau semua guild)."""
+        if guild_id is None:
+            self._policies.clear()
+        else:
+            self._policies.pop(guild_id, None)
+
+
+# Global instance dipakai bersama oleh cog Leveling dan Chatbot
+message_policies = MessagePolicyCache()
@@ -0,0 +1,160 @@
+"""
+Progress Scheduler
+==================
+Satu loop untuk semua pesan now playing (menggantikan satu task edit per guild).
+Edit dibatasi budget global (edit/detik), interval tiap pesan menyesuaikan diri
+saat edit kena rate limit, dan edit dilewati jika progress yang di-render
+tidak berubah.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+import discord
+import config
+
+# Interval minimum edit per pesan (detik)
+PROGRESS_UPDATE_INTERVAL = getattr(config, 'PROGRESS_UPDATE_INTERVAL', 1)
+# Interval maksimum saat pesan sering kena rate limit / budget habis
+PROGRESS_MAX_INTERVAL = getattr(config, 'PROGRESS_MAX_INTERVAL', 15)
+# Budget global edit pesan progress per detik (semua guild)
+PROGRESS_EDIT_BUDGET = getattr(config, 'PROGRESS_EDIT_BUDGET', 5)
+
+# render() -> None (berhenti) atau (key, build_embed); edit hanya jika key berubah
+RenderFunc = Callable[[], Optional[Tuple[Hashable, Callable[[], discord.Embed]]]]
+
+# Edit yang lebih lama dari ini dianggap tertahan rate limit discord.py
+SLOW_EDIT_SECONDS = 1.0
+
+
+class _Entry:
+    __slots__ = ('message', 'render', 'interval', 'next_due', 'last_key', 'editing')
+
+    def __init__(self, message: discord.Message, render: RenderFunc, interval: float):
+        self.message = message
+        self.render = render
+        self.interval = interval
+        self.next_due = time.monotonic() + interval
+        self.last_key: Any = None
+        self.editing = False
+
+
+class ProgressScheduler:
+    """Scheduler edit progress bar untuk semua guild."""
+
+    def __init__(self, min_interval: float = PROGRESS_UPDATE_INTERVAL, max_interval: float = PROGRESS_MAX_INTERVAL,
+                 edits_per_second: float = PROGRESS_EDIT_BUDGET):
+        self.min_interval = max(0.5, float(min_interval))
+        self.max_interval = max(self.min_interval, float(max_interval))
+        self.edits_per_second = max(0.1, float(edits_per_second))
+        self._entries: Dict[int, _Entry] = {}
+        self._tokens = self.edits_per_second
+        self._last_refill = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        # Referensi task edit yang sedang berjalan agar tidak di-GC
+        self._edit_tasks: Set[asyncio.Task] = set()
+        self.stats = {'edits': 0, 'skipped_unchanged': 0, 'deferred': 0, 'throttled': 0, 'errors': 0}
+
+    def track(self, guild_id: int, message: discord.Message, render: RenderFunc):
+        """Mulai (atau ganti) update progress untuk pesan now playing guild."""
+        self._entries[guild_id] = _Entry(message, render, self._base_interval(len(self._entries) + 1))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def untrack(self, guild_id: int):
+        """Berhenti update progress guild."""
+        self._entries.pop(guild_id, None)
+
+    def stop(self):
+        """Hentikan loop scheduler dan edit yang sedang berjalan."""
+        self._entries.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._edit_tasks):
+            task.cancel()
+
+    def _base_interval(self, active: int) -> float:
+        """Interval agar semua pesan aktif muat dalam budget edit global."""
+        return min(self.max_interval, max(self.min_interval, active / self.edits_per_second))
+
+    def _refill(self, now: float):
+        self._tokens = min(self.edits_per_second, self._tokens + (now - self._last_refill) * self.edits_per_second)
+        self._last_refill = now
+
+    async def _run(self):
+        tick = self.min_interval / 2
+        while self._entries:
+            await asyncio.sleep(tick)
+            now = time.monotonic()
+            self._refill(now)
+            base = self._base_interval(len(self._entries))
+
+            due = sorted(
+                ((guild_id, entry) for guild_id, entry in self._entries.items()
+                 if entry.next_due <= now and not entry.editing),
+                key=lambda item: item[1].next_due
+            )
+            for index, (guild_id, entry) in enumerate(due):
+                try:
+                    rendered = entry.render()
+                except Exception as e:
+                    print(f"[Progress] Error rendering progress for guild {guild_id}: {e}")
+                    rendered = None
+                if rendered is None:
+                    self._drop(guild_id, entry)
+                    continue
+
+                key, build_embed = rendered
+                if key == entry.last_key:
+                    # Progress sama (misal sedang pause) - tidak perlu edit
+                    self.stats['skipped_unchanged'] += 1
+                    entry.next_due = now + max(base, entry.interval)
+                    continue
+                if self._tokens < 1:
+                    # Budget habis, sisanya menunggu tick berikutnya
+                    self.stats['deferred'] += len(due) - index
+                    break
+
+                self._tokens -= 1
+                entry.editing = True
+                entry.next_due = now + max(base, entry.interval)
+                task = asyncio.create_task(self._edit(guild_id, entry, key, build_embed(), base))
+                self._edit_tasks.add(task)
+                task.add_done_callback(self._edit_tasks.discard)
+
+    async def _edit(self, guild_id: int, entry: _Entry, key: Hashable, embed: discord.Embed, base: float):
+        started = time.monotonic()
+        try:
+            await entry.message.edit(embed=embed)
+        except discord.NotFound:
+            self._drop(guild_id, entry)
+            return
+        except discord.HTTPException as e:
+            self.stats['errors'] += 1
+            if e.status == 429:
+                entry.interval = min(self.max_interval, entry.interval * 2)
+            else:
+                print(f"[Progress] Error updating progress for guild {guild_id}: {e}")
+                self._drop(guild_id, entry)
+            return
+        finally:
+            entry.editing = False
+
+        self.stats['edits'] += 1
+        entry.last_key = key
+        if time.monotonic() - started > SLOW_EDIT_SECONDS:
+            # discord.py menahan request (bucket channel hampir habis) - perlambat pesan ini
+            self.stats['throttled'] += 1
+            entry.interval = min(self.max_interval, entry.interval * 2)
+        else:
+            entry.interval = max(base, entry.interval * 0.75)
+
+    def _drop(self, guild_id: int, entry: _Entry):
+        # Jangan hapus entry baru yang sudah menggantikan entry ini
+        if self._entries.get(guild_id) is entry:
+            del self._entries[guild_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistik edit dan jumlah pesan yang sedang di-update."""
+        return {**self.stats, 'active': len(self._entries), 'tokens': round(self._tokens, 2)}
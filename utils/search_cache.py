@@ -0,0 +1,151 @@
+"""
+Search Cache
+============
+Cache LRU + TTL untuk hasil pencarian ytmusicapi.
+Query genre, fallback autoplay, dan judul Spotify sering berulang, jadi hasilnya
+disimpan di memory (dibatasi jumlah entry) dan opsional di-persist ke file JSON
+agar tetap ada setelah restart.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import config
+
+SEARCH_CACHE_MAX_ENTRIES = getattr(config, 'SEARCH_CACHE_MAX_ENTRIES', 512)
+SEARCH_CACHE_TTL = getattr(config, 'SEARCH_CACHE_TTL', 6 * 3600)
+# Path file JSON untuk persistence (None = hanya di memory)
+SEARCH_CACHE_PATH = getattr(config, 'SEARCH_CACHE_PATH', None)
+SEARCH_CACHE_SAVE_INTERVAL = getattr(config, 'SEARCH_CACHE_SAVE_INTERVAL', 300)
+
+CacheKey = Tuple[str, str, int]
+
+
+class SearchCache:
+    """LRU + TTL cache: (query, filter, limit) -> list hasil search."""
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, ttl: float = SEARCH_CACHE_TTL,
+                 path: Optional[str] = SEARCH_CACHE_PATH, save_interval: float = SEARCH_CACHE_SAVE_INTERVAL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.save_interval = save_interval
+        # key -> (expires_at, results); expires_at pakai wall clock agar valid setelah restart
+        self._entries: OrderedDict[CacheKey, Tuple[float, List[Dict[str, Any]]]] = OrderedDict()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._saving = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.path:
+            self.load()
+
+    @staticmethod
+    def make_key(query: str, filter: str, limit: int) -> CacheKey:
+        """Normalisasi key (pencarian YouTube Music tidak case-sensitive)."""
+        return (' '.join(query.split()).casefold(), filter or '', int(limit))
+
+    def get(self, key: CacheKey) -> Optional[List[Dict[str, Any]]]:
+        """Ambil hasil dari cache (None jika tidak ada atau sudah expire)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, results = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self._dirty = True
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return results
+
+    def set(self, key: CacheKey, results: List[Dict[str, Any]]):
+        """Simpan hasil search (hasil kosong tidak di-cache)."""
+        if not results or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.time() + self.ttl, list(results))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self._dirty = True
+        self._maybe_save()
+
+    def clear(self):
+        """Kosongkan cache."""
+        self._entries.clear()
+        self._dirty = True
+
+    def stats(self) -> Dict[str, Any]:
+        """Metrics cache: hit/miss, hit rate, jumlah entry."""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+        }
+
+    # ==================== PERSISTENCE ====================
+
+    def load(self):
+        """Load cache dari file JSON (entry yang sudah expire dibuang)."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            now = time.time()
+            for query, filter, limit, expires_at, results in data.get('entries', [])[-self.max_entries:]:
+                if expires_at > now:
+                    self._entries[(query, filter, int(limit))] = (expires_at, results)
+            print(f"[SearchCache] Loaded {len(self._entries)} entries from {self.path}")
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[SearchCache] Error loading cache: {e}")
+
+    def _snapshot(self) -> dict:
+        return {
+            'entries': [
+                [query, filter, limit, expires_at, results]
+                for (query, filter, limit), (expires_at, results) in self._entries.items()
+            ]
+        }
+
+    def _write(self, snapshot: dict):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[SearchCache] Error saving cache: {e}")
+        finally:
+            self._saving = False
+
+    def _maybe_save(self):
+        """Simpan ke disk di background, paling sering sekali per save_interval."""
+        if not self.path or self._saving or time.monotonic() - self._last_save < self.save_interval:
+            return
+        self._last_save = time.monotonic()
+        self._dirty = False
+        self._saving = True
+        snapshot = self._snapshot()
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._write, snapshot)
+        except RuntimeError:
+            # Tidak ada event loop (misal dipanggil dari script)
+            self._write(snapshot)
+
+    def save(self):
+        """Simpan ke disk sekarang (blocking) jika ada perubahan."""
+        if self.path and self._dirty:
+            self._dirty = False
+            self._write(self._snapshot())
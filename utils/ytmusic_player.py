@@ -6,13 +6,25 @@ Juga mendukung Spotify URLs via spotdl.
 """
 
 import asyncio
+import atexit
 import discord
-from typing import Optional, Dict, List, Any
+import random
+import sys
+import time
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from itertools import islice
+from typing import Optional, Dict, List, Any, Tuple, Callable, Awaitable, Hashable, AsyncIterator, Deque, Iterator
 from dataclasses import dataclass, field
-from ytmusicapi import YTMusic
-import yt_dlp
+from urllib.parse import urlparse, parse_qs
+import config
+from utils.extraction_engine import ExtractionEngine, PRIORITY_USER, PRIORITY_PLAYBACK, PRIORITY_PREFETCH
+from utils.search_cache import SearchCache
+from utils.audio_cache import AudioCache
+from utils.progress_scheduler import ProgressScheduler
 
 import re
+from difflib import SequenceMatcher
 
 # Import Spotify helper
 from utils.spotify_helper import (
@@ -22,6 +34,13 @@ from utils.spotify_helper import (
     format_search_query
 )
 
+# Database opsional (tabel padanan Spotify -> YouTube)
+try:
+    from dashboard.backend.async_database import adb
+    HAS_DATABASE = True
+except ImportError:
+    HAS_DATABASE = False
+
 # YT-DLP Options untuk audio extraction
 YTDL_OPTIONS = {
     'format': 'bestaudio/best',
@@ -37,169 +56,761 @@ YTDL_OPTIONS = {
     'no_warnings': True,
     'default_search': 'auto',
     'source_address': '0.0.0.0',
+    'socket_timeout': 15,
 }
 
+# Stream URL cache: refresh N detik sebelum URL googlevideo expire
+STREAM_URL_CACHE_SIZE = getattr(config, 'STREAM_URL_CACHE_SIZE', 256)
+STREAM_URL_REFRESH_MARGIN = getattr(config, 'STREAM_URL_REFRESH_MARGIN', 600)
+# TTL jika URL tidak punya parameter expire
+STREAM_URL_DEFAULT_TTL = getattr(config, 'STREAM_URL_DEFAULT_TTL', 1800)
+
+# Jumlah pencarian paralel saat resolve playlist/album Spotify
+SPOTIFY_RESOLVE_CONCURRENCY = getattr(config, 'SPOTIFY_RESOLVE_CONCURRENCY', 8)
+# Padanan Spotify tersimpan dengan confidence di bawah ini dicari ulang
+SPOTIFY_MATCH_MIN_CONFIDENCE = getattr(config, 'SPOTIFY_MATCH_MIN_CONFIDENCE', 0.5)
+
+# Playlist YouTube besar dimuat per halaman saat queue hampir habis
+YOUTUBE_PLAYLIST_PAGE_SIZE = getattr(config, 'YOUTUBE_PLAYLIST_PAGE_SIZE', 100)
+YOUTUBE_PLAYLIST_REFILL_THRESHOLD = getattr(config, 'YOUTUBE_PLAYLIST_REFILL_THRESHOLD', 5)
+
+# Jumlah lagu yang sudah diputar yang disimpan untuk tombol Prev
+QUEUE_HISTORY_SIZE = getattr(config, 'QUEUE_HISTORY_SIZE', 50)
+
 # FFmpeg Options untuk audio streaming
 FFMPEG_OPTIONS = {
     'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
     'options': '-vn',
 }
 
+# Jumlah lagu berikutnya di queue yang stream URL-nya di-resolve di background
+PREFETCH_LOOKAHEAD = getattr(config, 'PREFETCH_LOOKAHEAD', 2)
+
+# Spawn FFmpeg lagu berikutnya N detik sebelum lagu saat ini selesai (0 = mati)
+WARM_SOURCE_LEAD = getattr(config, 'WARM_SOURCE_LEAD', 5)
+
+# Kirim paket Opus dari FFmpeg langsung ke Discord (tanpa decode PCM + encode di Python).
+# Stream Opus/WebM di-copy apa adanya saat volume 100%.
+OPUS_PASSTHROUGH = getattr(config, 'OPUS_PASSTHROUGH', True)
+# Bitrate (kbps) saat FFmpeg harus encode ulang (volume != 100% atau sumber bukan Opus)
+OPUS_BITRATE = getattr(config, 'OPUS_BITRATE', 128)
+
+
+class OpusStreamSource(discord.FFmpegOpusAudio):
+    """
+    FFmpegOpusAudio yang ingat URL, volume dan posisi playback, agar volume
+    bisa diganti di tengah lagu dengan membuat ulang source di posisi yang sama.
+    """
+
+    FRAME_SECONDS = 0.02  # Satu paket Opus Discord = 20 ms
+
+    def __init__(self, url: str, volume: float = 1.0, opus_input: bool = False, start: float = 0.0,
+                 local: bool = False):
+        self.url = url
+        self.volume = volume
+        self.opus_input = opus_input
+        self.start = start
+        self.local = local
+        self.frames = 0
+
+        # Opsi reconnect hanya untuk stream HTTP, bukan file cache lokal
+        before_options = '' if local else FFMPEG_OPTIONS['before_options']
+        if start > 0:
+            before_options = f"-ss {start:.2f} {before_options}".strip()
+        options = FFMPEG_OPTIONS['options']
+        # Filter volume hanya jika perlu - filter memaksa FFmpeg encode ulang
+        self.passthrough = opus_input and abs(volume - 1.0) < 0.005
+        if not self.passthrough and abs(volume - 1.0) >= 0.005:
+            options = f"{options} -filter:a volume={volume:.2f}"
+
+        super().__init__(
+            url,
+            bitrate=OPUS_BITRATE,
+            # 'opus' = stream copy di semua versi discord.py (2.3 mengubah 'copy' jadi libopus)
+            codec='opus' if self.passthrough else None,
+            before_options=before_options,
+            options=options
+        )
+
+    def read(self) -> bytes:
+        data = super().read()
+        if data:
+            self.frames += 1
+        return data
+
+    @property
+    def position(self) -> float:
+        """Posisi playback saat ini (detik)."""
+        return self.start + self.frames * self.FRAME_SECONDS
+
+
+def parse_duration(value: Any) -> int:
+    """Parse durasi ('3:34', '1:02:03', detik int/float) ke detik. 0 = tidak diketahui."""
+    if not value:
+        return 0
+    if isinstance(value, (int, float)):
+        return max(0, int(value))
+    try:
+        seconds = 0
+        for part in str(value).split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except ValueError:
+        return 0
+
+
+def format_duration(seconds: int) -> Optional[str]:
+    """Format detik ke MM:SS atau HH:MM:SS (None jika tidak diketahui)."""
+    if not seconds:
+        return None
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
 
-@dataclass
 class Song:
-    """Representasi sebuah lagu dalam queue."""
-    title: str
-    artist: str
-    url: str
-    video_id: str
-    thumbnail: Optional[str] = None
-    duration: Optional[str] = None
-    requester: Optional[discord.Member] = None
+    """Representasi sebuah lagu dalam queue.
+
+    Record ringkas (__slots__): requester hanya disimpan sebagai ID + snapshot
+    display name (bukan object discord.Member), durasi sebagai detik.
+    """
+    __slots__ = ('title', 'artist', 'url', 'video_id', 'thumbnail',
+                 'duration_seconds', 'requester_id', 'requester_name')
+
+    def __init__(self, title: str, artist: str, url: str, video_id: str,
+                 thumbnail: Optional[str] = None, duration: Any = None,
+                 requester: Optional[discord.Member] = None,
+                 requester_id: Optional[int] = None, requester_name: Optional[str] = None):
+        self.title = title
+        self.artist = artist
+        self.url = url
+        self.video_id = video_id
+        self.thumbnail = thumbnail
+        self.duration_seconds = parse_duration(duration)
+        if requester is not None:
+            requester_id = requester.id
+            requester_name = requester.display_name
+        self.requester_id = requester_id
+        self.requester_name = requester_name
+
+    def __repr__(self) -> str:
+        return f"Song(title={self.title!r}, artist={self.artist!r}, video_id={self.video_id!r})"
+
+    @property
+    def duration(self) -> Optional[str]:
+        """Durasi terformat ('3:34'), None jika tidak diketahui."""
+        return format_duration(self.duration_seconds)
+
+    @property
+    def requester_mention(self) -> Optional[str]:
+        """Mention requester tanpa perlu object Member."""
+        return f"<@{self.requester_id}>" if self.requester_id else None
 
     @property
     def youtube_url(self) -> str:
         """Return YouTube URL dari video ID."""
         return f"https://www.youtube.com/watch?v={self.video_id}"
 
+    def with_requester(self, requester: Optional[discord.Member]) -> 'Song':
+        """Copy lagu dengan requester lain."""
+        return Song(self.title, self.artist, self.url, self.video_id, self.thumbnail,
+                    self.duration_seconds, requester)
+
+
+class PlaylistSource:
+    """
+    Sumber playlist YouTube Music yang dimuat lazy per halaman.
+    Queue hanya berisi halaman yang sudah dimuat (Song tanpa stream URL);
+    sisa track tetap berupa cursor sampai queue hampir habis.
+
+    Halaman pertama diambil langsung; sisa track list diambil sekali di
+    background (ytmusicapi tidak bisa mulai dari offset), lalu halaman
+    berikutnya dipotong dari list itu.
+    """
+
+    def __init__(self, playlist_id: str, requester: discord.Member = None,
+                 page_size: int = YOUTUBE_PLAYLIST_PAGE_SIZE):
+        self.playlist_id = playlist_id
+        self.requester = requester
+        self.page_size = max(1, int(page_size))
+        self.title: Optional[str] = None
+        self.total: Optional[int] = None  # trackCount dari ytmusicapi (bisa None)
+        self.offset = 0  # index track berikutnya yang belum dimuat
+        self.exhausted = False
+        self._lock = asyncio.Lock()
+        # Seluruh track (dict ringkas dari worker), None sampai fetch background selesai
+        self._tracks: Optional[List[Dict[str, Any]]] = None
+        self._fetch_task: Optional[asyncio.Task] = None
+
+    @property
+    def remaining(self) -> int:
+        """Perkiraan jumlah track yang belum dimuat."""
+        if self.exhausted or self.total is None:
+            return 0
+        return max(0, self.total - self.offset)
+
+    def close(self):
+        """Batalkan fetch background dan lepas track list."""
+        self.exhausted = True
+        if self._fetch_task is not None and not self._fetch_task.done():
+            self._fetch_task.cancel()
+        self._fetch_task = None
+        self._tracks = None
+
+    async def next_page(self, engine: ExtractionEngine, priority: int = PRIORITY_PREFETCH,
+                        guild_id: int = None) -> List['Song']:
+        """Muat halaman berikutnya. Return list Song (kosong jika sudah habis)."""
+        async with self._lock:
+            if self.exhausted:
+                return []
+            if self.offset == 0:
+                tracks = await self._first_page(engine, priority, guild_id)
+            else:
+                tracks = await self._cached_page(engine, guild_id)
+
+            self.offset += len(tracks)
+            if len(tracks) < self.page_size or (self.total is not None and self.offset >= self.total):
+                self.close()
+            elif self._tracks is None and self._fetch_task is None:
+                self._start_fetch(engine, guild_id)
+
+            return [
+                Song(
+                    title=track.get('title') or 'Unknown',
+                    artist=track.get('artist') or 'Unknown',
+                    url='',  # Will be fetched when playing
+                    video_id=track['videoId'],
+                    thumbnail=track.get('thumbnail'),
+                    duration=track.get('duration') or 'Unknown',
+                    requester=self.requester
+                )
+                for track in tracks if track.get('videoId')
+            ]
+
+    async def _first_page(self, engine: ExtractionEngine, priority: int, guild_id: int) -> List[Dict[str, Any]]:
+        try:
+            page = await engine.playlist_page(self.playlist_id, self.page_size, priority=priority, guild_id=guild_id)
+        except Exception as e:
+            print(f"[Playlist] Error loading first page of {self.playlist_id}: {e}")
+            page = None
+        if not page:
+            return []
+
+        self.title = page.get('title')
+        if page.get('trackCount'):
+            try:
+                self.total = int(page['trackCount'])
+            except (TypeError, ValueError):
+                pass
+        return page.get('tracks') or []
+
+    def _start_fetch(self, engine: ExtractionEngine, guild_id: int):
+        """Ambil seluruh track list sekali di background (prioritas prefetch)."""
+        self._fetch_task = asyncio.create_task(engine.playlist_tracks(self.playlist_id, guild_id=guild_id))
+
+    async def _cached_page(self, engine: ExtractionEngine, guild_id: int) -> List[Dict[str, Any]]:
+        if self._tracks is None:
+            if self._fetch_task is None:
+                self._start_fetch(engine, guild_id)
+            try:
+                data = await self._fetch_task
+            except Exception as e:
+                print(f"[Playlist] Error loading tracks of {self.playlist_id}: {e}")
+                data = None
+            self._fetch_task = None
+            if not data:
+                return []
+            self._tracks = data.get('tracks') or []
+            # Jumlah track sebenarnya (trackCount bisa beda/None)
+            self.total = len(self._tracks)
+        return self._tracks[self.offset:self.offset + self.page_size]
+
 
 @dataclass
 class MusicQueue:
-    """Queue system untuk music player."""
-    songs: List[Song] = field(default_factory=list)
-    current_index: int = 0
+    """Queue system untuk music player.
+
+    songs[0] adalah lagu yang sedang diputar. Lagu yang selesai dipindah ke
+    history (deque terbatas) sehingga tombol Prev bisa memutar ulang.
+    """
+    songs: Deque[Song] = field(default_factory=deque)
+    current_index: int = 0  # Selalu 0 (lagu saat ini = songs[0]), dipertahankan untuk kompatibilitas
     loop: bool = False
     loop_single: bool = False
+    # Playlist lazy yang masih punya halaman belum dimuat (diisi ke akhir queue)
+    sources: List[PlaylistSource] = field(default_factory=list)
+    history: Deque[Song] = field(default_factory=lambda: deque(maxlen=QUEUE_HISTORY_SIZE))
+    # True setelah previous(): next() berikutnya tidak memajukan queue
+    _rewind: bool = False
+    # Total durasi (detik) semua lagu di songs, di-update setiap perubahan queue
+    total_seconds: int = 0
+    # Dipanggil setiap isi/urutan upcoming berubah (dipakai lookahead prefetch)
+    on_change: Optional[Callable[[], None]] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.total_seconds = sum(song.duration_seconds for song in self.songs)
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
 
     def add(self, song: Song) -> int:
         """Tambah lagu ke queue. Return posisi dalam queue."""
         self.songs.append(song)
+        self.total_seconds += song.duration_seconds
+        self._changed()
         # Return actual position (upcoming count + 1)
-        return len(self.songs) - self.current_index
+        return len(self.songs)
 
-    def insert_at_front(self, song: Song) -> int:
-        """Insert lagu di posisi depan (setelah lagu saat ini). Return posisi."""
+    def insert_at_front(self, song: Song, offset: int = 0) -> int:
+        """Insert lagu di posisi depan (setelah lagu saat ini). Return posisi.
+
+        offset dipakai untuk menyisipkan beberapa lagu berurutan (1, 2, 3, ...).
+        """
         # Insert at position 1 (right after current song at index 0)
-        insert_pos = 1
+        insert_pos = min(1 + offset, len(self.songs))
         self.songs.insert(insert_pos, song)
-        return 1  # Always returns position 1 (next to play)
+        self.total_seconds += song.duration_seconds
+        self._changed()
+        return insert_pos
 
     def next(self) -> Optional[Song]:
-        """Ambil lagu berikutnya dan hapus lagu yang sudah selesai."""
-        if self.loop_single and self.songs:
+        """Ambil lagu berikutnya; lagu yang sudah selesai masuk ke history."""
+        if self._rewind:
+            # previous() sudah menaruh lagu sebelumnya di depan
+            self._rewind = False
             return self.songs[0] if self.songs else None
 
-        # Hapus lagu yang sudah selesai (lagu saat ini di index 0)
-        if self.songs and self.current_index >= 0:
-            # Remove the song that just finished (index 0)
-            self.songs.pop(0)
+        if self.loop_single and self.songs:
+            return self.songs[0]
 
-        # Reset current_index to 0 (next song becomes current)
-        self.current_index = 0
+        # Lagu yang selesai (index 0) dipindah ke history - O(1)
+        if self.songs:
+            finished = self.songs.popleft()
+            self.total_seconds -= finished.duration_seconds
+            self.history.append(finished)
 
-        # Check if queue is empty
-        if not self.songs:
-            return None
+        return self.songs[0] if self.songs else None
 
-        # Handle loop all
-        if self.loop and self.songs:
-            return self.songs[0]
+    def previous(self) -> Optional[Song]:
+        """Mundur ke lagu terakhir di history (lagu saat ini tetap di queue setelahnya)."""
+        if not self.history:
+            return None
+        song = self.history.pop()
+        self.songs.appendleft(song)
+        self.total_seconds += song.duration_seconds
+        self._rewind = True
+        return song
 
-        # Return next song (now at index 0)
-        return self.songs[0] if self.songs else None
+    @property
+    def has_previous(self) -> bool:
+        """True jika ada lagu di history."""
+        return bool(self.history)
 
     @property
     def current_song(self) -> Optional[Song]:
         """Ambil lagu yang sedang diputar."""
-        if self.songs and 0 <= self.current_index < len(self.songs):
-            return self.songs[self.current_index]
-        return None
+        return self.songs[0] if self.songs else None
 
     def clear(self):
         """Kosongkan queue."""
         self.songs.clear()
         self.current_index = 0
+        for source in self.sources:
+            source.close()
+        self.sources.clear()
+        self._rewind = False
+        self.total_seconds = 0
+        self._changed()
 
     def remove(self, index: int) -> Optional[Song]:
-        """Hapus lagu dari queue berdasarkan index."""
-        # Adjust index for current song (index 0 is current, can't remove)
-        actual_index = self.current_index + index
-        if 0 <= actual_index < len(self.songs):
-            song = self.songs.pop(actual_index)
+        """Hapus lagu dari queue berdasarkan index (1 = lagu berikutnya).
+
+        O(n) pada deque; hanya next()/previous() yang O(1).
+        """
+        # Index 0 is current, can't remove
+        if 0 <= index < len(self.songs):
+            song = self.songs[index]
+            del self.songs[index]
+            self.total_seconds -= song.duration_seconds
+            self._changed()
             return song
         return None
 
+    def set_duration(self, song: Song, seconds: int):
+        """Isi durasi lagu; total_seconds hanya berubah jika lagu masih ada di songs."""
+        # Lagu lookahead ada di depan queue, jadi pencarian berhenti cepat
+        if any(queued is song for queued in self.songs):
+            self.total_seconds += seconds - song.duration_seconds
+        song.duration_seconds = seconds
+
+    def pop_last(self) -> Optional[Song]:
+        """Hapus lagu terakhir di queue (bukan lagu yang sedang diputar)."""
+        if len(self.songs) <= 1:
+            return None
+        song = self.songs.pop()
+        self.total_seconds -= song.duration_seconds
+        self._changed()
+        return song
+
     def shuffle(self):
-        """Acak lagu dalam queue (kecuali yang sedang diputar)."""
-        import random
-        if len(self.songs) > 1:
-            # Keep current song (index 0), shuffle the rest
-            current = self.songs[0] if self.songs else None
-            remaining = self.songs[1:] if len(self.songs) > 1 else []
-            random.shuffle(remaining)
-            self.songs = [current] + remaining if current else remaining
+        """Acak lagu dalam queue (kecuali yang sedang diputar).
+
+        Index deque O(n), jadi upcoming diacak sebagai list lalu deque diisi ulang sekali - O(n).
+        """
+        songs = self.songs
+        if len(songs) > 2:
+            upcoming = list(islice(songs, 1, None))
+            random.shuffle(upcoming)
+            current = songs[0]
+            songs.clear()
+            songs.append(current)
+            songs.extend(upcoming)
+        self._changed()
 
     def __len__(self) -> int:
         return len(self.songs)
 
+    @property
+    def upcoming_count(self) -> int:
+        """Jumlah lagu yang akan diputar (tanpa menyalin queue)."""
+        return max(0, len(self.songs) - 1)
+
+    @property
+    def upcoming_seconds(self) -> int:
+        """Total durasi lagu upcoming (detik), O(1)."""
+        current = self.current_song
+        return self.total_seconds - (current.duration_seconds if current else 0)
+
+    def iter_upcoming(self, start: int = 0, stop: int = None) -> Iterator[Song]:
+        """Iterasi lagu upcoming[start:stop] tanpa menyalin seluruh queue."""
+        return islice(self.songs, 1 + start, None if stop is None else 1 + stop)
+
+    @property
+    def pending_count(self) -> int:
+        """Jumlah track playlist yang belum dimuat ke queue."""
+        return sum(source.remaining for source in self.sources)
+
+    def needs_refill(self, threshold: int = YOUTUBE_PLAYLIST_REFILL_THRESHOLD) -> bool:
+        """True jika ada playlist lazy dan lagu upcoming tinggal sedikit."""
+        return bool(self.sources) and self.upcoming_count < threshold
+
     @property
     def upcoming(self) -> List[Song]:
-        """Return daftar lagu yang akan diputar."""
-        # Songs from index 1 onwards (index 0 is current)
-        return self.songs[1:] if len(self.songs) > 1 else []
+        """Return daftar lagu yang akan diputar (copy; untuk halaman pakai iter_upcoming)."""
+        return list(self.iter_upcoming())
+
+
+class GuildPlayerState:
+    """Semua state player satu guild (queue, mode, pesan now playing, task)."""
+    __slots__ = (
+        'guild_id', 'queue', 'volume', 'now_playing',
+        'unlimited_play', 'unlimited_genre', 'buffered_song', 'autoplay', 'transitioning',
+        # Dipakai cog Music
+        'now_playing_message', 'now_playing_view', 'song_start_time',
+        # Lookahead prefetch lagu berikutnya
+        'lookahead_task', 'lookahead_ids',
+        # FFmpeg lagu berikutnya yang sudah di-spawn: (video_id, volume, source)
+        'warm_task', 'warm_source',
+    )
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.queue = MusicQueue()
+        self.volume: Optional[float] = None  # None = belum di-set (pakai default)
+        self.now_playing: Optional[Song] = None
+        self.unlimited_play = False
+        self.unlimited_genre: Optional[str] = None
+        self.buffered_song: Optional[Song] = None
+        self.autoplay = False
+        self.transitioning = False
+        self.now_playing_message: Optional[discord.Message] = None
+        self.now_playing_view = None
+        self.song_start_time: Optional[float] = None
+        self.lookahead_task: Optional[asyncio.Task] = None
+        self.lookahead_ids: Tuple[str, ...] = ()
+        self.warm_task: Optional[asyncio.Task] = None
+        self.warm_source: Optional[Tuple[str, float, discord.AudioSource]] = None
+
+    def discard_warm_source(self):
+        """Batalkan warm-up dan matikan FFmpeg lagu berikutnya yang belum dipakai."""
+        if self.warm_task is not None and not self.warm_task.done():
+            self.warm_task.cancel()
+        self.warm_task = None
+        if self.warm_source is not None:
+            self.warm_source[2].cleanup()
+            self.warm_source = None
+
+    def cancel_lookahead(self):
+        """Batalkan prefetch lagu berikutnya yang sedang berjalan."""
+        if self.lookahead_task is not None and not self.lookahead_task.done():
+            self.lookahead_task.cancel()
+        self.lookahead_task = None
+        self.lookahead_ids = ()
+
+    def reset_modes(self):
+        """Matikan autoplay/unlimited play dan buang buffer."""
+        self.unlimited_play = False
+        self.unlimited_genre = None
+        self.buffered_song = None
+        self.autoplay = False
+        self.transitioning = False
+
+    def close(self):
+        """Lepas semua resource: task background, view, queue."""
+        self.cancel_lookahead()
+        self.discard_warm_source()
+        self.queue.on_change = None
+        if self.now_playing_view is not None:
+            self.now_playing_view.stop()
+        self.queue.clear()
+        self.queue.history.clear()
+        self.now_playing_view = None
+        self.now_playing_message = None
+        self.now_playing = None
+        self.reset_modes()
+
+
+class GuildStateField(MutableMapping):
+    """View dict-like (guild_id -> value) atas satu field GuildPlayerState. None = tidak ada."""
+    __slots__ = ('_registry', '_name')
+
+    def __init__(self, registry: 'PlayerStateRegistry', name: str):
+        self._registry = registry
+        self._name = name
+
+    def __getitem__(self, guild_id: int) -> Any:
+        state = self._registry.peek(guild_id)
+        value = getattr(state, self._name) if state is not None else None
+        if value is None:
+            raise KeyError(guild_id)
+        return value
+
+    def __setitem__(self, guild_id: int, value: Any):
+        setattr(self._registry.get(guild_id), self._name, value)
+
+    def __delitem__(self, guild_id: int):
+        state = self._registry.peek(guild_id)
+        if state is None or getattr(state, self._name) is None:
+            raise KeyError(guild_id)
+        setattr(state, self._name, None)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter([guild_id for guild_id, state in self._registry.items()
+                     if getattr(state, self._name) is not None])
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class PlayerStateRegistry:
+    """Registry GuildPlayerState per guild dengan satu jalur teardown."""
+
+    def __init__(self, on_create: Callable[[GuildPlayerState], None] = None):
+        self._states: Dict[int, GuildPlayerState] = {}
+        self._on_create = on_create
+
+    def get(self, guild_id: int) -> GuildPlayerState:
+        """Ambil atau buat state guild."""
+        state = self._states.get(guild_id)
+        if state is None:
+            state = self._states[guild_id] = GuildPlayerState(guild_id)
+            if self._on_create is not None:
+                self._on_create(state)
+        return state
+
+    def peek(self, guild_id: int) -> Optional[GuildPlayerState]:
+        """Ambil state guild tanpa membuat yang baru."""
+        return self._states.get(guild_id)
+
+    def items(self):
+        return list(self._states.items())
+
+    def field(self, name: str) -> GuildStateField:
+        """View dict-like untuk satu field (kompatibel dengan dict per guild lama)."""
+        if name not in GuildPlayerState.__slots__:
+            raise AttributeError(name)
+        return GuildStateField(self, name)
+
+    def teardown(self, guild_id: int):
+        """Hapus state guild dan lepas semua resource-nya."""
+        state = self._states.pop(guild_id, None)
+        if state is not None:
+            state.close()
+
+    def reset_modes(self):
+        """Reset autoplay/unlimited/buffer semua guild (dipakai saat cog di-load)."""
+        for state in self._states.values():
+            state.reset_modes()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def stats(self) -> Dict[str, int]:
+        """Jumlah object yang dipegang registry dan perkiraan memory (bytes)."""
+        queued = history = pending = tasks = views = messages = 0
+        memory = sys.getsizeof(self._states)
+        for state in self._states.values():
+            queue = state.queue
+            queued += len(queue.songs)
+            history += len(queue.history)
+            pending += queue.pending_count
+            tasks += state.lookahead_task is not None and not state.lookahead_task.done()
+            tasks += state.warm_task is not None and not state.warm_task.done()
+            views += state.now_playing_view is not None
+            messages += state.now_playing_message is not None
+            memory += sys.getsizeof(state) + sys.getsizeof(queue) + sys.getsizeof(queue.songs) + sys.getsizeof(queue.history)
+            memory += sum(sys.getsizeof(song) for song in queue.songs)
+            memory += sum(sys.getsizeof(song) for song in queue.history)
+        return {
+            'guilds': len(self._states),
+            'queued_songs': queued,
+            'history_songs': history,
+            'pending_playlist_tracks': pending,
+            'background_tasks': tasks,
+            'views': views,
+            'messages': messages,
+            'approx_bytes': memory,
+        }
+
+
+class SingleFlight:
+    """
+    Registry request yang sedang berjalan. Pemanggil concurrent dengan key yang
+    sama menunggu satu task bersama alih-alih menjalankan lookup sendiri.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # hits = ikut menunggu task yang sudah jalan, misses = memulai task baru
+        self.hits = 0
+        self.misses = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Jalankan func() sekali per key yang sedang in-flight."""
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.hits += 1
+        # shield: pemanggil yang di-cancel tidak membatalkan lookup pemanggil lain
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Tandai exception sudah dibaca meskipun semua pemanggil sudah pergi
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Counter hit/miss dan jumlah request yang sedang berjalan."""
+        return {'hits': self.hits, 'misses': self.misses, 'inflight': len(self._inflight)}
 
 
 class YTMusicPlayer:
     """Player untuk streaming musik dari YouTube Music."""
 
     def __init__(self):
-        self.ytmusic = YTMusic()
-        self.ytdl = yt_dlp.YoutubeDL(YTDL_OPTIONS)
-        self.queues: Dict[int, MusicQueue] = {}  # guild_id -> MusicQueue
-        self.volumes: Dict[int, float] = {}  # guild_id -> volume (0.0 - 1.0)
-        self.now_playing: Dict[int, Song] = {}  # guild_id -> current song
-        # Unlimited play state
-        self.unlimited_play_mode: Dict[int, bool] = {}  # guild_id -> is_active
-        self.unlimited_play_genre: Dict[int, str] = {}  # guild_id -> genre
-        # Buffer for unlimited play (preloaded next song)
-        self.buffered_songs: Dict[int, Song] = {}  # guild_id -> buffered song
-        # Autoplay state (plays similar songs automatically)
-        self.autoplay_mode: Dict[int, bool] = {}  # guild_id -> is_active
-        # Transitioning state to prevent race conditions during song changes
-        self.transitioning: Dict[int, bool] = {}  # guild_id -> is_transitioning
+        # yt-dlp/ytmusicapi dijalankan di worker pool terpisah
+        self.engine = ExtractionEngine(YTDL_OPTIONS)
+        atexit.register(self.engine.shutdown)
+        # Semua state per guild (queue, volume, mode, buffer, ...) ada di satu object
+        self.states = PlayerStateRegistry(on_create=self._init_state)
+        self.now_playing = self.states.field('now_playing')  # guild_id -> current song
+        # Stream URL cache (LRU): video_id -> (stream_url, expires_at, is_opus, duration)
+        self.stream_urls: OrderedDict[str, Tuple[str, float, bool, Optional[int]]] = OrderedDict()
+        # Single-flight registry per jenis lookup
+        self._stream_flight = SingleFlight('stream_url')
+        self._search_flight = SingleFlight('search')
+        self._song_info_flight = SingleFlight('song_info')
+        # Cache hasil search (LRU + TTL, opsional persist ke disk)
+        self.search_cache = SearchCache()
+        atexit.register(self.search_cache.save)
+        # Cache audio Opus di disk (opsional, AUDIO_CACHE_DIR)
+        self.audio_cache = AudioCache()
+        # Satu loop edit progress bar untuk semua pesan now playing
+        self.progress = ProgressScheduler()
+        # Referensi task background (simpan padanan Spotify) agar tidak di-GC
+        self._background_tasks = set()
+
+    def _init_state(self, state: GuildPlayerState):
+        """Pasang hook lookahead ke queue guild baru."""
+        guild_id = state.guild_id
+        state.queue.on_change = lambda: self._on_queue_change(guild_id)
+
+    def _on_queue_change(self, guild_id: int):
+        """Queue berubah: update lookahead dan buang warm source yang sudah basi."""
+        self.schedule_lookahead(guild_id)
+        state = self.states.peek(guild_id)
+        if state is not None and state.warm_source is not None:
+            target = self._warm_target(state.queue)
+            if target is None or target.video_id != state.warm_source[0]:
+                state.discard_warm_source()
 
     def get_queue(self, guild_id: int) -> MusicQueue:
         """Ambil atau buat queue untuk guild."""
-        if guild_id not in self.queues:
-            self.queues[guild_id] = MusicQueue()
-        return self.queues[guild_id]
+        return self.states.get(guild_id).queue
 
     def get_volume(self, guild_id: int) -> float:
         """Ambil volume untuk guild (default 0.5 = 50%)."""
-        return self.volumes.get(guild_id, 1.0)
+        state = self.states.peek(guild_id)
+        return state.volume if state is not None and state.volume is not None else 1.0
 
     def set_volume(self, guild_id: int, volume: float):
         """Set volume untuk guild (0.0 - 1.0)."""
-        self.volumes[guild_id] = max(0.0, min(1.0, volume))
+        self.states.get(guild_id).volume = max(0.0, min(1.0, volume))
+
+    @staticmethod
+    def _guild_id(member: Optional[discord.Member]) -> Optional[int]:
+        """Guild ID dari requester (untuk fairness antrian extraction)."""
+        guild = getattr(member, 'guild', None)
+        return guild.id if guild else None
 
-    async def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    async def search(self, query: str, limit: int = 5, priority: int = PRIORITY_USER,
+                     guild_id: int = None) -> List[Dict[str, Any]]:
         """
         Cari lagu di YouTube Music.
         
         Args:
             query: Kata kunci pencarian
             limit: Jumlah hasil maksimal
+            priority: Prioritas di extraction engine
+            guild_id: Guild yang meminta (fairness antar guild)
             
         Returns:
             List hasil pencarian
         """
-        loop = asyncio.get_event_loop()
-        results = await loop.run_in_executor(
-            None,
-            lambda: self.ytmusic.search(query, filter="songs", limit=limit)
-        )
+        key = SearchCache.make_key(query, "songs", limit)
+        results = self.search_cache.get(key)
+        if results is None:
+            results = await self._search_flight.do(key, lambda: self._search(key, query, limit, priority, guild_id))
+        # Copy list agar pemanggil tidak saling mengubah hasil yang sama
+        return list(results) if results else results
+
+    async def _search(self, key, query: str, limit: int, priority: int, guild_id: Optional[int]) -> List[Dict[str, Any]]:
+        results = await self.engine.ytmusic('search', query, filter="songs", limit=limit,
+                                            priority=priority, guild_id=guild_id)
+        self.search_cache.set(key, results)
         return results
 
+    def get_lookup_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Counter single-flight (stream URL, search, song info) dan metrics search cache."""
+        stats = {
+            flight.name: flight.stats()
+            for flight in (self._stream_flight, self._search_flight, self._song_info_flight)
+        }
+        stats['search_cache'] = self.search_cache.stats()
+        stats['audio_cache'] = self.audio_cache.stats()
+        stats['progress'] = self.progress.get_stats()
+        return stats
+
     def _extract_playlist_id(self, url: str) -> Optional[str]:
         """Extract playlist ID dari URL."""
         # Pattern untuk YouTube Music playlist
@@ -226,74 +837,149 @@ class YTMusicPlayer:
         """Dapatkan tipe URL Spotify: 'track', 'playlist', atau 'album'."""
         return get_spotify_url_type(url)
 
-    async def get_playlist_songs(self, playlist_url: str, requester: discord.Member = None) -> List[Song]:
+    async def open_playlist(self, playlist_url: str, requester: discord.Member = None
+                            ) -> Tuple[Optional[PlaylistSource], List[Song]]:
         """
-        Ambil semua lagu dari playlist YouTube Music.
-        
+        Buka playlist YouTube Music secara lazy: hanya halaman pertama yang dimuat.
+
         Args:
             playlist_url: URL playlist
             requester: Member yang request
-            
+
         Returns:
-            List of Song objects
+            (PlaylistSource, lagu halaman pertama). Source None jika playlist
+            sudah termuat semua atau gagal dimuat.
         """
-        songs = []
-        
+        playlist_id = self._extract_playlist_id(playlist_url)
+        if not playlist_id:
+            print(f"Could not extract playlist ID from: {playlist_url}")
+            return None, []
+
+        source = PlaylistSource(playlist_id, requester)
+        songs = await source.next_page(self.engine, priority=PRIORITY_USER, guild_id=self._guild_id(requester))
+        if not songs:
+            print(f"Could not get playlist data for: {playlist_id}")
+            return None, []
+
+        total = source.total if source.total is not None else len(songs)
+        print(f"[Playlist] Loaded first {len(songs)} of {total} songs from {playlist_id}")
+        return (None if source.exhausted else source), songs
+
+    async def refill_queue(self, guild_id: int, force: bool = False,
+                           priority: int = PRIORITY_PREFETCH) -> int:
+        """
+        Muat halaman berikutnya dari playlist lazy jika queue hampir habis.
+        Return jumlah lagu yang ditambahkan.
+        """
+        queue = self.get_queue(guild_id)
+        added = 0
+        while queue.sources and (force or queue.needs_refill()):
+            source = queue.sources[0]
+            songs = await source.next_page(self.engine, priority=priority, guild_id=guild_id)
+            # Queue bisa di-clear/diganti selama menunggu worker
+            state = self.states.peek(guild_id)
+            if state is None or state.queue is not queue or source not in queue.sources:
+                return added
+            for song in songs:
+                queue.add(song)
+            added += len(songs)
+            if source.exhausted:
+                queue.sources.remove(source)
+            if songs:
+                print(f"[Playlist] Loaded {len(songs)} more songs ({source.remaining} remaining) for guild {guild_id}")
+                break
+        return added
+
+    async def get_playlist_songs(self, playlist_url: str, requester: discord.Member = None) -> List[Song]:
+        """
+        Ambil semua lagu dari playlist YouTube Music (semua halaman).
+        Untuk playback pakai open_playlist() agar tidak menunggu seluruh playlist.
+        """
+        source, songs = await self.open_playlist(playlist_url, requester)
+        while source is not None and not source.exhausted:
+            songs.extend(await source.next_page(self.engine, priority=PRIORITY_USER, guild_id=self._guild_id(requester)))
+        print(f"Loaded {len(songs)} songs from playlist")
+        return songs
+
+    # ==================== SPOTIFY MATCH STORE ====================
+    async def _lookup_spotify_matches(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Batch lookup padanan Spotify -> YouTube yang sudah tersimpan (yang cukup yakin saja)."""
+        if not HAS_DATABASE:
+            return {}
         try:
-            playlist_id = self._extract_playlist_id(playlist_url)
-            
-            if not playlist_id:
-                print(f"Could not extract playlist ID from: {playlist_url}")
-                return songs
-            
-            # Get playlist info from ytmusicapi
-            loop = asyncio.get_event_loop()
-            playlist_data = await loop.run_in_executor(
-                None,
-                lambda: self.ytmusic.get_playlist(playlist_id, limit=100)
-            )
-            
-            if not playlist_data:
-                print(f"Could not get playlist data for: {playlist_id}")
-                return songs
-            
-            tracks = playlist_data.get('tracks', [])
-            
-            for track in tracks:
-                video_id = track.get('videoId')
-                if not video_id:
-                    continue
-                
-                # Extract artist
-                artists = track.get('artists', [])
-                artist_name = artists[0].get('name', 'Unknown') if artists else 'Unknown'
-                
-                # Extract thumbnail
-                thumbnails = track.get('thumbnails', [])
-                thumbnail = thumbnails[-1].get('url') if thumbnails else None
-                
-                # Extract duration
-                duration = track.get('duration', 'Unknown')
-                
-                song = Song(
-                    title=track.get('title', 'Unknown'),
-                    artist=artist_name,
-                    url='',  # Will be fetched when playing
-                    video_id=video_id,
-                    thumbnail=thumbnail,
-                    duration=duration,
-                    requester=requester
-                )
-                songs.append(song)
-                
-            print(f"Loaded {len(songs)} songs from playlist")
-            
+            matches = await adb.get_spotify_matches(track_ids)
         except Exception as e:
-            print(f"Error getting playlist: {e}")
+            print(f"Error loading Spotify matches: {e}")
+            return {}
+        # Padanan lemah dicari ulang; hasil baru menimpa row lama saat disimpan
+        return {
+            track_id: match for track_id, match in matches.items()
+            if (match.get('confidence') or 0) >= SPOTIFY_MATCH_MIN_CONFIDENCE
+        }
 
-        return songs
+    def _save_spotify_matches(self, rows: List[Dict[str, Any]]):
+        """Simpan padanan baru di background."""
+        if not HAS_DATABASE or not rows:
+            return
+        try:
+            task = asyncio.create_task(adb.save_spotify_matches(rows))
+        except RuntimeError:
+            # Tidak ada event loop yang berjalan (generator ditutup saat shutdown)
+            return
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    @staticmethod
+    def _match_confidence(track_info: Dict[str, Any], result: Dict[str, Any]) -> float:
+        """Skor 0..1 kemiripan hasil YouTube dengan track Spotify (judul, artist, durasi)."""
+        def normalize(text: str) -> str:
+            return re.sub(r'[^\w\s]', '', (text or '').casefold()).strip()
+
+        title = normalize(track_info.get('title', '').split('(')[0].split('[')[0])
+        title_score = SequenceMatcher(None, title, normalize(result.get('title', ''))).ratio()
+
+        artist = normalize(track_info.get('artist', '').split(',')[0])
+        result_artists = normalize(' '.join(a.get('name', '') for a in result.get('artists') or []))
+        if artist and artist in result_artists:
+            artist_score = 1.0
+        else:
+            artist_score = SequenceMatcher(None, artist, result_artists).ratio()
+
+        score = 0.6 * title_score + 0.4 * artist_score
+
+        # Durasi beda jauh biasanya versi live/extended
+        duration_ms = track_info.get('duration_ms')
+        result_seconds = result.get('duration_seconds')
+        if duration_ms and result_seconds and abs(duration_ms / 1000 - result_seconds) > 15:
+            score *= 0.8
+
+        return round(score, 3)
+
+    def _match_row(self, track_info: Dict[str, Any], song: Song, result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'spotify_track_id': track_info.get('track_id'),
+            'video_id': song.video_id,
+            'title': song.title,
+            'artist': song.artist,
+            'thumbnail': song.thumbnail,
+            'duration': song.duration,
+            'confidence': self._match_confidence(track_info, result)
+        }
+
+    @staticmethod
+    def _song_from_match(match: Dict[str, Any], requester: discord.Member = None) -> Song:
+        return Song(
+            title=match.get('title') or 'Unknown',
+            artist=match.get('artist') or 'Unknown',
+            url='',  # Will be fetched when playing
+            video_id=match['video_id'],
+            thumbnail=match.get('thumbnail'),
+            duration=match.get('duration') or 'Unknown',
+            requester=requester
+        )
 
-    async def _get_spotify_track(self, track_url: str, requester: discord.Member = None) -> Optional[Song]:
+    async def _get_spotify_track(self, track_url: str, requester: discord.Member = None,
+                                 guild_id: int = None) -> Optional[Song]:
         """
         Ambil info lagu dari Spotify URL dan cari di YouTube.
 
@@ -305,6 +991,13 @@ class YTMusicPlayer:
             Song object atau None jika tidak ditemukan
         """
         try:
+            # Padanan yang sudah tersimpan: tanpa oEmbed dan search sama sekali
+            track_id = spotify_parser.extract_id(track_url)
+            if track_id:
+                match = (await self._lookup_spotify_matches([track_id])).get(track_id)
+                if match:
+                    return self._song_from_match(match, requester)
+
             # Get track info dari Spotify oEmbed
             track_info = await spotify_parser.get_track_info_from_oembed(track_url)
 
@@ -319,11 +1012,12 @@ class YTMusicPlayer:
             )
 
             # Search di YouTube Music
-            results = await self.search(search_query, limit=1)
+            guild_id = guild_id or self._guild_id(requester)
+            results = await self.search(search_query, limit=1, guild_id=guild_id)
 
             if not results:
                 # Fallback: search dengan judul saja
-                results = await self.search(track_info['title'], limit=1)
+                results = await self.search(track_info['title'], limit=1, guild_id=guild_id)
 
             if not results:
                 print(f"No YouTube results found for: {search_query}")
@@ -346,7 +1040,7 @@ class YTMusicPlayer:
             # Extract duration
             duration = result.get('duration', 'Unknown')
 
-            return Song(
+            song = Song(
                 title=track_info['title'],  # Gunakan judul dari Spotify (lebih clean)
                 artist=track_info['artist'],  # Gunakan artist dari Spotify
                 url='',  # Will be fetched when playing
@@ -355,29 +1049,85 @@ class YTMusicPlayer:
                 duration=duration,
                 requester=requester
             )
+            self._save_spotify_matches([self._match_row(track_info, song, result)])
+            return song
 
         except Exception as e:
             print(f"Error getting Spotify track: {e}")
 
         return None
 
-    async def get_spotify_playlist_songs(self, playlist_url: str, requester: discord.Member = None) -> List[Song]:
+    async def _resolve_spotify_track(self, track_info: Dict[str, Any], requester: discord.Member = None,
+                                     guild_id: int = None) -> Tuple[Optional[Song], Optional[Dict[str, Any]]]:
+        """Cari padanan YouTube untuk satu track Spotify (dari playlist/album).
+
+        Returns (Song, row padanan untuk disimpan) atau (None, None).
         """
-        Ambil semua lagu dari Spotify playlist/album dan cari di YouTube.
+        try:
+            # Format search query
+            search_query = format_search_query(
+                track_info['title'],
+                track_info['artist']
+            )
 
-        Args:
-            playlist_url: URL playlist/album Spotify
-            requester: Member yang request
+            # Search di YouTube Music
+            results = await self.search(search_query, limit=1, guild_id=guild_id)
 
-        Returns:
-            List of Song objects
+            if not results:
+                # Skip jika tidak ditemukan
+                print(f"Could not find YouTube match for: {search_query}")
+                return None, None
+
+            result = results[0]
+            video_id = result.get('videoId', '')
+
+            # Extract thumbnail
+            thumbnails = result.get('thumbnails', [])
+            thumbnail = thumbnails[-1].get('url') if thumbnails else None
+            # Prioritize Spotify thumbnail
+            if track_info.get('thumbnail'):
+                thumbnail = track_info['thumbnail']
+
+            # Format duration
+            duration = 'Unknown'
+            if track_info.get('duration_ms'):
+                seconds = track_info['duration_ms'] // 1000
+                mins, secs = divmod(seconds, 60)
+                duration = f"{mins}:{secs:02d}"
+            elif result.get('duration'):
+                duration = result['duration']
+
+            song = Song(
+                title=track_info['title'],
+                artist=track_info['artist'],
+                url='',  # Will be fetched when playing
+                video_id=video_id,
+                thumbnail=thumbnail,
+                duration=duration,
+                requester=requester
+            )
+            return song, self._match_row(track_info, song, result)
+
+        except Exception as e:
+            print(f"Error processing Spotify track: {e}")
+            return None, None
+
+    async def iter_spotify_playlist_songs(self, playlist_url: str, requester: discord.Member = None,
+                                          concurrency: int = SPOTIFY_RESOLVE_CONCURRENCY
+                                          ) -> AsyncIterator[Tuple[int, int, Optional[Song]]]:
+        """
+        Resolve Spotify playlist/album ke Song secara paralel (dibatasi `concurrency`).
+        Hasil di-yield sesuai urutan asli begitu tersedia, jadi lagu pertama bisa
+        langsung diputar selagi sisanya masih dicari.
+
+        Yields:
+            (index, total, Song atau None jika tidak ditemukan)
         """
-        songs = []
         spotify_type = self._get_spotify_url_type(playlist_url)
 
         if spotify_type != 'playlist' and spotify_type != 'album':
             print(f"Not a Spotify playlist/album URL: {playlist_url}")
-            return songs
+            return
 
         try:
             # Get tracks dari Spotify
@@ -385,67 +1135,63 @@ class YTMusicPlayer:
                 tracks_info = await spotify_parser.get_playlist_tracks_basic(playlist_url)
             else:  # album
                 tracks_info = await spotify_parser.get_album_tracks_basic(playlist_url)
+        except Exception as e:
+            print(f"Error getting Spotify playlist/album: {e}")
+            return
 
-            if not tracks_info:
-                print(f"Could not get tracks from Spotify: {playlist_url}")
-                return songs
-
-            # Convert setiap track ke Song objects dengan mencari di YouTube
-            for track_info in tracks_info:
-                try:
-                    # Format search query
-                    search_query = format_search_query(
-                        track_info['title'],
-                        track_info['artist']
-                    )
-
-                    # Search di YouTube Music
-                    results = await self.search(search_query, limit=1)
+        if not tracks_info:
+            print(f"Could not get tracks from Spotify: {playlist_url}")
+            return
 
-                    if not results:
-                        # Skip jika tidak ditemukan
-                        print(f"Could not find YouTube match for: {search_query}")
-                        continue
+        guild_id = self._guild_id(requester)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
 
-                    result = results[0]
-                    video_id = result.get('videoId', '')
+        # Satu batch lookup untuk semua track yang sudah pernah di-resolve
+        matches = await self._lookup_spotify_matches([t.get('track_id') for t in tracks_info])
+        new_matches = []
 
-                    # Extract thumbnail
-                    thumbnails = result.get('thumbnails', [])
-                    thumbnail = thumbnails[-1].get('url') if thumbnails else None
-                    # Prioritize Spotify thumbnail
-                    if track_info.get('thumbnail'):
-                        thumbnail = track_info['thumbnail']
-
-                    # Format duration
-                    duration = 'Unknown'
-                    if track_info.get('duration_ms'):
-                        seconds = track_info['duration_ms'] // 1000
-                        mins, secs = divmod(seconds, 60)
-                        duration = f"{mins}:{secs:02d}"
-                    elif result.get('duration'):
-                        duration = result['duration']
-
-                    song = Song(
-                        title=track_info['title'],
-                        artist=track_info['artist'],
-                        url='',  # Will be fetched when playing
-                        video_id=video_id,
-                        thumbnail=thumbnail,
-                        duration=duration,
-                        requester=requester
-                    )
-                    songs.append(song)
+        async def resolve(track_info):
+            match = matches.get(track_info.get('track_id'))
+            if match:
+                return self._song_from_match(match, requester)
+            async with semaphore:
+                song, match_row = await self._resolve_spotify_track(track_info, requester, guild_id)
+            if match_row:
+                new_matches.append(match_row)
+            return song
 
-                except Exception as e:
-                    print(f"Error processing Spotify track: {e}")
-                    continue
+        # Task dibuat berurutan, jadi track awal mendapat semaphore lebih dulu
+        tasks = [asyncio.create_task(resolve(track_info)) for track_info in tracks_info]
+        total = len(tasks)
+        resolved = 0
+        try:
+            for index, task in enumerate(tasks):
+                song = await task
+                if song:
+                    resolved += 1
+                yield index, total, song
+            print(f"Loaded {resolved} songs from Spotify {spotify_type} ({len(matches)} from match store)")
+        finally:
+            # Consumer berhenti lebih awal (misal bot disconnect): batalkan sisa pencarian
+            for task in tasks:
+                task.cancel()
+            self._save_spotify_matches(new_matches)
 
-            print(f"Loaded {len(songs)} songs from Spotify {spotify_type}")
+    async def get_spotify_playlist_songs(self, playlist_url: str, requester: discord.Member = None) -> List[Song]:
+        """
+        Ambil semua lagu dari Spotify playlist/album dan cari di YouTube.
 
-        except Exception as e:
-            print(f"Error getting Spotify playlist/album: {e}")
+        Args:
+            playlist_url: URL playlist/album Spotify
+            requester: Member yang request
 
+        Returns:
+            List of Song objects
+        """
+        songs = []
+        async for _, _, song in self.iter_spotify_playlist_songs(playlist_url, requester):
+            if song:
+                songs.append(song)
         return songs
 
     async def get_song_info(self, query: str, requester: discord.Member = None) -> Optional[Song]:
@@ -460,13 +1206,22 @@ class YTMusicPlayer:
         Returns:
             Song object atau None jika tidak ditemukan
         """
+        song = await self._song_info_flight.do(query, lambda: self._fetch_song_info(query, self._guild_id(requester)))
+        if song is None:
+            return None
+        # Setiap pemanggil dapat object Song sendiri dengan requester masing-masing
+        return song.with_requester(requester)
+
+    async def _fetch_song_info(self, query: str, guild_id: int = None) -> Optional[Song]:
+        """Lookup song info tanpa requester (dipakai bersama oleh get_song_info)."""
+        requester = None
         try:
             # Cek apakah query adalah Spotify URL
             if self._is_spotify_url(query):
                 spotify_type = self._get_spotify_url_type(query)
 
                 if spotify_type == 'track':
-                    return await self._get_spotify_track(query, requester)
+                    return await self._get_spotify_track(query, requester, guild_id=guild_id)
                 elif spotify_type in ('playlist', 'album'):
                     # Playlist/album handled separately in get_spotify_playlist_songs
                     return None
@@ -474,13 +1229,10 @@ class YTMusicPlayer:
             # Cek apakah query adalah YouTube URL
             if "youtube.com" in query or "youtu.be" in query or "music.youtube.com" in query:
                 # Extract video ID dari URL
-                loop = asyncio.get_event_loop()
-                info = await loop.run_in_executor(
-                    None,
-                    lambda: self.ytdl.extract_info(query, download=False)
-                )
+                info = await self.engine.extract_info(query, priority=PRIORITY_USER, guild_id=guild_id)
                 
                 if info:
+                    self._cache_stream_url(info)
                     return Song(
                         title=info.get('title', 'Unknown'),
                         artist=info.get('uploader', 'Unknown'),
@@ -492,7 +1244,7 @@ class YTMusicPlayer:
                     )
             else:
                 # Search di YouTube Music
-                results = await self.search(query, limit=1)
+                results = await self.search(query, limit=1, guild_id=guild_id)
                 
                 if results:
                     result = results[0]
@@ -500,12 +1252,11 @@ class YTMusicPlayer:
                     
                     # Get stream URL menggunakan yt-dlp
                     youtube_url = f"https://www.youtube.com/watch?v={video_id}"
-                    loop = asyncio.get_event_loop()
-                    info = await loop.run_in_executor(
-                        None,
-                        lambda: self.ytdl.extract_info(youtube_url, download=False)
-                    )
+                    info = await self.engine.extract_info(youtube_url, priority=PRIORITY_USER, guild_id=guild_id)
                     
+                    if info:
+                        self._cache_stream_url(info, video_id)
+
                     # Extract artist name
                     artists = result.get('artists', [])
                     artist_name = artists[0].get('name', 'Unknown') if artists else 'Unknown'
@@ -534,25 +1285,84 @@ class YTMusicPlayer:
             
         return None
 
-    async def get_stream_url(self, video_id: str) -> Optional[str]:
+    @staticmethod
+    def _get_stream_expiry(url: str) -> float:
+        """Ambil timestamp expire dari URL googlevideo (fallback ke default TTL)."""
+        try:
+            expire = parse_qs(urlparse(url).query).get('expire')
+            if expire:
+                return float(expire[0])
+            # Beberapa URL menyimpan parameter di path: /expire/1700000000/
+            match = re.search(r'/expire/(\d+)', url)
+            if match:
+                return float(match.group(1))
+        except (ValueError, TypeError):
+            pass
+        return time.time() + STREAM_URL_DEFAULT_TTL
+
+    def _cache_stream_url(self, info: Dict[str, Any], video_id: str = None):
+        """Simpan stream URL dari hasil extract_info ke cache."""
+        video_id = video_id or info.get('id')
+        url = info.get('url')
+        if not video_id or not url:
+            return
+        # Opus dalam WebM/Ogg bisa di-passthrough tanpa encode ulang
+        is_opus = info.get('acodec') == 'opus' and info.get('ext') in ('webm', 'opus', 'ogg')
+        self.stream_urls[video_id] = (url, self._get_stream_expiry(url), is_opus, info.get('duration'))
+        self.stream_urls.move_to_end(video_id)
+        while len(self.stream_urls) > STREAM_URL_CACHE_SIZE:
+            self.stream_urls.popitem(last=False)
+
+    def get_cached_stream_url(self, video_id: str) -> Optional[str]:
+        """Ambil stream URL dari cache jika masih jauh dari expire."""
+        cached = self.stream_urls.get(video_id)
+        if not cached:
+            return None
+        url, expires_at = cached[:2]
+        if expires_at - time.time() <= STREAM_URL_REFRESH_MARGIN:
+            del self.stream_urls[video_id]
+            return None
+        self.stream_urls.move_to_end(video_id)
+        return url
+
+    def is_opus_stream(self, video_id: str) -> bool:
+        """True jika stream URL yang di-cache untuk video ini berformat Opus."""
+        cached = self.stream_urls.get(video_id)
+        return bool(cached and cached[2])
+
+    def invalidate_stream_url(self, video_id: str):
+        """Hapus stream URL dari cache (misal setelah playback error)."""
+        self.stream_urls.pop(video_id, None)
+
+    async def get_stream_url(self, video_id: str, force_refresh: bool = False,
+                             priority: int = PRIORITY_PLAYBACK, guild_id: int = None) -> Optional[str]:
         """
         Ambil stream URL dari video ID.
+        URL di-cache per video_id sampai mendekati waktu expire.
         
         Args:
             video_id: YouTube video ID
+            force_refresh: Abaikan cache dan extract ulang
+            priority: Prioritas di extraction engine (preload pakai PRIORITY_PREFETCH)
+            guild_id: Guild yang meminta (fairness antar guild)
             
         Returns:
             Stream URL atau None
         """
+        if not force_refresh:
+            cached = self.get_cached_stream_url(video_id)
+            if cached:
+                return cached
+
+        return await self._stream_flight.do(video_id, lambda: self._extract_stream_url(video_id, priority, guild_id))
+
+    async def _extract_stream_url(self, video_id: str, priority: int, guild_id: Optional[int]) -> Optional[str]:
         try:
             youtube_url = f"https://www.youtube.com/watch?v={video_id}"
-            loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(
-                None,
-                lambda: self.ytdl.extract_info(youtube_url, download=False)
-            )
+            info = await self.engine.extract_info(youtube_url, priority=priority, guild_id=guild_id)
             
             if info:
+                self._cache_stream_url(info, video_id)
                 return info.get('url')
                 
         except Exception as e:
@@ -560,33 +1370,190 @@ class YTMusicPlayer:
             
         return None
 
-    def create_audio_source(self, url: str, volume: float = 0.5) -> discord.PCMVolumeTransformer:
+    # ==================== LOOKAHEAD PREFETCH ====================
+    def schedule_lookahead(self, guild_id: int):
+        """
+        Resolve stream URL PREFETCH_LOOKAHEAD lagu berikutnya di background.
+        Prefetch lama dibatalkan jika lagu berikutnya berubah (remove/shuffle/clear).
+        """
+        state = self.states.peek(guild_id)
+        if state is None or PREFETCH_LOOKAHEAD <= 0:
+            return
+        songs = list(state.queue.iter_upcoming(0, PREFETCH_LOOKAHEAD))
+        ids = tuple(song.video_id for song in songs)
+        if ids == state.lookahead_ids:
+            return  # Sudah/sedang di-prefetch
+
+        state.cancel_lookahead()
+        songs = [song for song in songs if not self.get_cached_stream_url(song.video_id)]
+        if not songs:
+            state.lookahead_ids = ids
+            return
+        try:
+            state.lookahead_task = asyncio.get_running_loop().create_task(self._lookahead(guild_id, songs))
+        except RuntimeError:
+            return  # Tidak ada event loop
+        state.lookahead_ids = ids
+
+    async def _lookahead(self, guild_id: int, songs: List[Song]):
+        for song in songs:
+            url = await self.get_stream_url(song.video_id, priority=PRIORITY_PREFETCH, guild_id=guild_id)
+            if not url:
+                print(f"[Lookahead] No stream URL for upcoming song: {song.title}")
+                continue
+            state = self.states.peek(guild_id)
+            self._fill_song_metadata(song, state.queue if state is not None else None)
+
+    def _fill_song_metadata(self, song: Song, queue: Optional[MusicQueue] = None):
+        """Lengkapi durasi/thumbnail lagu (untuk embed) dari hasil extract yang di-cache."""
+        if not song.duration_seconds:
+            cached = self.stream_urls.get(song.video_id)
+            if cached and cached[3]:
+                seconds = parse_duration(cached[3])
+                if queue is not None:
+                    queue.set_duration(song, seconds)
+                else:
+                    song.duration_seconds = seconds
+        if not song.thumbnail:
+            song.thumbnail = f"https://i.ytimg.com/vi/{song.video_id}/hqdefault.jpg"
+
+    # ==================== WARM NEXT SOURCE ====================
+    @staticmethod
+    def _warm_target(queue: MusicQueue) -> Optional[Song]:
+        """Lagu yang akan diputar setelah lagu saat ini selesai."""
+        if queue.loop_single:
+            return queue.current_song
+        return next(queue.iter_upcoming(0, 1), None)
+
+    def schedule_warm_source(self, guild_id: int, voice_client: discord.VoiceClient,
+                             duration_seconds: int, volume: float):
+        """
+        Spawn FFmpeg untuk lagu berikutnya WARM_SOURCE_LEAD detik sebelum lagu
+        saat ini selesai, agar _play_song bisa langsung memutarnya.
+        """
+        state = self.states.peek(guild_id)
+        if state is None:
+            return
+        state.discard_warm_source()
+        if WARM_SOURCE_LEAD <= 0 or not duration_seconds:
+            return
+        state.warm_task = asyncio.get_running_loop().create_task(
+            self._warm_next_source(guild_id, voice_client, duration_seconds, volume)
+        )
+
+    @staticmethod
+    async def _wait_for_position(voice_client: discord.VoiceClient, target: float):
+        """Tunggu sampai posisi playback mencapai target (waktu pause tidak dihitung)."""
+        played = 0.0
+        while True:
+            # OpusStreamSource menghitung frame yang sudah dibaca; source lain dikira dari waktu play
+            position = getattr(voice_client.source, 'position', None)
+            remaining = target - (played if position is None else position)
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+            if voice_client.is_playing():
+                played += remaining
+
+    async def _warm_next_source(self, guild_id: int, voice_client: discord.VoiceClient,
+                                duration_seconds: int, volume: float):
+        # Jangan spawn FFmpeg lebih awal saat lagu di-pause (koneksi HTTP idle bisa expire)
+        await self._wait_for_position(voice_client, duration_seconds - WARM_SOURCE_LEAD)
+        state = self.states.peek(guild_id)
+        song = self._warm_target(state.queue) if state is not None else None
+        if song is None:
+            return
+
+        source = self.cached_audio_source(song.video_id, volume)
+        if source is None:
+            url = await self.get_stream_url(song.video_id, guild_id=guild_id)
+            state = self.states.peek(guild_id)
+            # Queue bisa berubah selama resolve URL
+            if not url or state is None or self._warm_target(state.queue) is not song:
+                return
+            source = self.create_audio_source(url, volume, opus=self.is_opus_stream(song.video_id))
+        state.warm_source = (song.video_id, volume, source)
+        print(f"[Warm] FFmpeg ready for next song: {song.title}")
+
+    def take_warm_source(self, guild_id: int, song: Song, volume: float) -> Optional[discord.AudioSource]:
+        """Ambil warm source jika cocok dengan lagu & volume; yang tidak cocok dimatikan."""
+        state = self.states.peek(guild_id)
+        if state is None or state.warm_source is None:
+            return None
+        video_id, warm_volume, source = state.warm_source
+        state.warm_source = None
+        if video_id == song.video_id and abs(warm_volume - volume) < 0.005:
+            return source
+        source.cleanup()
+        return None
+
+    def create_audio_source(self, url: str, volume: float = 0.5, opus: bool = False,
+                            start: float = 0.0, local: bool = False) -> discord.AudioSource:
         """
         Buat audio source dari URL.
         
         Args:
-            url: Stream URL
+            url: Stream URL (atau path file jika local=True)
             volume: Volume level (0.0 - 1.0)
+            opus: True jika stream sudah Opus (bisa passthrough)
+            start: Mulai dari detik ke-N
+            local: url adalah file audio cache lokal
             
         Returns:
-            PCMVolumeTransformer audio source
+            OpusStreamSource, atau PCMVolumeTransformer jika OPUS_PASSTHROUGH mati
         """
-        source = discord.FFmpegPCMAudio(url, **FFMPEG_OPTIONS)
+        if OPUS_PASSTHROUGH:
+            return OpusStreamSource(url, volume=volume, opus_input=opus, start=start, local=local)
+
+        options = dict(FFMPEG_OPTIONS)
+        if local:
+            options['before_options'] = ''
+        if start > 0:
+            options['before_options'] = f"-ss {start:.2f} {options['before_options']}".strip()
+        source = discord.FFmpegPCMAudio(url, **options)
         return discord.PCMVolumeTransformer(source, volume=volume)
 
-    def _format_duration(self, seconds: int) -> str:
-        """Format durasi dari detik ke MM:SS atau HH:MM:SS."""
-        if not seconds:
-            return "Unknown"
+    def cached_audio_source(self, video_id: str, volume: float) -> Optional[discord.AudioSource]:
+        """Audio source dari file cache disk (None jika lagu belum di-cache)."""
+        path = self.audio_cache.get_path(video_id)
+        if not path:
+            return None
+        return self.create_audio_source(path, volume, opus=True, local=True)
 
-        hours, remainder = divmod(int(seconds), 3600)
-        minutes, secs = divmod(remainder, 60)
+    def cache_audio(self, song: Song, stream_url: str):
+        """Isi cache disk untuk lagu ini di background (dipanggil saat pertama diputar)."""
+        self.audio_cache.fill(song.video_id, stream_url, self.is_opus_stream(song.video_id), song.duration_seconds)
 
-        if hours:
-            return f"{hours}:{minutes:02d}:{secs:02d}"
-        return f"{minutes}:{secs:02d}"
+    def apply_volume(self, voice_client: Optional[discord.VoiceClient], volume: float):
+        """
+        Terapkan volume ke source yang sedang diputar.
+        PCMVolumeTransformer cukup ganti attribute; OpusStreamSource dibuat ulang
+        di posisi yang sama dengan filter volume baru.
+        """
+        source = voice_client.source if voice_client else None
+        if source is None:
+            return
+        if isinstance(source, discord.PCMVolumeTransformer):
+            source.volume = volume
+            return
+        if not isinstance(source, OpusStreamSource) or abs(source.volume - volume) < 0.005:
+            return
+
+        was_paused = voice_client.is_paused()
+        new_source = self.create_audio_source(source.url, volume, opus=source.opus_input,
+                                              start=source.position, local=source.local)
+        voice_client.source = new_source
+        if was_paused:
+            # set_source() melanjutkan player, kembalikan ke pause
+            voice_client.pause()
+        source.cleanup()
 
-    async def get_random_songs_by_genre(self, genre: str, count: int, requester: discord.Member = None) -> List[Song]:
+    def _format_duration(self, seconds: int) -> str:
+        """Format durasi dari detik ke MM:SS atau HH:MM:SS."""
+        return format_duration(seconds) or "Unknown"
+
+    async def get_random_songs_by_genre(self, genre: str, count: int, requester: discord.Member = None,
+                                        priority: int = PRIORITY_USER) -> List[Song]:
         """
         Dapatkan lagu random dari genre tertentu.
 
@@ -622,7 +1589,7 @@ class YTMusicPlayer:
 
         try:
             # Search dengan limit lebih banyak untuk variasi
-            results = await self.search(query, limit=25)
+            results = await self.search(query, limit=25, priority=priority, guild_id=self._guild_id(requester))
 
             if not results:
                 return []
@@ -664,45 +1631,44 @@ class YTMusicPlayer:
             return []
 
     def cleanup(self, guild_id: int):
-        """Bersihkan data untuk guild."""
-        if guild_id in self.queues:
-            del self.queues[guild_id]
-        if guild_id in self.now_playing:
-            del self.now_playing[guild_id]
-        self.clear_unlimited_play(guild_id)
-        # Also clear autoplay mode and buffer
-        self.autoplay_mode.pop(guild_id, None)
-        self.clear_buffer(guild_id)
-        # Clear transitioning state
-        self.set_transitioning(guild_id, False)
+        """Bersihkan semua data guild (queue, mode, buffer, pesan, update progress)."""
+        self.progress.untrack(guild_id)
+        self.states.teardown(guild_id)
 
     def set_unlimited_play(self, guild_id: int, genre: str):
         """Enable unlimited play mode."""
-        self.unlimited_play_mode[guild_id] = True
-        self.unlimited_play_genre[guild_id] = genre
+        state = self.states.get(guild_id)
+        state.unlimited_play = True
+        state.unlimited_genre = genre
 
     def clear_unlimited_play(self, guild_id: int):
         """Disable unlimited play mode."""
-        self.unlimited_play_mode.pop(guild_id, None)
-        self.unlimited_play_genre.pop(guild_id, None)
-        self.clear_buffer(guild_id)  # Also clear buffer
+        state = self.states.peek(guild_id)
+        if state is not None:
+            state.unlimited_play = False
+            state.unlimited_genre = None
+            state.buffered_song = None  # Also clear buffer
 
     def is_unlimited_play_active(self, guild_id: int) -> bool:
         """Check if unlimited play is active."""
-        return self.unlimited_play_mode.get(guild_id, False)
+        state = self.states.peek(guild_id)
+        return state is not None and state.unlimited_play
 
     def get_unlimited_genre(self, guild_id: int) -> Optional[str]:
         """Get unlimited play genre."""
-        return self.unlimited_play_genre.get(guild_id)
+        state = self.states.peek(guild_id)
+        return state.unlimited_genre if state is not None else None
 
     # ==================== AUTOPAY METHODS ====================
     def set_autoplay(self, guild_id: int, enabled: bool = True):
         """Enable or disable autoplay mode."""
-        self.autoplay_mode[guild_id] = enabled
+        if enabled or self.states.peek(guild_id) is not None:
+            self.states.get(guild_id).autoplay = enabled
 
     def is_autoplay_active(self, guild_id: int) -> bool:
         """Check if autoplay is active."""
-        return self.autoplay_mode.get(guild_id, False)
+        state = self.states.peek(guild_id)
+        return state is not None and state.autoplay
 
     def toggle_autoplay(self, guild_id: int) -> bool:
         """Toggle autoplay mode and return new state."""
@@ -710,7 +1676,8 @@ class YTMusicPlayer:
         self.set_autoplay(guild_id, not current)
         return not current
 
-    async def get_similar_songs(self, current_song: 'Song', count: int = 1) -> List[Song]:
+    async def get_similar_songs(self, current_song: 'Song', count: int = 1, priority: int = PRIORITY_USER,
+                                guild_id: int = None) -> List[Song]:
         """
         Get similar songs based on current song.
         Uses multiple search strategies to find similar songs.
@@ -731,7 +1698,7 @@ class YTMusicPlayer:
             results = []
             for query in search_queries:
                 print(f"[AUTOPLAY SEARCH] Trying query: '{query}'")
-                results = await self.search(query, limit=count + 5)
+                results = await self.search(query, limit=count + 5, priority=priority, guild_id=guild_id)
                 if results:
                     print(f"[AUTOPLAY SEARCH] Found {len(results)} results for: '{query}'")
                     break
@@ -777,31 +1744,33 @@ class YTMusicPlayer:
     # ==================== BUFFER METHODS ====================
     def set_buffer(self, guild_id: int, song: Song):
         """Set buffered song for unlimited play."""
-        self.buffered_songs[guild_id] = song
+        self.states.get(guild_id).buffered_song = song
 
     def get_buffer(self, guild_id: int) -> Optional[Song]:
         """Get buffered song."""
-        return self.buffered_songs.get(guild_id)
+        state = self.states.peek(guild_id)
+        return state.buffered_song if state is not None else None
 
     def clear_buffer(self, guild_id: int):
         """Clear buffered song."""
-        self.buffered_songs.pop(guild_id, None)
+        state = self.states.peek(guild_id)
+        if state is not None:
+            state.buffered_song = None
 
     def has_buffer(self, guild_id: int) -> bool:
         """Check if buffer exists."""
-        return guild_id in self.buffered_songs
+        return self.get_buffer(guild_id) is not None
 
     # ==================== TRANSITION STATE METHODS ====================
     def set_transitioning(self, guild_id: int, is_transitioning: bool):
         """Set transitioning state for a guild."""
-        if is_transitioning:
-            self.transitioning[guild_id] = True
-        else:
-            self.transitioning.pop(guild_id, None)
+        if is_transitioning or self.states.peek(guild_id) is not None:
+            self.states.get(guild_id).transitioning = is_transitioning
 
     def is_transitioning(self, guild_id: int) -> bool:
         """Check if guild is in transitioning state."""
-        return self.transitioning.get(guild_id, False)
+        state = self.states.peek(guild_id)
+        return state is not None and state.transitioning
 
 
 # Global instance